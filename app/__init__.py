@@ -1,16 +1,24 @@
+import contextlib
 import os
+import tempfile
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import text
+from sqlalchemy.orm import DeclarativeBase, configure_mappers
+from .database import configure_sqlite, engine_options, start_checkpointer
+from .options import load_options
+from .startup import (BackgroundServices, StartupTimer, load_secret_key, precompile_templates,
+                      preloading, template_cache)
+from .tenants import TenantSQLAlchemy, init_tenants
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+# Binds to the current request's household when multi-household mode is on
+db = TenantSQLAlchemy(model_class=Base)
 
 def create_app(test_config=None):
-    app = Flask(__name__)
+    timer = StartupTimer()
+    # Static files are served by main.static_asset from the hashed build
+    app = Flask(__name__, static_folder=None)
 
     data_dir = os.environ.get('DATA_DIR', os.path.join(os.getcwd(), 'data'))
 
@@ -18,42 +26,149 @@ def create_app(test_config=None):
         os.makedirs(data_dir)
 
     db_path = os.path.join(data_dir, 'giftguardian.db')
+    options = load_options(data_dir)
+    app.config['ADDON_OPTIONS'] = options
 
     # Persist secret key across restarts (needed for flash messages to survive)
-    secret_key_file = os.path.join(data_dir, '.secret_key')
-    if os.path.exists(secret_key_file):
-        with open(secret_key_file, 'rb') as f:
-            secret_key = f.read()
-    else:
-        secret_key = os.urandom(24)
-        with open(secret_key_file, 'wb') as f:
-            f.write(secret_key)
+    secret_key = load_secret_key(os.path.join(data_dir, '.secret_key'))
 
     app.config['SECRET_KEY'] = secret_key
+    app.config['DATA_DIR'] = data_dir
     app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(options)
     app.config['UPLOAD_FOLDER'] = os.path.join(data_dir, 'images')
 
+    # Local fetch-once copies of gift image_url thumbnails, LRU-capped
+    app.config['REMOTE_IMAGE_FOLDER'] = os.path.join(app.config['UPLOAD_FOLDER'], 'remote')
+    app.config['REMOTE_IMAGE_CACHE_BYTES'] = int(os.environ.get('REMOTE_IMAGE_CACHE_MB', 200)) * 1024 * 1024
+
+    # Optional hand-off of upload bytes to a fronting proxy:
+    # 'x-sendfile' (Apache/lighttpd) or 'x-accel' (nginx internal location)
+    app.config['UPLOAD_SENDFILE'] = os.environ.get('UPLOAD_SENDFILE', '')
+    app.config['UPLOAD_ACCEL_PREFIX'] = os.environ.get('UPLOAD_ACCEL_PREFIX', '/protected-images/')
+    app.config['USE_X_SENDFILE'] = app.config['UPLOAD_SENDFILE'] == 'x-sendfile'
+
+    # Per-worker metric snapshots (summed by /metrics) and the shared page
+    # cache; run.sh clears both on start
+    app.config['METRICS_DIR'] = os.environ.get(
+        'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'giftguardian-metrics'))
+    app.config['PAGE_CACHE_DIR'] = os.environ.get('PAGE_CACHE_DIR', os.path.join(data_dir, '.page-cache'))
+    app.config['BACKUP_DIR'] = options['backup_dir'] or os.path.join(data_dir, 'backups')
+    from .assets import DIST, STATIC_DIR
+    app.config['ASSET_DIR'] = os.environ.get('ASSET_DIR', os.path.join(STATIC_DIR, DIST))
+    app.config['PROFILE_DIR'] = os.path.join(data_dir, 'profiles') if options['profiling_enabled'] else None
+
     if not os.path.exists(app.config['UPLOAD_FOLDER']):
         os.makedirs(app.config['UPLOAD_FOLDER'])
 
+    # Compiled templates persist across restarts and are shared by workers
+    app.jinja_env.bytecode_cache = template_cache(os.path.join(data_dir, '.jinja-cache'))
+
     db.init_app(app)
+    timer.mark('config')
+
+    # Threads are started only by the serving process (gunicorn.conf.py,
+    # wsgi.py), never by CLI commands, tests or benchmarks; see startup.py
+    services = app.extensions['services'] = BackgroundServices()
 
     with app.app_context():
+        engine = db.engine
+        configure_sqlite(engine, options)
+        services.add('WAL checkpointer', lambda: start_checkpointer(
+            engine, int(options['sqlite_checkpoint_interval_s'])))
+
         from . import models
-        db.create_all()
-
-        # Migrate existing databases: add new columns if missing
-        with db.engine.connect() as conn:
-            result = conn.execute(text("PRAGMA table_info(gift)"))
-            existing_cols = {row[1] for row in result}
-            if 'image_url' not in existing_cols:
-                conn.execute(text("ALTER TABLE gift ADD COLUMN image_url VARCHAR(500)"))
-            if 'notes' not in existing_cols:
-                conn.execute(text("ALTER TABLE gift ADD COLUMN notes TEXT"))
-            conn.commit()
-
-        from .routes import main
+        # Relationship setup otherwise happens on the first query of the first request
+        configure_mappers()
+
+        # Versioned, lock-protected schema upgrades (a no-op once current)
+        from .migrations import upgrade
+        upgrade(os.path.join(data_dir, '.migrate.lock'))
+
+        from .search import gift_fts_exists
+        with engine.connect() as conn:
+            app.config['GIFT_SEARCH_FTS'] = gift_fts_exists(conn)
+        timer.mark('database')
+
+        from .backup import start_backup_scheduler
+        services.add('backup scheduler', lambda: start_backup_scheduler(
+            engine, app.config['UPLOAD_FOLDER'], app.config['BACKUP_DIR'],
+            float(options['backup_interval_hours']), int(options['backup_keep'])))
+
+        from .reminders import start_reminder_scheduler
+        services.add('reminder scheduler', lambda: start_reminder_scheduler(engine, data_dir, options))
+
+        from .cache import make_cache
+        cache = make_cache(options['page_cache'], app.config['PAGE_CACHE_DIR'],
+                           int(options['page_cache_entries']))
+        if cache is not None:
+            app.extensions['page_cache'] = cache
+
+        # Hashed asset names for templates; normally built with the image
+        from .assets import VENDOR, prepare
+        try:
+            app.extensions['assets'] = prepare(STATIC_DIR, app.config['ASSET_DIR'])
+        except OSError as e:
+            app.logger.error(f"Error building static assets: {e}")
+            app.extensions['assets'] = {}
+        missing = [name for name in VENDOR if name not in app.extensions['assets']]
+        if missing:
+            app.logger.warning(f"Vendored assets not built, pages load them from the CDN: {', '.join(missing)}")
+        timer.mark('assets')
+
+        from .routes import api, main
         app.register_blueprint(main)
+        app.register_blueprint(api)
+
+        from .metrics import Registry, instrument
+        from .middleware import MetricsMiddleware
+        app.extensions['metrics'] = Registry(app.config['METRICS_DIR'])
+        instrument(app, engine)
+        app.wsgi_app = MetricsMiddleware(app.wsgi_app, app.extensions['metrics'],
+                                         app.config['PROFILE_DIR'], int(options['profile_keep']))
+
+        # Per-household databases, routed inside IngressMiddleware (wsgi.py)
+        tenants = init_tenants(app, options)
+        if tenants is not None:
+            services.add('tenant sweeper', tenants.start_sweeper)
+
+        # Image variants, deletes and the orphaned-image GC run off the request path
+        from .jobs import JobQueue, start_job_workers
+        default_queue = JobQueue(engine, app.config['UPLOAD_FOLDER'], registry=app.extensions['metrics'])
+
+        @contextlib.contextmanager
+        def job_queues():
+            if tenants is None:
+                yield [default_queue]
+                return
+            with tenants.pinned() as open_tenants:
+                yield [default_queue] + [tenant.queue for tenant in open_tenants]
+
+        app.extensions['jobs'] = default_queue
+        services.add('job workers', lambda: start_job_workers(
+            job_queues, int(options['job_workers']),
+            {'image_gc': float(options['image_gc_interval_hours']) * 3600}))
+        timer.mark('routes')
+
+        # Gift Pool suggestions for the default household; tenants have their own.
+        # Built here so preloaded workers inherit it instead of each paying for it
+        from .suggest import SuggestionIndex
+        suggestions = app.extensions['suggestions'] = SuggestionIndex()
+        if int(options['pool_suggestions']):
+            with engine.connect() as conn:
+                suggestions.refresh(conn)
+        timer.mark('suggestions')
+
+        precompile_templates(app)
+        timer.mark('templates')
+
+    from .commands import register_commands
+    register_commands(app)
+
+    # Workers must not inherit the master's SQLite connections
+    if preloading():
+        engine.dispose()
+    app.extensions['startup_timings'] = timer.done()
 
     return app
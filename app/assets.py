@@ -0,0 +1,246 @@
+"""Static assets: vendored third-party files plus our own CSS and JS.
+
+build() copies everything under static/ to content-hashed names in a dist
+directory, with gzip (and, if the brotli module is installed, brotli)
+siblings for text files, and writes manifest.json mapping each source path
+to its hashed name. Hashed names never change meaning, so they are served
+with a one-year immutable Cache-Control. Relative url() references in CSS
+(the icon fonts) are rewritten to the hashed names.
+
+Vendored files are fetched at image build time (`python -m app.assets`)
+and must match the sha256 pinned for each in vendor.sha256, or the build
+fails. `python -m app.assets --pin` records fresh pins after a version bump.
+A development checkout without them uses the CDN copies listed in VENDOR,
+and create_app() logs which ones.
+"""
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import sys
+import tempfile
+import urllib.error
+import urllib.request
+
+try:
+    import brotli
+except ImportError:   # optional; gzip alone still covers every browser
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+VENDOR_PINS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vendor.sha256')
+VENDOR = {
+    'vendor/bootstrap/bootstrap.min.css':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'vendor/bootstrap/bootstrap.bundle.min.js':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'vendor/bootstrap-icons/bootstrap-icons.min.css':
+        'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/font/bootstrap-icons.min.css',
+    'vendor/bootstrap-icons/fonts/bootstrap-icons.woff2':
+        'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/font/fonts/bootstrap-icons.woff2',
+    'vendor/bootstrap-icons/fonts/bootstrap-icons.woff':
+        'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/font/fonts/bootstrap-icons.woff',
+}
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt'}
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]   # preference order
+CSS_URL_RE = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+SOURCE_MAP_RE = re.compile(r'\n?(/\*# sourceMappingURL=[^*]*\*/|//# sourceMappingURL=\S*)\s*$')
+
+
+# ── vendoring ────────────────────────────────────────────────────────────────
+
+class VendorError(ValueError):
+    """A vendored file is missing, unpinned or differs from its pin."""
+
+
+def load_pins(path=None):
+    """{vendored path: sha256 hex digest} from a sha256sum-style file."""
+    pins = {}
+    try:
+        with open(path or VENDOR_PINS) as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return pins
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        digest, name = line.split(None, 1)
+        pins[name.lstrip('*')] = digest.lower()
+    return pins
+
+
+def _check_pin(name, data, pins):
+    if name not in pins:
+        raise VendorError(f'{name} has no pinned sha256 in {VENDOR_PINS} '
+                          f'(record one with `python -m app.assets --pin`)')
+    digest = hashlib.sha256(data).hexdigest()
+    if digest != pins[name]:
+        raise VendorError(f'{name} has sha256 {digest}, pinned {pins[name]}')
+
+
+def fetch_vendor(static_dir=STATIC_DIR, timeout=30):
+    """Download any VENDOR file not yet under static_dir; return the fetched paths.
+
+    Each download is checked against its pin before it is written.
+    """
+    pins = load_pins()
+    fetched = []
+    for name, url in VENDOR.items():
+        path = os.path.join(static_dir, name)
+        if os.path.exists(path):
+            continue
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            data = response.read()
+        _check_pin(name, data, pins)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write_atomic(path, data)
+        fetched.append(name)
+    return fetched
+
+
+def verify_vendor(static_dir=STATIC_DIR):
+    """Raise VendorError unless every VENDOR file is present and matches its pin."""
+    pins = load_pins()
+    for name in VENDOR:
+        try:
+            with open(os.path.join(static_dir, name), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            raise VendorError(f'{name} is missing') from None
+        _check_pin(name, data, pins)
+
+
+def pin_vendor(static_dir=STATIC_DIR, timeout=30):
+    """Download every VENDOR file afresh and record its sha256 in VENDOR_PINS."""
+    lines = []
+    for name, url in VENDOR.items():
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            data = response.read()
+        path = os.path.join(static_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write_atomic(path, data)
+        lines.append(f'{hashlib.sha256(data).hexdigest()}  {name}\n')
+    with open(VENDOR_PINS, 'w') as f:
+        f.writelines(lines)
+
+
+# ── build ────────────────────────────────────────────────────────────────────
+
+def _sources(static_dir):
+    """{source path: [size, mtime_ns]} for every file under static_dir but dist/."""
+    sources = {}
+    for root, dirs, files in os.walk(static_dir):
+        if root == static_dir and DIST in dirs:
+            dirs.remove(DIST)
+        for filename in files:
+            path = os.path.join(root, filename)
+            st = os.stat(path)
+            name = os.path.relpath(path, static_dir).replace(os.sep, '/')
+            sources[name] = [st.st_size, st.st_mtime_ns]
+    return dict(sorted(sources.items()))
+
+
+def _write_atomic(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _hashed_name(name, data):
+    stem, ext = posixpath.splitext(name)
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def _rewrite_css(name, css, files):
+    """Point relative url()s in `css` at their hashed names and drop source maps."""
+    base = posixpath.dirname(name)
+
+    def replace(match):
+        url = match.group(2).strip()
+        if re.match(r'^([a-z]+:|/|#)', url, re.I):
+            return match.group(0)
+        path = re.split(r'[?#]', url, 1)[0]
+        target = posixpath.normpath(posixpath.join(base, path))
+        if target not in files:
+            return match.group(0)
+        return f'url("{posixpath.relpath(files[target], base or ".")}")'
+
+    return SOURCE_MAP_RE.sub('', CSS_URL_RE.sub(replace, css))
+
+
+def build(static_dir=STATIC_DIR, dist_dir=None):
+    """Write hashed and precompressed copies of every source; return the manifest.
+
+    Outputs are content-addressed and written atomically, so several
+    workers building at once just produce the same files.
+    """
+    dist_dir = dist_dir or os.path.join(static_dir, DIST)
+    sources = _sources(static_dir)
+    files = {}
+    # CSS last, so the files it refers to already have their hashed names
+    for name in sorted(sources, key=lambda n: (n.endswith('.css'), n)):
+        with open(os.path.join(static_dir, name), 'rb') as f:
+            data = f.read()
+        if name.endswith('.css'):
+            data = _rewrite_css(name, data.decode('utf-8'), files).encode('utf-8')
+        elif name.endswith('.js'):
+            data = SOURCE_MAP_RE.sub('', data.decode('utf-8')).encode('utf-8')
+        hashed = files[name] = _hashed_name(name, data)
+        path = os.path.join(dist_dir, hashed)
+        if os.path.exists(path):
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write_atomic(path, data)
+        if posixpath.splitext(name)[1] in COMPRESSIBLE:
+            variants = [('.gz', gzip.compress(data, 9, mtime=0))]
+            if brotli is not None:
+                variants.append(('.br', brotli.compress(data, quality=11)))
+            for suffix, compressed in variants:
+                if len(compressed) < len(data):
+                    _write_atomic(path + suffix, compressed)
+
+    manifest = {'sources': sources, 'files': files}
+    os.makedirs(dist_dir, exist_ok=True)
+    _write_atomic(os.path.join(dist_dir, MANIFEST), json.dumps(manifest, indent=1).encode())
+    return manifest
+
+
+def prepare(static_dir=STATIC_DIR, dist_dir=None):
+    """{source path: hashed path}, rebuilding first if any source changed."""
+    dist_dir = dist_dir or os.path.join(static_dir, DIST)
+    try:
+        with open(os.path.join(dist_dir, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = None
+    if not manifest or manifest.get('sources') != _sources(static_dir):
+        manifest = build(static_dir, dist_dir)
+    return manifest['files']
+
+
+def negotiate(path, accept_encodings):
+    """(path to send, Content-Encoding or None) for the best precompressed copy."""
+    for encoding, suffix in ENCODINGS:
+        if accept_encodings[encoding] and os.path.exists(path + suffix):
+            return path + suffix, encoding
+    return path, None
+
+
+if __name__ == '__main__':
+    try:
+        if sys.argv[1:] == ['--pin']:
+            pin_vendor()
+            print(f'pinned {len(VENDOR)} vendored files in {VENDOR_PINS}')
+        for name in fetch_vendor():
+            print(f'fetched {name}')
+        verify_vendor()
+    except (urllib.error.URLError, VendorError) as e:
+        sys.exit(f'vendored assets unusable: {e}')
+    built = build()
+    print(f"built {len(built['files'])} assets in {os.path.join(STATIC_DIR, DIST)}")
@@ -0,0 +1,418 @@
+import datetime
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+from sqlalchemy import text
+from werkzeug.utils import secure_filename
+from . import suggest
+from .migrations import LATEST_VERSION, file_lock, upgrade
+
+logger = logging.getLogger(__name__)
+
+FORMAT = 1
+MANIFEST = 'manifest.json'
+DATABASE = 'giftguardian.db'
+CHUNK = 1024 * 1024
+MAX_MANIFEST = 16 * 1024 * 1024
+SNAPSHOT_TIME_FORMAT = '%Y%m%d-%H%M%S'
+REQUIRED_TABLES = {'person', 'gift', 'relation', 'occasion', 'person_occasion'}
+
+
+class RestoreError(ValueError):
+    """The archive or snapshot cannot be restored; the message says why."""
+
+
+# ── snapshot pieces ──────────────────────────────────────────────────────────
+
+def snapshot_database(engine, dest_path):
+    """Write a consistent, compacted copy of the live database to dest_path.
+
+    VACUUM INTO reads inside one transaction, so under WAL it neither blocks
+    writers nor sees a half-applied write.
+    """
+    conn = engine.raw_connection()
+    try:
+        conn.cursor().execute('VACUUM INTO ?', (dest_path,))
+    finally:
+        conn.close()
+
+
+def schema_version(db_path):
+    with sqlite3.connect(f'file:{db_path}?mode=ro', uri=True) as conn:
+        try:
+            return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+        except sqlite3.OperationalError:
+            return 0
+
+
+def original_images(upload_folder):
+    """(name, path, size) for every uploaded original; variants and caches are rebuilt."""
+    for entry in sorted(os.scandir(upload_folder), key=lambda e: e.name):
+        if entry.is_file() and not entry.name.startswith('.') and not entry.name.endswith('.tmp'):
+            yield entry.name, entry.path, entry.stat().st_size
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _manifest(db_file, db_path, version, images):
+    return {
+        'format': FORMAT,
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'schema_version': version,
+        'database': {'file': db_file, 'size': os.path.getsize(db_path), 'sha256': sha256_file(db_path)},
+        'images': [{'name': name, 'size': size} for name, size in images],
+    }
+
+
+# ── streamed download ────────────────────────────────────────────────────────
+
+class _Sink:
+    """Write-only file object that buffers zip output until the generator drains it."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_archive(engine, upload_folder):
+    """Yield a zip of a fresh database snapshot plus every uploaded image.
+
+    The database is deflated; images are stored as-is since they are
+    already compressed. Output is produced a chunk at a time, so memory
+    stays flat however large the image folder is.
+    """
+    workdir = tempfile.mkdtemp(prefix='giftguardian-backup-')
+    try:
+        db_path = os.path.join(workdir, DATABASE)
+        snapshot_database(engine, db_path)
+        images = list(original_images(upload_folder))
+        manifest = _manifest(DATABASE, db_path, schema_version(db_path),
+                             [(name, size) for name, _, size in images])
+
+        sink = _Sink()
+        with zipfile.ZipFile(sink, 'w') as archive:
+            archive.writestr(MANIFEST, json.dumps(manifest, indent=1), zipfile.ZIP_DEFLATED)
+            files = [(DATABASE, db_path, zipfile.ZIP_DEFLATED)]
+            files += [(f'images/{name}', path, zipfile.ZIP_STORED) for name, path, _ in images]
+            for arcname, path, compression in files:
+                info = zipfile.ZipInfo.from_file(path, arcname)
+                info.compress_type = compression
+                with open(path, 'rb') as src, archive.open(info, 'w', force_zip64=True) as dst:
+                    for chunk in iter(lambda: src.read(CHUNK), b''):
+                        dst.write(chunk)
+                        if sink.chunks:
+                            yield sink.drain()
+        yield sink.drain()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ── scheduled snapshots ──────────────────────────────────────────────────────
+# backup_dir/images/       one copy of every image any snapshot refers to
+# backup_dir/snapshots/ts/ manifest.json + giftguardian.db.gz
+# Upload names are content hashes, so an image already in the pool is never
+# copied again; retention removes pool images no snapshot lists any more.
+
+def list_snapshots(backup_dir):
+    root = os.path.join(backup_dir, 'snapshots')
+    if not os.path.isdir(root):
+        return []
+    names = (e.name for e in os.scandir(root)
+             if e.is_dir() and os.path.exists(os.path.join(e.path, MANIFEST)))
+    # Newest first; a same-second suffix sorts by number, not as text
+    return sorted(names, key=lambda name: (name[:15], int(name[16:]) if name[16:].isdigit() else 1), reverse=True)
+
+
+def snapshot_name(root):
+    """Timestamp name for a new snapshot, with -2, -3... if that second is taken."""
+    base = name = datetime.datetime.now().strftime(SNAPSHOT_TIME_FORMAT)
+    n = 1
+    while os.path.exists(os.path.join(root, name)):
+        n += 1
+        name = f'{base}-{n}'
+    return name
+
+
+def snapshot_time(name):
+    return datetime.datetime.strptime(name[:15], SNAPSHOT_TIME_FORMAT).timestamp()
+
+
+def create_snapshot(engine, upload_folder, backup_dir, keep):
+    """Write an incremental snapshot and apply retention; return its name."""
+    os.makedirs(backup_dir, exist_ok=True)
+    with file_lock(os.path.join(backup_dir, '.lock')):
+        return _create_snapshot(engine, upload_folder, backup_dir, keep)
+
+
+def _create_snapshot(engine, upload_folder, backup_dir, keep):
+    pool = os.path.join(backup_dir, 'images')
+    os.makedirs(pool, exist_ok=True)
+    name = snapshot_name(os.path.join(backup_dir, 'snapshots'))
+    final = os.path.join(backup_dir, 'snapshots', name)
+    staging = f'{final}.tmp'
+    os.makedirs(staging, exist_ok=True)
+    try:
+        db_path = os.path.join(staging, DATABASE)
+        snapshot_database(engine, db_path)
+        version = schema_version(db_path)
+        with open(db_path, 'rb') as src, gzip.open(f'{db_path}.gz', 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, CHUNK)
+        os.remove(db_path)
+
+        images, copied = [], 0
+        for image, path, size in original_images(upload_folder):
+            target = os.path.join(pool, image)
+            if not (os.path.exists(target) and os.path.getsize(target) == size):
+                shutil.copyfile(path, f'{target}.tmp')
+                os.replace(f'{target}.tmp', target)
+                copied += 1
+            images.append((image, size))
+
+        manifest = _manifest(f'{DATABASE}.gz', f'{db_path}.gz', version, images)
+        with open(os.path.join(staging, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(staging, final)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    logger.info(f"Backup snapshot {name}: {len(images)} image(s), {copied} newly copied")
+    prune_snapshots(backup_dir, keep)
+    return name
+
+
+def prune_snapshots(backup_dir, keep):
+    snapshots = list_snapshots(backup_dir)
+    for old in snapshots[keep:]:
+        shutil.rmtree(os.path.join(backup_dir, 'snapshots', old), ignore_errors=True)
+    referenced = set()
+    for name in snapshots[:keep]:
+        with open(os.path.join(backup_dir, 'snapshots', name, MANIFEST)) as f:
+            referenced.update(image['name'] for image in json.load(f)['images'])
+    pool = os.path.join(backup_dir, 'images')
+    for entry in os.scandir(pool):
+        if entry.name not in referenced:
+            os.remove(entry.path)
+
+
+def start_backup_scheduler(engine, upload_folder, backup_dir, interval_hours, keep):
+    """Take a snapshot whenever the newest one is older than interval_hours.
+
+    Every worker runs this loop; a non-blocking lock file in backup_dir
+    makes sure only one of them writes a given snapshot.
+    """
+    if not interval_hours:
+        return None
+    stop = threading.Event()
+    interval = interval_hours * 3600
+
+    def due():
+        snapshots = list_snapshots(backup_dir)
+        if not snapshots:
+            return True
+        taken = snapshot_time(snapshots[0])
+        return time.time() - taken >= interval
+
+    def run():
+        while not stop.wait(600):
+            try:
+                os.makedirs(backup_dir, exist_ok=True)
+                with file_lock(os.path.join(backup_dir, '.lock'), blocking=False) as locked:
+                    if locked and due():
+                        _create_snapshot(engine, upload_folder, backup_dir, keep)
+            except Exception as e:
+                logger.warning(f"Scheduled backup failed: {e}")
+
+    threading.Thread(target=run, name='backup-scheduler', daemon=True).start()
+    return stop
+
+
+# ── restore ──────────────────────────────────────────────────────────────────
+
+def _read_manifest(data):
+    try:
+        manifest = json.loads(data)
+    except ValueError:
+        raise RestoreError('manifest.json is not valid JSON')
+    if not isinstance(manifest, dict) or manifest.get('format') != FORMAT:
+        raise RestoreError('unsupported backup format')
+    for image in manifest.get('images', []):
+        if secure_filename(image['name']) != image['name']:
+            raise RestoreError(f"unsafe image name {image['name']!r}")
+    sizes = [manifest.get('database', {}).get('size')] + [image.get('size') for image in manifest.get('images', [])]
+    if not all(isinstance(size, int) and size >= 0 for size in sizes):
+        raise RestoreError('manifest has an invalid file size')
+    return manifest
+
+
+def _check_space(manifest, staging):
+    """Refuse up front a backup whose files would not fit next to the staging folder."""
+    needed = manifest['database']['size'] + sum(image['size'] for image in manifest['images'])
+    free = shutil.disk_usage(staging).free
+    if needed > free:
+        raise RestoreError(f'backup needs {needed} bytes but only {free} are free')
+
+
+def _copy_checked(src, dest_path, expected_size=None, expected_sha=None, limit=None):
+    """Copy src to dest_path, stopping as soon as it runs past the size limit.
+
+    The limit is the manifest's size when it has one for the uncompressed
+    file, so a member that decompresses to more than it claims (a zip bomb)
+    is cut off after one chunk too many instead of filling the disk.
+    """
+    name = os.path.basename(dest_path)
+    limit = expected_size if expected_size is not None else limit
+    digest, size = hashlib.sha256(), 0
+    with open(dest_path, 'wb') as dst:
+        for chunk in iter(lambda: src.read(CHUNK), b''):
+            size += len(chunk)
+            if size > limit:
+                raise RestoreError(f'{name}: larger than {limit} bytes')
+            digest.update(chunk)
+            dst.write(chunk)
+    if expected_size is not None and size != expected_size:
+        raise RestoreError(f'{name}: size {size}, expected {expected_size}')
+    if expected_sha is not None and digest.hexdigest() != expected_sha:
+        raise RestoreError(f'{name}: checksum mismatch')
+
+
+def _open_member(archive, name, expected_size):
+    """Open a zip member, refusing one whose header already disagrees with the manifest."""
+    info = archive.getinfo(name)
+    if info.file_size != expected_size:
+        raise RestoreError(f'{name}: size {info.file_size}, expected {expected_size}')
+    return archive.open(info)
+
+
+def _stage_zip(path, staging):
+    try:
+        archive = zipfile.ZipFile(path)
+    except zipfile.BadZipFile:
+        raise RestoreError('not a zip archive')
+    with archive:
+        try:
+            if archive.getinfo(MANIFEST).file_size > MAX_MANIFEST:
+                raise RestoreError('manifest.json is too large')
+            manifest = _read_manifest(archive.read(MANIFEST))
+            _check_space(manifest, staging)
+            database = manifest['database']
+            with _open_member(archive, database['file'], database['size']) as src:
+                _copy_checked(src, os.path.join(staging, DATABASE), database['size'], database['sha256'])
+            for image in manifest['images']:
+                with _open_member(archive, f"images/{image['name']}", image['size']) as src:
+                    _copy_checked(src, os.path.join(staging, 'images', image['name']), image['size'])
+        except KeyError as e:
+            raise RestoreError(f'archive is missing {e}')
+        except zipfile.BadZipFile as e:
+            raise RestoreError(f'corrupt archive: {e}')
+    return manifest
+
+
+def _stage_snapshot(snapshot_dir, staging):
+    pool = os.path.join(os.path.dirname(os.path.dirname(snapshot_dir)), 'images')
+    try:
+        with open(os.path.join(snapshot_dir, MANIFEST)) as f:
+            manifest = _read_manifest(f.read())
+        _check_space(manifest, staging)
+        # The manifest describes the compressed file, so free space is the cap
+        with gzip.open(os.path.join(snapshot_dir, manifest['database']['file']), 'rb') as src:
+            _copy_checked(src, os.path.join(staging, DATABASE), limit=shutil.disk_usage(staging).free)
+        for image in manifest['images']:
+            with open(os.path.join(pool, image['name']), 'rb') as src:
+                _copy_checked(src, os.path.join(staging, 'images', image['name']), image['size'])
+    except (OSError, KeyError) as e:
+        raise RestoreError(f'incomplete snapshot: {e}')
+    return manifest
+
+
+def validate_database(path):
+    try:
+        with sqlite3.connect(f'file:{path}?mode=ro', uri=True) as conn:
+            if conn.execute('PRAGMA integrity_check').fetchone()[0] != 'ok':
+                raise RestoreError('database failed its integrity check')
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    except sqlite3.DatabaseError as e:
+        raise RestoreError(f'not a GiftGuardian database: {e}')
+    if not REQUIRED_TABLES <= tables:
+        raise RestoreError(f"not a GiftGuardian database (missing {', '.join(sorted(REQUIRED_TABLES - tables))})")
+    version = schema_version(path)
+    if version > LATEST_VERSION:
+        raise RestoreError(f'backup is from a newer version (schema {version} > {LATEST_VERSION})')
+
+
+def restore(source, engine, upload_folder, data_dir):
+    """Replace the live database and add the images from a zip or snapshot dir.
+
+    Must run inside an app context (the schema is upgraded afterwards).
+    Everything is extracted and verified in a staging folder first. Images
+    go in before the database flips (names are content hashes, so existing
+    files are never overwritten), and the database is copied into the live
+    file with SQLite's backup API, which every worker's connections see as
+    one atomic change. Returns the restored manifest.
+    """
+    staging = tempfile.mkdtemp(prefix='.restore-', dir=data_dir)
+    try:
+        os.makedirs(os.path.join(staging, 'images'))
+        if os.path.isdir(source):
+            manifest = _stage_snapshot(source, staging)
+        else:
+            manifest = _stage_zip(source, staging)
+        staged_db = os.path.join(staging, DATABASE)
+        validate_database(staged_db)
+
+        with file_lock(os.path.join(data_dir, '.restore.lock')):
+            for image in manifest['images']:
+                target = os.path.join(upload_folder, image['name'])
+                if not os.path.exists(target):
+                    os.replace(os.path.join(staging, 'images', image['name']), target)
+
+            with engine.connect() as conn:
+                previous_version = conn.execute(text("SELECT version FROM data_version")).scalar() or 0
+                previous_change = suggest.last_change(conn)
+            live = engine.raw_connection()
+            try:
+                source_conn = sqlite3.connect(staged_db)
+                try:
+                    source_conn.backup(live.driver_connection)
+                except sqlite3.Error as e:
+                    raise RestoreError(f'could not replace the database: {e}')
+                finally:
+                    source_conn.close()
+            finally:
+                live.close()
+
+            # Older backups get the current schema; the data version and the
+            # gift change log must move past both histories so no cached page
+            # or suggestion index of either is used
+            upgrade(os.path.join(data_dir, '.migrate.lock'))
+            with engine.begin() as conn:
+                conn.execute(text("UPDATE data_version SET version = MAX(version, :v) + 1"),
+                             {'v': previous_version})
+                suggest.force_rebuild(conn, previous_change)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    logger.info(f"Restored backup from {manifest['created']} ({len(manifest['images'])} image(s))")
+    return manifest
@@ -0,0 +1,207 @@
+import datetime
+import functools
+import hashlib
+import os
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+from flask import current_app, request, session
+from sqlalchemy import text
+from . import db
+from .tenants import current_tenant
+
+# ── data version ─────────────────────────────────────────────────────────────
+# One counter bumped by triggers on every table a page can show, so any write
+# (ORM, bulk SQL, another worker) invalidates cached pages in its own
+# transaction. calendar_event and gift_rollup only change alongside these.
+
+VERSIONED_TABLES = ['relation', 'occasion', 'person', 'person_occasion', 'gift']
+
+DATA_VERSION_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS data_version (
+           id INTEGER PRIMARY KEY CHECK (id = 1),
+           version INTEGER NOT NULL)""",
+    "INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 1)",
+] + [
+    f"""CREATE TRIGGER IF NOT EXISTS {table}_version_{suffix} AFTER {action} ON {table} BEGIN
+            UPDATE data_version SET version = version + 1 WHERE id = 1;
+        END"""
+    for table in VERSIONED_TABLES
+    for suffix, action in [('ai', 'INSERT'), ('au', 'UPDATE'), ('ad', 'DELETE')]
+]
+
+
+def install_data_version(conn):
+    for statement in DATA_VERSION_SCHEMA:
+        conn.execute(text(statement))
+
+
+def data_version():
+    return db.session.execute(text("SELECT version FROM data_version WHERE id = 1")).scalar()
+
+
+# ── backends ─────────────────────────────────────────────────────────────────
+
+class MemoryCache:
+    """Bounded per-process LRU."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class FileCache:
+    """One file per entry in a directory shared by every worker; LRU by mtime.
+
+    Values are (body, mimetype) pairs, stored as raw bytes behind a small
+    header that repeats the key, so nothing read back is ever unpickled.
+    """
+
+    HEADER = struct.Struct('>II')
+    # Writes between directory scans; the cap may overshoot by this much
+    PRUNE_EVERY = 16
+
+    def __init__(self, directory, max_entries):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.writes = 0
+        self.lock = threading.Lock()
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        os.chmod(directory, 0o700)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        size = self.HEADER.size
+        if len(data) < size:
+            return None
+        key_len, mime_len = self.HEADER.unpack_from(data)
+        stored_key = data[size:size + key_len]
+        if stored_key != key.encode('utf-8'):
+            return None
+        mimetype = data[size + key_len:size + key_len + mime_len].decode('utf-8')
+        body = data[size + key_len + mime_len:]
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return body, mimetype
+
+    def set(self, key, value):
+        body, mimetype = value
+        key_bytes, mime_bytes = key.encode('utf-8'), mimetype.encode('utf-8')
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.HEADER.pack(len(key_bytes), len(mime_bytes)))
+                f.write(key_bytes)
+                f.write(mime_bytes)
+                f.write(body)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        with self.lock:
+            self.writes += 1
+            due = self.writes % self.PRUNE_EVERY == 0
+        if due:
+            self.prune()
+
+    def prune(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith('.'):
+                continue
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                pass
+        entries.sort()
+        for _, path in entries[:-self.max_entries]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def make_cache(kind, directory, max_entries):
+    if kind == 'memory':
+        return MemoryCache(max_entries)
+    if kind == 'file':
+        return FileCache(directory, max_entries)
+    return None
+
+
+# ── view decorator ───────────────────────────────────────────────────────────
+
+def cached_page(view):
+    """Serve a rendered GET page from the page cache, with ETag revalidation.
+
+    The key covers the household, path, query string, ingress prefix, data
+    version and today's date (countdowns change at midnight), so entries
+    never need explicit invalidation; stale ones just age out of the LRU.
+    Requests with pending flash messages bypass the cache entirely.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        cache = current_app.extensions.get('page_cache')
+        if cache is None or request.method != 'GET' or session.get('_flashes'):
+            return view(*args, **kwargs)
+
+        tenant = current_tenant()
+        key = '|'.join([tenant.name if tenant else '', request.script_root, request.path,
+                        request.query_string.decode('latin-1'),
+                        str(data_version()), datetime.date.today().isoformat()])
+        etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        if etag in request.if_none_match:
+            response = current_app.response_class(status=304)
+            response.set_etag(etag)
+            response.cache_control.no_cache = True
+            return response
+
+        entry = cache.get(key)
+        if entry is None:
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200 or session.get('_flashes'):
+                return response
+            entry = (response.get_data(), response.mimetype)
+            try:
+                cache.set(key, entry)
+            except OSError as e:
+                current_app.logger.warning(f"Page cache write failed: {e}")
+            state = 'MISS'
+        else:
+            state = 'HIT'
+        body, mimetype = entry
+        response = current_app.response_class(body, mimetype=mimetype)
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        response.headers['X-Cache'] = state
+        return response
+    return wrapper
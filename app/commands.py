@@ -0,0 +1,204 @@
+import click
+
+
+def register_commands(app):
+    """Attach maintenance commands to `flask --app wsgi <command>`."""
+
+    @app.cli.command('rebuild-events')
+    def rebuild_events():
+        """Rebuild the dashboard calendar index from people and occasions."""
+        from .events import rebuild_event_index
+        count = rebuild_event_index()
+        click.echo(f'Indexed {count} calendar events.')
+
+    @app.cli.command('thumbnails')
+    @click.option('--force', is_flag=True, help='Regenerate variants that already exist.')
+    def thumbnails(force):
+        """Generate resized variants for every uploaded gift image."""
+        import os
+        from . import db
+        from .images import make_variants, missing_variants
+        from .models import Gift
+        folder = app.config['UPLOAD_FOLDER']
+        done = failed = 0
+        for (filename,) in db.session.query(Gift.image_path).filter(Gift.image_path.isnot(None)).distinct():
+            if not os.path.exists(os.path.join(folder, filename)):
+                continue
+            if not force and not missing_variants(folder, filename):
+                continue
+            try:
+                make_variants(folder, filename, force)
+                done += 1
+            except Exception as e:
+                click.echo(f'{filename}: {e}', err=True)
+                failed += 1
+        click.echo(f'Generated variants for {done} image(s), {failed} failed.')
+
+    @app.cli.command('dedupe-images')
+    def dedupe_images():
+        """Move pre-existing uploads to content-hash names, merging duplicates."""
+        import os
+        from . import db
+        from .images import delete_variants, make_variants, store_upload
+        from .models import Gift
+        folder = app.config['UPLOAD_FOLDER']
+        renamed = freed = 0
+        paths = [p for (p,) in db.session.query(Gift.image_path)
+                 .filter(Gift.image_path.isnot(None)).distinct()]
+        for old in paths:
+            old_path = os.path.join(folder, old)
+            if not os.path.exists(old_path):
+                continue
+            with open(old_path, 'rb') as f:
+                new, is_new = store_upload(f, folder, old.rsplit('.', 1)[-1].lower())
+            if new == old:
+                continue
+            Gift.query.filter_by(image_path=old).update({'image_path': new})
+            db.session.commit()
+            if is_new:
+                make_variants(folder, new)
+            else:
+                freed += os.path.getsize(old_path)
+            os.remove(old_path)
+            delete_variants(folder, old)
+            renamed += 1
+        click.echo(f'Renamed {renamed} image(s), freed {freed} bytes of duplicates.')
+
+    @app.cli.command('check-rollup')
+    def check_rollup():
+        """Compare the spending rollup with a fresh aggregate, then rebuild it."""
+        from . import db
+        from .rollup import compare_rollup, rebuild_rollup
+        with db.engine.begin() as conn:
+            mismatches = compare_rollup(conn)
+            for key, stored, fresh in mismatches:
+                click.echo(f'{key}: stored {stored}, fresh {fresh}')
+            rebuild_rollup(conn)
+            remaining = compare_rollup(conn)
+        click.echo(f'{len(mismatches)} mismatched row(s) before rebuild, {len(remaining)} after.')
+        if mismatches:
+            raise SystemExit(1)
+
+    @app.cli.command('import-data')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--kind', type=click.Choice(['person', 'person_occasion', 'gift']), default='gift',
+                  help='Record type of a CSV file (JSON lines carry their own).')
+    @click.option('--dry-run', is_flag=True, help='Validate without writing anything.')
+    @click.option('--chunk-size', default=500, show_default=True, help='Records per transaction.')
+    def import_data(path, kind, dry_run, chunk_size):
+        """Import people, occasions or gifts from CSV or JSON lines."""
+        from .transfer import Importer, read_csv, read_ndjson
+        with open(path, 'rb') as f:
+            json_lines = path.lower().endswith(('.json', '.jsonl', '.ndjson'))
+            records = read_ndjson(f) if json_lines else read_csv(f, kind)
+            importer = Importer(dry_run=dry_run, chunk_size=chunk_size).run(records)
+        for line_num, message in importer.errors:
+            click.echo(f'line {line_num}: {message}', err=True)
+        click.echo(importer.summary())
+        if importer.error_count:
+            raise SystemExit(1)
+
+    @app.cli.command('export-data')
+    @click.option('--kind', type=click.Choice(['person', 'person_occasion', 'gift']), default='gift')
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'json']), default='csv',
+                  help='json writes every kind as JSON lines.')
+    @click.option('--output', '-o', type=click.File('w'), default='-')
+    def export_data(kind, fmt, output):
+        """Stream people, occasions or gifts to CSV, or everything to JSON lines."""
+        from .transfer import export_csv, export_ndjson
+        for chunk in (export_ndjson() if fmt == 'json' else export_csv(kind)):
+            output.write(chunk)
+
+    @app.cli.command('backup')
+    @click.option('--output', '-o', type=click.Path(dir_okay=False),
+                  help='Write a zip archive here instead of a snapshot in the backup folder.')
+    def backup_command(output):
+        """Snapshot the database and images without stopping the app."""
+        from . import db
+        from .backup import create_snapshot, stream_archive
+        if output:
+            with open(output, 'wb') as f:
+                for chunk in stream_archive(db.engine, app.config['UPLOAD_FOLDER']):
+                    f.write(chunk)
+            click.echo(f'Wrote {output}.')
+        else:
+            name = create_snapshot(db.engine, app.config['UPLOAD_FOLDER'], app.config['BACKUP_DIR'],
+                                   int(app.config['ADDON_OPTIONS']['backup_keep']))
+            click.echo(f"Saved snapshot {name} in {app.config['BACKUP_DIR']}.")
+
+    @app.cli.command('restore')
+    @click.argument('source', type=click.Path(exists=True))
+    def restore_command(source):
+        """Restore a backup zip or a snapshot folder over the current data."""
+        from . import db
+        from .backup import RestoreError, restore
+        try:
+            manifest = restore(source, db.engine, app.config['UPLOAD_FOLDER'], app.config['DATA_DIR'])
+        except RestoreError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Restored backup from {manifest['created']} ({len(manifest['images'])} image(s)).")
+
+    @app.cli.command('reminders')
+    @click.option('--days', type=int, default=30, help='How far ahead to list.')
+    @click.option('--test', is_flag=True, help='Send the first listed reminder to the configured endpoint now.')
+    def reminders_command(days, test):
+        """List upcoming birthday/occasion reminders, optionally sending one."""
+        import datetime
+        from . import db
+        from .reminders import ReminderQueue, endpoint, fire_time, lead_days, load_events, send
+        options = app.config['ADDON_OPTIONS']
+        queue = ReminderQueue(lead_days(options['reminder_lead_days']), fire_time(options['reminder_time']))
+        now = datetime.datetime.now()
+        with db.engine.connect() as conn:
+            queue.sync(load_events(conn), now)
+        upcoming = queue.upcoming(now + datetime.timedelta(days=days))
+        for fire_at, event, lead, date in upcoming:
+            click.echo(f"{fire_at:%Y-%m-%d %H:%M}  {event.payload(date, lead)['message']}")
+        if not upcoming:
+            click.echo(f'No reminders in the next {days} days.')
+        if test:
+            target = endpoint(options)
+            if target is None:
+                raise click.ClickException('Set reminder_webhook_url or reminder_notify_service first.')
+            if not upcoming:
+                raise click.ClickException('Nothing to send.')
+            _, event, lead, date = upcoming[0]
+            send(target, event.payload(date, lead))
+            click.echo(f'Sent to {target[0]}.')
+
+    @app.cli.command('jobs')
+    @click.option('--run', 'run_due', is_flag=True, help='Run every due job now, in this process.')
+    @click.option('--retry', is_flag=True, help='Queue failed jobs again.')
+    def jobs_command(run_due, retry):
+        """Show the background job queue, optionally retrying or running jobs."""
+        import time
+        from sqlalchemy import text
+        from .jobs import queue_depth
+        queue = app.extensions['jobs']
+        with queue.engine.begin() as conn:
+            if retry:
+                count = conn.execute(text("""UPDATE job SET failed_at = NULL, attempts = 0,
+                                                  run_at = :now WHERE failed_at IS NOT NULL"""),
+                                     {'now': time.time()}).rowcount
+                click.echo(f'Queued {count} failed job(s) again.')
+            for kind, attempts, error in conn.execute(text(
+                    "SELECT kind, attempts, last_error FROM job WHERE failed_at IS NOT NULL ORDER BY id")):
+                click.echo(f'failed {kind} after {attempts} attempt(s): {error}')
+        if run_due:
+            click.echo(f'Ran {queue.drain()} job(s).')
+        with queue.engine.connect() as conn:
+            depth = queue_depth(conn)
+        click.echo(', '.join(f'{count} {state}' for state, count in depth.items()))
+
+    @app.cli.command('gc-images')
+    @click.option('--dry-run', is_flag=True, help='Only report what would be removed.')
+    def gc_images(dry_run):
+        """Remove uploaded images and variants that no gift refers to."""
+        from .images import collect_garbage
+        from .jobs import GC_BATCH, IMAGE_GRACE_SECONDS, referenced_images
+        queue = app.extensions['jobs']
+        files, freed = collect_garbage(queue.upload_folder,
+                                       lambda names: referenced_images(queue.engine, names),
+                                       GC_BATCH, IMAGE_GRACE_SECONDS, dry_run=dry_run)
+        verb = 'Would remove' if dry_run else 'Removed'
+        click.echo(f'{verb} {files} orphaned file(s), {freed} bytes.')
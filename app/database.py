@@ -0,0 +1,91 @@
+import logging
+import threading
+from flask import has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_MODES = {'wal', 'delete', 'truncate', 'persist', 'memory'}
+SYNCHRONOUS_MODES = {'off', 'normal', 'full', 'extra'}
+
+
+def engine_options(options):
+    """SQLALCHEMY_ENGINE_OPTIONS for one SQLite file shared by a few workers."""
+    return {
+        'pool_size': int(options['sqlite_pool_size']),
+        'max_overflow': int(options['sqlite_pool_size']) * 2,
+        'pool_timeout': 30,
+        'connect_args': {
+            'timeout': int(options['sqlite_busy_timeout_ms']) / 1000,
+            'check_same_thread': False,
+        },
+    }
+
+
+def configure_sqlite(engine, options):
+    """Apply connection pragmas and explicit transaction handling to `engine`.
+
+    pysqlite normally opens a deferred transaction lazily; a request that
+    reads first and writes later then has to upgrade its lock and, under WAL,
+    fails immediately with "database is locked" if another worker committed
+    meanwhile. Instead we issue BEGIN ourselves: IMMEDIATE for non-GET
+    requests, so writers queue on the busy timeout up front.
+    """
+    journal_mode = str(options['sqlite_journal_mode']).lower()
+    synchronous = str(options['sqlite_synchronous']).lower()
+    if journal_mode not in JOURNAL_MODES:
+        raise ValueError(f'Unsupported sqlite_journal_mode: {journal_mode}')
+    if synchronous not in SYNCHRONOUS_MODES:
+        raise ValueError(f'Unsupported sqlite_synchronous: {synchronous}')
+    pragmas = [
+        f"PRAGMA journal_mode={journal_mode}",
+        f"PRAGMA synchronous={synchronous}",
+        f"PRAGMA busy_timeout={int(options['sqlite_busy_timeout_ms'])}",
+        f"PRAGMA cache_size=-{int(options['sqlite_cache_size_kb'])}",
+        f"PRAGMA mmap_size={int(options['sqlite_mmap_size_mb']) * 1024 * 1024}",
+        f"PRAGMA foreign_keys={'ON' if options['sqlite_foreign_keys'] else 'OFF'}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_conn, connection_record):
+        dbapi_conn.isolation_level = None   # we emit BEGIN in on_begin
+        cursor = dbapi_conn.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def on_begin(conn):
+        writing = has_request_context() and request.method not in ('GET', 'HEAD', 'OPTIONS')
+        conn.exec_driver_sql('BEGIN IMMEDIATE' if writing else 'BEGIN')
+
+
+def start_checkpointer(engine, interval):
+    """Run a PASSIVE WAL checkpoint every `interval` seconds in a daemon thread.
+
+    SQLite's auto-checkpoint only runs on commit, so a burst of writes
+    followed by read-only traffic can leave a large WAL behind; this keeps
+    it folded back into the main file.
+    """
+    if not interval or engine.url.get_backend_name() != 'sqlite':
+        return None
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            try:
+                # Raw DBAPI connection: the checkpoint must run outside a transaction
+                conn = engine.raw_connection()
+                try:
+                    busy, log_pages, done = conn.cursor().execute(
+                        "PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+                finally:
+                    conn.close()
+                logger.debug(f"WAL checkpoint: {done}/{log_pages} pages (busy={busy})")
+            except Exception as e:
+                logger.warning(f"WAL checkpoint failed: {e}")
+
+    thread = threading.Thread(target=run, name='wal-checkpoint', daemon=True)
+    thread.start()
+    return stop
@@ -0,0 +1,112 @@
+import datetime
+from sqlalchemy.orm import joinedload
+from . import db
+from .models import Person, CalendarEvent
+
+
+# ── keys ─────────────────────────────────────────────────────────────────────
+
+def day_key(month, day):
+    """Sortable MMDD ordinal for a recurring annual date."""
+    return month * 100 + day
+
+
+def is_leap(year):
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+
+def start_key(today):
+    """Key at which today's events begin.
+
+    In non-leap years Feb 29 dates fall on Mar 1 (see next_occurrence), so
+    on Mar 1 the window has to start at 0229 to pick them up.
+    """
+    if today.month == 3 and today.day == 1 and not is_leap(today.year):
+        return day_key(2, 29)
+    return day_key(today.month, today.day)
+
+
+def occurrence(year, month, day):
+    """The date an annual month/day falls on in `year` (Feb 29 → Mar 1 off leap years)."""
+    try:
+        return datetime.date(year, month, day)
+    except ValueError:
+        return datetime.date(year, 3, 1)   # Feb 29 fallback
+
+
+def next_occurrence(today, month, day):
+    """Return (next_date, days_until) for a recurring annual date."""
+    next_date = occurrence(today.year, month, day)
+    if next_date < today:
+        next_date = occurrence(today.year + 1, month, day)
+    return next_date, (next_date - today).days
+
+
+# ── maintenance ──────────────────────────────────────────────────────────────
+
+def index_person_events(person):
+    """Replace a person's calendar rows with their birthday and current occasions.
+
+    Call before committing any change to the person's birthday or occasions;
+    the old rows are removed by the delete-orphan cascade on Person.events.
+    """
+    events = [CalendarEvent(month=person.birthday_month,
+                            day=person.birthday_day,
+                            day_key=day_key(person.birthday_month, person.birthday_day))]
+    for occ in person.occasions:
+        events.append(CalendarEvent(person_occasion_id=occ.id,
+                                    occasion_id=occ.occasion_id,
+                                    month=occ.month,
+                                    day=occ.day,
+                                    day_key=day_key(occ.month, occ.day)))
+    person.events = events
+
+
+def rebuild_event_index():
+    """Drop and repopulate the whole calendar index; return the row count."""
+    CalendarEvent.query.delete()
+    db.session.flush()
+    people = Person.query.options(joinedload(Person.occasions)).all()
+    for person in people:
+        index_person_events(person)
+    db.session.commit()
+    return CalendarEvent.query.count()
+
+
+# ── queries ──────────────────────────────────────────────────────────────────
+
+def _events_query():
+    return (CalendarEvent.query
+            .options(joinedload(CalendarEvent.person).joinedload(Person.relation),
+                     joinedload(CalendarEvent.occasion)))
+
+
+def upcoming_events(today, limit=10):
+    """Return the next `limit` CalendarEvent rows in calendar order from today."""
+    key = start_key(today)
+    rows = (_events_query()
+            .filter(CalendarEvent.day_key >= key)
+            .order_by(CalendarEvent.day_key, CalendarEvent.id)
+            .limit(limit)
+            .all())
+    if len(rows) < limit:
+        rows += (_events_query()
+                 .filter(CalendarEvent.day_key < key)
+                 .order_by(CalendarEvent.day_key, CalendarEvent.id)
+                 .limit(limit - len(rows))
+                 .all())
+    return rows
+
+
+def count_events_within(today, days):
+    """Count events occurring between today and today + days (inclusive)."""
+    start = start_key(today)
+    end_date = today + datetime.timedelta(days=days)
+    end = day_key(end_date.month, end_date.day)
+    query = CalendarEvent.query
+    if end_date.year == today.year:
+        query = query.filter(CalendarEvent.day_key.between(start, end))
+    else:
+        query = query.filter(db.or_(CalendarEvent.day_key >= start,
+                                    CalendarEvent.day_key <= end))
+    return query.count()
@@ -0,0 +1,186 @@
+import hashlib
+import os
+import tempfile
+import time
+from PIL import Image, ImageOps, features
+
+# Downscaled copies generated for every upload, keyed by longest edge in px.
+# Each lives in its own subfolder of UPLOAD_FOLDER as <original name>.<ext>.
+VARIANTS = {'card': 640, 'thumb': 160}
+VARIANT_FORMAT, VARIANT_EXT = ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+SAVE_OPTIONS = {
+    'WEBP': {'quality': 82, 'method': 4},
+    'JPEG': {'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+
+def store_upload(stream, upload_folder, ext):
+    """Write an upload under the SHA-256 of its bytes; return (filename, is_new).
+
+    Identical files map to the same name, so re-uploading a photo (or
+    assigning a pool gift) reuses the stored copy instead of duplicating it.
+    """
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=upload_folder, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: stream.read(64 * 1024), b''):
+                digest.update(chunk)
+                out.write(chunk)
+        filename = f'{digest.hexdigest()}.{ext}'
+        path = os.path.join(upload_folder, filename)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            os.utime(path)   # marks it recently used, see collect_garbage()
+            return filename, False
+        os.replace(tmp_path, path)
+        return filename, True
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def variant_path(upload_folder, filename, variant):
+    return os.path.join(upload_folder, variant, f'{filename}.{VARIANT_EXT}')
+
+
+def save_image(image, path):
+    """Write `image` as a variant to `path` atomically.
+
+    Each writer gets its own temporary file, so the job queue and on-demand
+    generation can race on the same variant without either serving or
+    moving a half-written file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            image.save(out, VARIANT_FORMAT, **SAVE_OPTIONS[VARIANT_FORMAT])
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def make_variants(upload_folder, filename, force=False):
+    """Decode an uploaded image once and write every missing size variant.
+
+    The image is rotated according to its EXIF orientation first, and
+    variants are produced largest to smallest so each resize starts from
+    the previous, already reduced, copy. With `force`, existing variants
+    are written again too.
+    """
+    missing = list(VARIANTS) if force else missing_variants(upload_folder, filename)
+    if not missing:
+        return
+    with Image.open(os.path.join(upload_folder, filename)) as original:
+        image = ImageOps.exif_transpose(original)
+        if VARIANT_FORMAT == 'JPEG' or image.mode not in ('RGB', 'RGBA'):
+            keep_alpha = VARIANT_FORMAT == 'WEBP' and 'A' in image.getbands()
+            image = image.convert('RGBA' if keep_alpha else 'RGB')
+        for variant, size in sorted(VARIANTS.items(), key=lambda v: -v[1]):
+            image.thumbnail((size, size), Image.LANCZOS)
+            path = variant_path(upload_folder, filename, variant)
+            if variant not in missing or (not force and os.path.exists(path)):
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            save_image(image, path)
+
+
+def delete_variants(upload_folder, filename):
+    for variant in VARIANTS:
+        path = variant_path(upload_folder, filename, variant)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def missing_variants(upload_folder, filename):
+    return [v for v in VARIANTS if not os.path.exists(variant_path(upload_folder, filename, v))]
+
+
+def _remove(path):
+    """Delete a file if present; return the bytes freed."""
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+    except FileNotFoundError:
+        return 0
+    return size
+
+
+def remove_upload(upload_folder, filename, grace=0):
+    """Delete an original and its variants unless modified within `grace` seconds.
+
+    store_upload() touches a reused file, so a copy that a request has just
+    picked up again survives the reference check that preceded this call.
+    Returns the bytes freed, or None if the file was kept.
+    """
+    path = os.path.join(upload_folder, filename)
+    try:
+        if grace and time.time() - os.path.getmtime(path) < grace:
+            return None
+    except FileNotFoundError:
+        pass
+    freed = _remove(path)
+    for variant in VARIANTS:
+        freed += _remove(variant_path(upload_folder, filename, variant))
+    return freed
+
+
+def collect_garbage(upload_folder, referenced, batch_size=500, grace=3600, dry_run=False):
+    """Remove uploads no gift refers to; return (files, bytes) reclaimed.
+
+    `referenced(names)` returns the subset of a batch of names still in use.
+    Originals are checked batch by batch, then variants left without an
+    original and abandoned .upload- temp files are swept. Anything modified
+    in the last `grace` seconds is left alone: it may belong to a request
+    that has stored its upload but not committed yet.
+    """
+    cutoff = time.time() - grace
+    files = freed = 0
+
+    def reclaim(path, size):
+        nonlocal files, freed
+        if not dry_run:
+            os.remove(path)
+        files += 1
+        freed += size
+
+    batch = []
+
+    def flush():
+        in_use = referenced([name for name, _ in batch])
+        for name, entry in batch:
+            if name not in in_use:
+                reclaim(entry.path, entry.stat().st_size)
+                for variant in VARIANTS:
+                    path = variant_path(upload_folder, name, variant)
+                    if os.path.exists(path):
+                        reclaim(path, os.path.getsize(path))
+        batch.clear()
+
+    for entry in os.scandir(upload_folder):
+        if not entry.is_file() or entry.stat().st_mtime >= cutoff:
+            continue
+        if entry.name.startswith('.upload-'):
+            reclaim(entry.path, entry.stat().st_size)
+        elif not entry.name.startswith('.'):
+            batch.append((entry.name, entry))
+            if len(batch) >= batch_size:
+                flush()
+    if batch:
+        flush()
+
+    suffix = f'.{VARIANT_EXT}'
+    for variant in VARIANTS:
+        folder = os.path.join(upload_folder, variant)
+        if not os.path.isdir(folder):
+            continue
+        for entry in os.scandir(folder):
+            if not entry.is_file() or entry.stat().st_mtime >= cutoff:
+                continue
+            original = entry.name[:-len(suffix)] if entry.name.endswith(suffix) else None
+            if original is None or not os.path.exists(os.path.join(upload_folder, original)):
+                reclaim(entry.path, entry.stat().st_size)
+    return files, freed
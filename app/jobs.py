@@ -0,0 +1,301 @@
+"""Durable background jobs stored in each household's SQLite database.
+
+Requests enqueue work in the same transaction as the change that calls for
+it (a new upload needs variants, a deleted gift may free its image), so a
+job exists exactly when that change committed. Worker threads in every
+gunicorn process claim due jobs with a single UPDATE ... RETURNING, which
+holds SQLite's write lock, so a job runs in one place at a time. A claim
+is a lease: if its worker dies, the job becomes due again when the lease
+runs out. Failures are retried with exponential backoff and parked as
+failed after MAX_ATTEMPTS; `flask jobs --retry` puts them back.
+
+Jobs with `every` set are periodic: instead of being deleted when they
+finish they are rescheduled, which is how the orphaned-image GC runs.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session, scoped_session
+from . import images
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = 5           # other processes' jobs are noticed this late at most
+LEASE_SECONDS = 600        # a claimed job is retried if not finished by then
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 30       # doubled per attempt
+MAX_BACKOFF_SECONDS = 3600
+IMAGE_GRACE_SECONDS = 300  # uploads touched this recently are never deleted
+GC_BATCH = 500
+
+JOB_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS job (
+           id INTEGER PRIMARY KEY,
+           kind VARCHAR(50) NOT NULL,
+           payload TEXT NOT NULL DEFAULT '{}',
+           dedupe_key VARCHAR(300) UNIQUE,
+           run_at FLOAT NOT NULL,
+           every FLOAT,
+           attempts INTEGER NOT NULL DEFAULT 0,
+           locked_until FLOAT,
+           last_error TEXT,
+           failed_at FLOAT,
+           created_at FLOAT NOT NULL)""",
+    "CREATE INDEX IF NOT EXISTS ix_job_due ON job (run_at) WHERE failed_at IS NULL",
+]
+
+ENQUEUE_SQL = text("""
+    INSERT OR IGNORE INTO job (kind, payload, dedupe_key, run_at, created_at)
+    VALUES (:kind, :payload, :key, :run_at, :now)""")
+DUE_WHERE = """failed_at IS NULL AND run_at <= :now
+                    AND (locked_until IS NULL OR locked_until <= :now)"""
+DUE_SQL = text(f"SELECT 1 FROM job WHERE {DUE_WHERE} LIMIT 1")
+CLAIM_SQL = text(f"""
+    UPDATE job SET attempts = attempts + 1, locked_until = :lease
+     WHERE id = (SELECT id FROM job
+                  WHERE {DUE_WHERE}
+                  ORDER BY run_at, id LIMIT 1)
+    RETURNING id, kind, payload, attempts, every""")
+DEPTH_SQL = text("""
+    SELECT SUM(failed_at IS NULL AND (locked_until IS NULL OR locked_until <= :now)),
+           SUM(failed_at IS NULL AND locked_until > :now),
+           SUM(failed_at IS NOT NULL)
+      FROM job""")
+
+HANDLERS = {}
+_wakeup = threading.Event()
+_WAKE_KEY = 'giftguardian.jobs'
+
+
+def install_job_queue(conn):
+    for statement in JOB_SCHEMA:
+        conn.execute(text(statement))
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_after_commit(session):
+    if session.info.pop(_WAKE_KEY, False):
+        _wakeup.set()
+
+
+def enqueue(target, kind, payload=None, key=None, delay=0):
+    """Add a job in `target`'s transaction (a session or connection).
+
+    Jobs with a `key` are deduplicated: while one with that key is queued,
+    enqueueing another is a no-op. Workers in this process are woken once
+    the session commits.
+    """
+    now = time.time()
+    target.execute(ENQUEUE_SQL, {'kind': kind, 'payload': json.dumps(payload or {}), 'key': key,
+                                 'run_at': now + delay, 'now': now})
+    if isinstance(target, (Session, scoped_session)):
+        target.info[_WAKE_KEY] = True
+    else:
+        _wakeup.set()
+
+
+def handler(kind):
+    """Register the function that runs jobs of `kind` as fn(queue, payload)."""
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def backoff(attempts):
+    return min(BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+
+
+def queue_depth(conn):
+    """{'pending', 'running', 'failed'} job counts."""
+    row = conn.execute(DEPTH_SQL, {'now': time.time()}).one()
+    return dict(zip(('pending', 'running', 'failed'), (count or 0 for count in row)))
+
+
+# ── queues and workers ───────────────────────────────────────────────────────
+
+class JobQueue:
+    """The job table of one household: its engine and upload folder."""
+
+    def __init__(self, engine, upload_folder, name='', registry=None):
+        self.engine = engine
+        self.upload_folder = upload_folder
+        self.name = name
+        self.registry = registry   # metrics.Registry, if any
+
+    def schedule(self, kind, every):
+        """Keep one periodic `kind` job running every `every` seconds (0 removes it)."""
+        key = f'periodic:{kind}'
+        with self.engine.begin() as conn:
+            if not every:
+                conn.execute(text("DELETE FROM job WHERE dedupe_key = :key"), {'key': key})
+                return
+            now = time.time()
+            conn.execute(text("""
+                INSERT INTO job (kind, payload, dedupe_key, run_at, every, created_at)
+                VALUES (:kind, '{}', :key, :now, :every, :now)
+                ON CONFLICT (dedupe_key) DO UPDATE SET every = excluded.every"""),
+                {'kind': kind, 'key': key, 'now': now, 'every': every})
+
+    def claim(self):
+        """Lease the next due job, or return None.
+
+        Idle polls only read: the UPDATE, which takes SQLite's write lock,
+        runs only once a due job has been seen.
+        """
+        now = time.time()
+        with self.engine.connect() as conn:
+            if conn.execute(DUE_SQL, {'now': now}).first() is None:
+                return None
+        with self.engine.begin() as conn:
+            return conn.execute(CLAIM_SQL, {'now': now, 'lease': now + LEASE_SECONDS}).first()
+
+    def run_one(self):
+        """Claim and run one due job; return False if none was due."""
+        job = self.claim()
+        if job is None:
+            return False
+        fn = HANDLERS.get(job.kind)
+        try:
+            if fn is None:
+                raise LookupError(f'no handler for job kind {job.kind!r}')
+            fn(self, json.loads(job.payload))
+        except Exception as e:
+            self._failed(job, e)
+            outcome = 'retry' if job.every or job.attempts < MAX_ATTEMPTS else 'failed'
+        else:
+            self._done(job)
+            outcome = 'done'
+        if self.registry is not None:
+            self.registry.inc('giftguardian_jobs_total', {'kind': job.kind, 'outcome': outcome})
+        return True
+
+    def _done(self, job):
+        with self.engine.begin() as conn:
+            if job.every:
+                conn.execute(text("""UPDATE job SET run_at = :next, attempts = 0, locked_until = NULL,
+                                                    last_error = NULL WHERE id = :id"""),
+                             {'id': job.id, 'next': time.time() + job.every})
+            else:
+                conn.execute(text("DELETE FROM job WHERE id = :id"), {'id': job.id})
+
+    def _failed(self, job, error):
+        label = f'{self.name}/' if self.name else ''
+        logger.warning(f"Job {label}{job.kind}#{job.id} failed (attempt {job.attempts}): {error}")
+        params = {'id': job.id, 'error': str(error)[:1000], 'now': time.time()}
+        with self.engine.begin() as conn:
+            if job.every or job.attempts < MAX_ATTEMPTS:
+                delay = min(backoff(job.attempts), job.every) if job.every else backoff(job.attempts)
+                conn.execute(text("""UPDATE job SET run_at = :now + :delay, locked_until = NULL,
+                                                    last_error = :error WHERE id = :id"""),
+                             dict(params, delay=delay))
+            else:
+                conn.execute(text("""UPDATE job SET failed_at = :now, locked_until = NULL,
+                                                    last_error = :error WHERE id = :id"""), params)
+
+    def drain(self, limit=None):
+        """Run due jobs inline until none is left (or `limit` ran); return the count."""
+        count = 0
+        while (limit is None or count < limit) and self.run_one():
+            count += 1
+        return count
+
+
+class _Stop(threading.Event):
+    """Stop event that also wakes idle workers, so they exit promptly."""
+
+    def set(self):
+        super().set()
+        _wakeup.set()
+
+
+def start_job_workers(queues, threads, periodic):
+    """Run `threads` worker threads over the queues returned by `queues()`.
+
+    `queues` is called on every pass, so households opened later are
+    picked up; `periodic` maps job kinds to their interval in seconds and
+    is applied to each queue the first time a worker sees it. Returns a
+    stop event, or None when `threads` is 0.
+    """
+    if not threads:
+        return None
+    stop = _Stop()
+    seen = set()
+    seen_lock = threading.Lock()
+
+    def run():
+        while not stop.is_set():
+            busy = False
+            try:
+                with queues() as current:
+                    for queue in current:
+                        with seen_lock:
+                            first = queue.name not in seen
+                            seen.add(queue.name)
+                        if first:
+                            for kind, every in periodic.items():
+                                queue.schedule(kind, every)
+                        busy = queue.run_one() or busy
+            except Exception as e:
+                logger.warning(f"Job worker error: {e}")
+            if not busy:
+                _wakeup.wait(POLL_SECONDS)
+                _wakeup.clear()
+
+    for i in range(threads):
+        threading.Thread(target=run, name=f'job-worker-{i}', daemon=True).start()
+    return stop
+
+
+# ── handlers ─────────────────────────────────────────────────────────────────
+
+def referenced_images(engine, names):
+    """The subset of `names` some gift's image_path still points at."""
+    if not names:
+        return set()
+    params = {f'p{i}': name for i, name in enumerate(names)}
+    placeholders = ', '.join(f':{key}' for key in params)
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(
+            text(f"SELECT DISTINCT image_path FROM gift WHERE image_path IN ({placeholders})"), params)}
+
+
+@handler('image_variants')
+def make_image_variants(queue, payload):
+    filename = payload['filename']
+    if not os.path.exists(os.path.join(queue.upload_folder, filename)):
+        return   # already deleted again
+    if images.missing_variants(queue.upload_folder, filename):
+        images.make_variants(queue.upload_folder, filename)
+
+
+@handler('delete_images')
+def delete_unreferenced_images(queue, payload):
+    paths = set(payload['paths'])
+    freed, kept = 0, []
+    for filename in sorted(paths - referenced_images(queue.engine, sorted(paths))):
+        removed = images.remove_upload(queue.upload_folder, filename, IMAGE_GRACE_SECONDS)
+        if removed is None:
+            kept.append(filename)
+        else:
+            freed += removed
+    if kept:
+        # Touched by a request that may not have committed its reference yet
+        with queue.engine.begin() as conn:
+            enqueue(conn, 'delete_images', {'paths': kept}, delay=IMAGE_GRACE_SECONDS)
+    if freed and queue.registry is not None:
+        queue.registry.inc('giftguardian_image_bytes_freed_total', {'source': 'delete'}, freed)
+
+
+@handler('image_gc')
+def collect_image_garbage(queue, payload):
+    files, freed = images.collect_garbage(
+        queue.upload_folder, lambda names: referenced_images(queue.engine, names),
+        GC_BATCH, IMAGE_GRACE_SECONDS)
+    label = f' for {queue.name}' if queue.name else ''
+    logger.info(f"Image GC{label}: removed {files} orphaned file(s), {freed / 1024:.0f} KiB freed")
+    if freed and queue.registry is not None:
+        queue.registry.inc('giftguardian_image_bytes_freed_total', {'source': 'gc'}, freed)
@@ -0,0 +1,245 @@
+import json
+import logging
+import os
+import threading
+import time
+from flask import before_render_template, has_request_context, request, template_rendered
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Per-request counters live in the WSGI environ under this key; the
+# middleware creates the dict and the hooks below fill it in.
+ENVIRON_KEY = 'giftguardian.metrics'
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+COUNTERS = {
+    'giftguardian_http_requests_total': 'HTTP requests by endpoint, method and status.',
+    'giftguardian_sql_queries_total': 'SQL statements executed, by endpoint.',
+    'giftguardian_sql_seconds_total': 'Time spent executing SQL, by endpoint.',
+    'giftguardian_template_render_seconds_total': 'Time spent rendering templates, by template.',
+    'giftguardian_jobs_total': 'Background jobs run, by kind and outcome (done, retry, failed).',
+    'giftguardian_image_bytes_freed_total': 'Bytes of uploaded images deleted, by source (delete, gc).',
+}
+GAUGES = {
+    'giftguardian_job_queue_depth': 'Background jobs in the queue, by state.',
+}
+HISTOGRAMS = {
+    'giftguardian_http_request_duration_seconds': 'Time until the response starts, by endpoint.',
+}
+
+
+class Registry:
+    """Counters and histograms for one worker, shared through snapshot files.
+
+    Each gunicorn worker writes its totals to <directory>/<pid>.json at most
+    once per flush interval; collect() sums every file, so /metrics answers
+    for the whole server whichever worker handles it. Files of exited
+    workers are kept so counters never go backwards.
+    """
+
+    def __init__(self, directory, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        # Held across snapshot and write so the file never goes back in time
+        self.flush_lock = threading.Lock()
+        self.counters = {}      # (name, labels) -> value
+        self.histograms = {}    # (name, labels) -> [bucket counts..., +Inf count, sum]
+        self.dirty = False
+        self.flusher_pid = None
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self.dirty = True
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            series = self.histograms.setdefault(key, [0] * (len(BUCKETS) + 2))
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(BUCKETS)] += 1
+            series[-1] += value
+            self.dirty = True
+        self._ensure_flusher()
+
+    def record_request(self, endpoint, method, status, duration, stats):
+        self.inc('giftguardian_http_requests_total',
+                 {'endpoint': endpoint, 'method': method, 'status': str(status)})
+        self.observe('giftguardian_http_request_duration_seconds',
+                     {'endpoint': endpoint, 'method': method}, duration)
+        if stats['sql_count']:
+            self.inc('giftguardian_sql_queries_total', {'endpoint': endpoint}, stats['sql_count'])
+            self.inc('giftguardian_sql_seconds_total', {'endpoint': endpoint}, stats['sql_time'])
+        for template, seconds in stats['templates'].items():
+            self.inc('giftguardian_template_render_seconds_total', {'template': template}, seconds)
+
+    # ── sharing between workers ──────────────────────────────────────────────
+
+    def _ensure_flusher(self):
+        # Started lazily so a registry created before a fork gets its own thread
+        if self.flusher_pid == os.getpid():
+            return
+        self.flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+
+    def _flush_loop(self):
+        failing = False
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError as e:
+                # Retried every interval; logged once per run of failures
+                if not failing:
+                    logger.warning(f"Metrics flush failed: {e}")
+                failing = True
+            else:
+                failing = False
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                if not self.dirty:
+                    return
+                snapshot = {
+                    'counters': [[name, dict(labels), value] for (name, labels), value in self.counters.items()],
+                    'histograms': [[name, dict(labels), series] for (name, labels), series in self.histograms.items()],
+                }
+                self.dirty = False
+            path = os.path.join(self.directory, f'{os.getpid()}.json')
+            tmp_path = f'{path}.tmp'
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(tmp_path, 'w') as f:
+                    json.dump(snapshot, f)
+                os.replace(tmp_path, path)
+            except OSError:
+                with self.lock:
+                    self.dirty = True
+                raise
+
+    def collect(self):
+        """Sum the snapshots of every worker, including this one."""
+        try:
+            self.flush()
+        except OSError as e:
+            logger.warning(f"Metrics flush failed: {e}")
+        counters, histograms = {}, {}
+        if not os.path.isdir(self.directory):
+            return counters, histograms
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                with open(entry.path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(sorted(labels.items())))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, series in snapshot['histograms']:
+                key = (name, tuple(sorted(labels.items())))
+                total = histograms.setdefault(key, [0] * len(series))
+                for i, value in enumerate(series):
+                    total[i] += value
+        return counters, histograms
+
+
+def _labels(pairs, extra=()):
+    items = list(pairs) + list(extra)
+    if not items:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in items)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + '}'
+
+
+def render_prometheus(counters, histograms, gauges=()):
+    """Prometheus text exposition format (version 0.0.4).
+
+    `gauges` are (name, labels, value) read at scrape time rather than
+    summed from the worker snapshots.
+    """
+    lines = []
+    for name, help_text in COUNTERS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for (series_name, labels), value in sorted(counters.items()):
+            if series_name == name:
+                lines.append(f'{name}{_labels(labels)} {value:g}')
+    for name, help_text in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for (series_name, labels), series in sorted(histograms.items()):
+            if series_name != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), series[:-1]):
+                cumulative += count
+                le = bound if bound == '+Inf' else f'{bound:g}'
+                lines.append(f'{name}_bucket{_labels(labels, [("le", le)])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {series[-1]:g}')
+            lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+    for name, help_text in GAUGES.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+        for series_name, labels, value in gauges:
+            if series_name == name:
+                lines.append(f'{name}{_labels(sorted(labels.items()))} {value:g}')
+    return '\n'.join(lines) + '\n'
+
+
+# ── collection hooks ──────────────────────────────────────────────────────────
+
+def _request_stats():
+    if has_request_context():
+        return request.environ.get(ENVIRON_KEY)
+    return None
+
+
+def instrument_engine(engine):
+    """Count the SQL run on `engine` towards the current request's stats."""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_start'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop('query_start', time.perf_counter())
+        stats = _request_stats()
+        if stats is not None:
+            stats['sql_count'] += 1
+            stats['sql_time'] += elapsed
+
+
+def instrument(app, engine):
+    """Feed SQL and template timings of each request into its environ stats."""
+
+    @app.before_request
+    def note_endpoint():
+        stats = request.environ.get(ENVIRON_KEY)
+        if stats is not None:
+            stats['endpoint'] = request.endpoint or 'unmatched'
+
+    instrument_engine(engine)
+
+    def render_started(sender, template, context, **extra):
+        stats = _request_stats()
+        if stats is not None:
+            stats['render_start'].append(time.perf_counter())
+
+    def render_finished(sender, template, context, **extra):
+        stats = _request_stats()
+        if stats is not None and stats['render_start']:
+            elapsed = time.perf_counter() - stats['render_start'].pop()
+            name = template.name or 'string'
+            stats['templates'][name] = stats['templates'].get(name, 0) + elapsed
+
+    before_render_template.connect(render_started, app, weak=False)
+    template_rendered.connect(render_finished, app, weak=False)
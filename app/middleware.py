@@ -1,3 +1,13 @@
+import cProfile
+import os
+import re
+import time
+from .metrics import ENVIRON_KEY
+
+PROFILE_HEADER = 'HTTP_X_GIFTGUARDIAN_PROFILE'
+PROFILE_QUERY_RE = re.compile(r'(^|&)_profile=1(&|$)')
+
+
 class IngressMiddleware:
     def __init__(self, app):
         self.app = app
@@ -10,3 +20,62 @@ class IngressMiddleware:
             if path_info.startswith(script_name):
                 environ['PATH_INFO'] = path_info[len(script_name):]
         return self.app(environ, start_response)
+
+
+class MetricsMiddleware:
+    """Time each request and hand it, with its SQL/template stats, to `registry`.
+
+    The duration runs until the app returns its body iterable, so for
+    streamed responses it is time to first byte. When `profile_dir` is set,
+    a request carrying `X-GiftGuardian-Profile: 1` or `?_profile=1` runs
+    under cProfile and is dumped there as a .prof file (newest
+    `profile_keep` kept).
+    """
+
+    def __init__(self, app, registry, profile_dir=None, profile_keep=50):
+        self.app = app
+        self.registry = registry
+        self.profile_dir = profile_dir
+        self.profile_keep = profile_keep
+
+    def __call__(self, environ, start_response):
+        stats = environ[ENVIRON_KEY] = {
+            'endpoint': 'unmatched', 'sql_count': 0, 'sql_time': 0.0,
+            'templates': {}, 'render_start': [],
+        }
+        status = []
+
+        def capture_status(status_line, headers, exc_info=None):
+            status.append(status_line.split(' ', 1)[0])
+            return start_response(status_line, headers, exc_info)
+
+        profiler = cProfile.Profile() if self.should_profile(environ) else None
+        start = time.perf_counter()
+        try:
+            if profiler:
+                return profiler.runcall(self.app, environ, capture_status)
+            return self.app(environ, capture_status)
+        finally:
+            duration = time.perf_counter() - start
+            self.registry.record_request(stats['endpoint'], environ.get('REQUEST_METHOD', ''),
+                                         status[0] if status else '500', duration, stats)
+            if profiler:
+                self.dump_profile(profiler, stats['endpoint'], duration)
+
+    def should_profile(self, environ):
+        if not self.profile_dir:
+            return False
+        return (environ.get(PROFILE_HEADER) == '1'
+                or bool(PROFILE_QUERY_RE.search(environ.get('QUERY_STRING', ''))))
+
+    def dump_profile(self, profiler, endpoint, duration):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        name = f"{stamp}-{endpoint.replace('.', '_')}-{duration * 1000:.0f}ms-{os.getpid()}.prof"
+        profiler.dump_stats(os.path.join(self.profile_dir, name))
+        dumps = sorted(e for e in os.listdir(self.profile_dir) if e.endswith('.prof'))
+        for old in dumps[:-self.profile_keep]:
+            try:
+                os.remove(os.path.join(self.profile_dir, old))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,144 @@
+import contextlib
+import datetime
+import fcntl
+from flask import current_app
+from sqlalchemy import text
+from . import db
+
+
+# ── locking ──────────────────────────────────────────────────────────────────
+
+@contextlib.contextmanager
+def file_lock(path, blocking=True):
+    """Hold an exclusive flock on `path`; yields False if non-blocking and busy."""
+    with open(path, 'a') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# ── steps ────────────────────────────────────────────────────────────────────
+# Each step receives a connection inside the transaction that records it, and
+# must be safe to re-run against a database that already has the change. A
+# step that returns False could not apply yet (e.g. no FTS5 in this SQLite
+# build); it is left unrecorded and retried on the next start.
+
+def _gift_columns(conn):
+    existing_cols = {row[1] for row in conn.execute(text("PRAGMA table_info(gift)"))}
+    if 'image_url' not in existing_cols:
+        conn.execute(text("ALTER TABLE gift ADD COLUMN image_url VARCHAR(500)"))
+    if 'notes' not in existing_cols:
+        conn.execute(text("ALTER TABLE gift ADD COLUMN notes TEXT"))
+
+
+def _gift_search(conn):
+    from .search import ensure_gift_fts
+    return ensure_gift_fts(conn)
+
+
+def _calendar_backfill(conn):
+    if conn.execute(text("SELECT 1 FROM calendar_event LIMIT 1")).first():
+        return
+    conn.execute(text("""
+        INSERT INTO calendar_event (person_id, person_occasion_id, occasion_id, month, day, day_key)
+        SELECT id, NULL, NULL, birthday_month, birthday_day, birthday_month * 100 + birthday_day
+          FROM person
+        UNION ALL
+        SELECT person_id, id, occasion_id, month, day, month * 100 + day
+          FROM person_occasion"""))
+
+
+def _lookup_indexes(conn):
+    for statement in [
+        "CREATE INDEX IF NOT EXISTS ix_gift_person_year ON gift (person_id, year)",
+        "CREATE INDEX IF NOT EXISTS ix_gift_year ON gift (year)",
+        "CREATE INDEX IF NOT EXISTS ix_gift_status ON gift (status)",
+        "CREATE INDEX IF NOT EXISTS ix_gift_occasion_id ON gift (occasion_id)",
+        "CREATE INDEX IF NOT EXISTS ix_person_occasion_person_id ON person_occasion (person_id)",
+        "CREATE INDEX IF NOT EXISTS ix_person_name ON person (name)",
+    ]:
+        conn.execute(text(statement))
+
+
+def _image_path_index(conn):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_gift_image_path ON gift (image_path)"))
+
+
+def _gift_rollup(conn):
+    from .rollup import install_rollup
+    install_rollup(conn)
+
+
+def _data_version(conn):
+    from .cache import install_data_version
+    install_data_version(conn)
+
+
+def _job_queue(conn):
+    from .jobs import install_job_queue
+    install_job_queue(conn)
+
+
+def _gift_change_log(conn):
+    from .suggest import install_gift_change_log
+    install_gift_change_log(conn)
+
+
+MIGRATIONS = [
+    (1, 'gift image_url and notes columns', _gift_columns),
+    (2, 'gift full-text search index', _gift_search),
+    (3, 'calendar event backfill', _calendar_backfill),
+    (4, 'lookup indexes for gift and occasion filters', _lookup_indexes),
+    (5, 'gift image reference index', _image_path_index),
+    (6, 'gift spending rollup', _gift_rollup),
+    (7, 'data version counter for page caching', _data_version),
+    (8, 'background job queue', _job_queue),
+    (9, 'gift change log for suggestions', _gift_change_log),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+ALL_VERSIONS = {version for version, _, _ in MIGRATIONS}
+
+
+# ── runner ───────────────────────────────────────────────────────────────────
+
+def applied_versions(conn):
+    conn.execute(text("""CREATE TABLE IF NOT EXISTS schema_version (
+                             version INTEGER PRIMARY KEY,
+                             name VARCHAR(200) NOT NULL,
+                             applied_at DATETIME NOT NULL)"""))
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_version"))}
+
+
+def upgrade(lock_path):
+    """Apply every unrecorded step in MIGRATIONS; return the versions applied.
+
+    Up-to-date databases cost one query. Otherwise the first worker to take
+    the lock runs create_all() plus every pending step, each in its own
+    transaction, and the others find nothing left to do once they get it.
+    """
+    with db.engine.begin() as conn:
+        if applied_versions(conn) >= ALL_VERSIONS:
+            return []
+
+    applied = []
+    with file_lock(lock_path):
+        db.create_all()
+        for version, name, step in MIGRATIONS:
+            with db.engine.begin() as conn:
+                if version in applied_versions(conn):
+                    continue
+                if step(conn) is False:
+                    current_app.logger.info(f"Deferred migration {version}: {name}")
+                    continue
+                conn.execute(text("INSERT INTO schema_version (version, name, applied_at) "
+                                  "VALUES (:v, :n, :t)"),
+                             {'v': version, 'n': name, 't': datetime.datetime.now()})
+            current_app.logger.info(f"Applied migration {version}: {name}")
+            applied.append(version)
+    return applied
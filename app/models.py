@@ -1,5 +1,7 @@
 from . import db
 
+STATUS_CYCLE = ['Idea', 'Bought', 'Given']
+
 class Relation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
@@ -13,30 +15,59 @@ class Occasion(db.Model):
 
 class Person(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
+    name = db.Column(db.String(100), nullable=False, index=True)
     relation_id = db.Column(db.Integer, db.ForeignKey('relation.id'), nullable=True)
     birthday_month = db.Column(db.Integer, nullable=False)
     birthday_day = db.Column(db.Integer, nullable=False)
     birthday_year = db.Column(db.Integer, nullable=True)
     gifts = db.relationship('Gift', backref='person', lazy=True, foreign_keys='Gift.person_id')
     occasions = db.relationship('PersonOccasion', backref='person', lazy=True, cascade="all, delete-orphan")
+    events = db.relationship('CalendarEvent', backref='person', lazy=True, cascade="all, delete-orphan")
 
 class PersonOccasion(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    person_id = db.Column(db.Integer, db.ForeignKey('person.id'), nullable=False)
+    person_id = db.Column(db.Integer, db.ForeignKey('person.id'), nullable=False, index=True)
     occasion_id = db.Column(db.Integer, db.ForeignKey('occasion.id'), nullable=False)
     month = db.Column(db.Integer, nullable=False)
     day = db.Column(db.Integer, nullable=False)
     year = db.Column(db.Integer, nullable=True)
+    events = db.relationship('CalendarEvent', backref='person_occasion', lazy=True, cascade="all, delete-orphan")
+
+class CalendarEvent(db.Model):
+    """Precomputed recurring date (birthday or occasion) keyed by MMDD for the dashboard."""
+    id = db.Column(db.Integer, primary_key=True)
+    person_id = db.Column(db.Integer, db.ForeignKey('person.id'), nullable=False, index=True)
+    person_occasion_id = db.Column(db.Integer, db.ForeignKey('person_occasion.id'), nullable=True)  # NULL = Birthday
+    occasion_id = db.Column(db.Integer, db.ForeignKey('occasion.id'), nullable=True)
+    month = db.Column(db.Integer, nullable=False)
+    day = db.Column(db.Integer, nullable=False)
+    day_key = db.Column(db.Integer, nullable=False, index=True)   # month * 100 + day
+    occasion = db.relationship('Occasion')
 
 class Gift(db.Model):
+    # Indexes are mirrored in migrations.py for databases created before them
+    __table_args__ = (db.Index('ix_gift_person_year', 'person_id', 'year'),)
     id = db.Column(db.Integer, primary_key=True)
     item_name = db.Column(db.String(200), nullable=False)
     price = db.Column(db.Float, nullable=True)
-    occasion_id = db.Column(db.Integer, db.ForeignKey('occasion.id'), nullable=True)
-    year = db.Column(db.Integer, nullable=True)
-    status = db.Column(db.String(20), default='Idea')  # Idea, Bought, Given
-    image_path = db.Column(db.String(200), nullable=True)
+    occasion_id = db.Column(db.Integer, db.ForeignKey('occasion.id'), nullable=True, index=True)
+    year = db.Column(db.Integer, nullable=True, index=True)
+    status = db.Column(db.String(20), default='Idea', index=True)  # Idea, Bought, Given
+    image_path = db.Column(db.String(200), nullable=True, index=True)   # content-hash name, shared
     image_url = db.Column(db.String(500), nullable=True)   # URL-based image (e.g. Amazon link)
     notes = db.Column(db.Text, nullable=True)              # Notes, links, descriptions
     person_id = db.Column(db.Integer, db.ForeignKey('person.id'), nullable=True)  # NULL = Gift Pool
+    search_rank = db.query_expression()   # bm25 score, only loaded by ranked searches
+
+class GiftRollup(db.Model):
+    """Gift count and spend per (person, year, status, occasion).
+
+    Maintained by triggers on gift (see rollup.py). 0 stands in for a NULL
+    person (Gift Pool), year or occasion so every key is unique.
+    """
+    person_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    year = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    status = db.Column(db.String(20), primary_key=True)
+    occasion_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    gift_count = db.Column(db.Integer, nullable=False, default=0)
+    total_spent = db.Column(db.Float, nullable=False, default=0.0)
@@ -0,0 +1,42 @@
+import json
+import os
+
+# Add-on options (config.yaml `options`), overridable by Home Assistant via
+# /data/options.json. Keys missing from the file fall back to these values.
+DEFAULTS = {
+    'sqlite_journal_mode': 'wal',
+    'sqlite_synchronous': 'normal',
+    'sqlite_busy_timeout_ms': 5000,
+    'sqlite_cache_size_kb': 8192,
+    'sqlite_mmap_size_mb': 64,
+    'sqlite_foreign_keys': True,
+    'sqlite_pool_size': 5,
+    'sqlite_checkpoint_interval_s': 300,
+    'profiling_enabled': False,
+    'profile_keep': 50,
+    'page_cache': 'file',
+    'page_cache_entries': 256,
+    'backup_dir': '',                 # empty = DATA_DIR/backups
+    'backup_interval_hours': 24,      # 0 disables scheduled snapshots
+    'backup_keep': 7,
+    'reminder_webhook_url': '',       # POST target, e.g. a Home Assistant webhook
+    'reminder_notify_service': '',    # or a notify service such as notify.mobile_app_phone
+    'reminder_lead_days': [7, 1, 0],
+    'reminder_time': '09:00',
+    'tenant_mode': 'off',             # off | path (/h/<name>) | header | subdomain
+    'tenants': [],                    # household names, each in DATA_DIR/tenants/<name>
+    'tenant_max_open': 8,             # open tenant databases kept in the LRU
+    'tenant_idle_s': 600,             # close a tenant database unused this long; 0 = never
+    'job_workers': 1,                 # job threads per worker process; 0 = only `flask jobs --run`
+    'image_gc_interval_hours': 24,    # orphaned-image sweep; 0 disables it
+    'pool_suggestions': 5,            # Gift Pool ideas on a person's page; 0 hides them
+}
+
+
+def load_options(data_dir):
+    options = dict(DEFAULTS)
+    path = os.path.join(data_dir, 'options.json')
+    if os.path.exists(path):
+        with open(path) as f:
+            options.update(json.load(f))
+    return options
@@ -0,0 +1,163 @@
+import base64
+import json
+from sqlalchemy import and_, case, false, func, or_
+from sqlalchemy.orm import selectinload
+from . import db
+from .models import Person, Gift, GiftRollup, PersonOccasion
+
+
+def gift_query():
+    """Gift query with person and occasion preloaded for card rendering."""
+    return Gift.query.options(selectinload(Gift.person), selectinload(Gift.occasion))
+
+
+def people_with_gift_counts():
+    """Return [(person, gift_count)] ordered by name, in one grouped LEFT JOIN."""
+    return (db.session.query(Person, func.count(Gift.id))
+            .outerjoin(Gift, Gift.person_id == Person.id)
+            .options(selectinload(Person.relation))
+            .group_by(Person.id)
+            .order_by(Person.name)
+            .all())
+
+
+def people_options():
+    """People for <select> menus, ordered by name."""
+    return Person.query.order_by(Person.name).all()
+
+
+def person_query():
+    """Person query with relation preloaded."""
+    return Person.query.options(selectinload(Person.relation))
+
+
+def person_profile_query():
+    """Person query with relation and occasions (plus their types) preloaded."""
+    return Person.query.options(
+        selectinload(Person.relation),
+        selectinload(Person.occasions).selectinload(PersonOccasion.occasion),
+    )
+
+
+def person_gifts(person_id):
+    """A person's gifts, newest year first."""
+    return (gift_query()
+            .filter_by(person_id=person_id)
+            .order_by(Gift.year.desc(), Gift.id.desc())
+            .all())
+
+
+def spending_by_person(year=None):
+    """Gift count and total spent per person, optionally limited to one year."""
+    join = GiftRollup.person_id == Person.id
+    if year is not None:
+        join = and_(join, GiftRollup.year == year)
+    return (db.session.query(
+                Person.name,
+                Person.id,
+                func.coalesce(func.sum(GiftRollup.gift_count), 0).label('total_gifts'),
+                func.coalesce(func.sum(GiftRollup.total_spent), 0.0).label('total_spent'))
+            .outerjoin(GiftRollup, join)
+            .group_by(Person.id)
+            .order_by(Person.name)
+            .all())
+
+
+def spending_by(column, year=None):
+    """Assigned-gift count and spend grouped by one rollup column."""
+    query = (db.session.query(
+                 column,
+                 func.sum(GiftRollup.gift_count).label('total_gifts'),
+                 func.sum(GiftRollup.total_spent).label('total_spent'))
+             .filter(GiftRollup.person_id != 0))
+    if year is not None:
+        query = query.filter(GiftRollup.year == year)
+    return query.group_by(column).order_by(column).all()
+
+
+def gift_years():
+    """Distinct gift years (pool included), newest first."""
+    rows = (db.session.query(GiftRollup.year)
+            .filter(GiftRollup.year != 0)
+            .distinct()
+            .order_by(GiftRollup.year.desc())
+            .all())
+    return [r[0] for r in rows]
+
+
+# ── keyset pagination ────────────────────────────────────────────────────────
+
+def _nulls_last(column):
+    return case((column.is_(None), 1), else_=0)
+
+
+# Each sort is a list of (expression, descending, getter) keys; the trailing
+# id key makes the ordering total so cursors never skip or repeat rows.
+GIFT_SORTS = {
+    'id_desc': [(Gift.id, True, lambda g: g.id)],
+    'price_asc': [(_nulls_last(Gift.price), False, lambda g: int(g.price is None)),
+                  (Gift.price, False, lambda g: g.price),
+                  (Gift.id, False, lambda g: g.id)],
+    'price_desc': [(_nulls_last(Gift.price), False, lambda g: int(g.price is None)),
+                   (Gift.price, True, lambda g: g.price),
+                   (Gift.id, True, lambda g: g.id)],
+    'name_asc': [(Gift.item_name, False, lambda g: g.item_name),
+                 (Gift.id, False, lambda g: g.id)],
+    'name_desc': [(Gift.item_name, True, lambda g: g.item_name),
+                  (Gift.id, True, lambda g: g.id)],
+}
+
+
+PERSON_SORT = [(Person.name, False, lambda p: p.name),
+               (Person.id, False, lambda p: p.id)]
+
+
+def relevance_sort(rank):
+    """Sort keys for ranked search results (best bm25 match first)."""
+    return [(rank, False, lambda g: g.search_rank),
+            (Gift.id, True, lambda g: g.id)]
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, keys):
+    """Return the cursor's key values, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(keys):
+        return None
+    return values
+
+
+def _after(keys, values):
+    """WHERE clause selecting rows strictly after `values` in key order."""
+    clauses = []
+    equal_so_far = []
+    for (expr, desc, _), value in zip(keys, values):
+        # Nothing sorts past NULL within its nulls-last group
+        if value is not None:
+            step = expr < value if desc else expr > value
+            clauses.append(and_(*equal_so_far, step))
+        equal_so_far.append(expr.is_(None) if value is None else expr == value)
+    return or_(*clauses) if clauses else false()
+
+
+def keyset_page(query, keys, cursor, limit):
+    """Return (rows, next_cursor) for one page of `query` ordered by `keys`."""
+    values = decode_cursor(cursor, keys)
+    if values is not None:
+        query = query.filter(_after(keys, values))
+    query = query.order_by(*[expr.desc() if desc else expr.asc() for expr, desc, _ in keys])
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor([getter(rows[-1]) for _, _, getter in keys])
@@ -0,0 +1,305 @@
+import datetime
+import heapq
+import json
+import logging
+import os
+import threading
+import urllib.request
+from sqlalchemy import text
+from .events import occurrence
+from .migrations import file_lock
+
+logger = logging.getLogger(__name__)
+
+SUPERVISOR_API = 'http://supervisor/core/api'
+POLL_SECONDS = 60                          # how often the owner looks for data changes
+CATCH_UP = datetime.timedelta(hours=24)    # still send reminders missed by this much
+RETRY_SECONDS = 30                         # first retry after a failed send, then doubled
+MAX_RETRY_SECONDS = 3600
+EVENTS_SQL = text("""
+    SELECT e.person_id, e.person_occasion_id, e.month, e.day, p.name, p.birthday_year, o.name
+    FROM calendar_event e
+    JOIN person p ON p.id = e.person_id
+    LEFT JOIN occasion o ON o.id = e.occasion_id
+""")
+
+
+# ── configuration ────────────────────────────────────────────────────────────
+
+def lead_days(value):
+    """Lead times in days, from a list or a "7,1,0" string, largest first."""
+    if isinstance(value, str):
+        value = [part for part in value.replace(' ', '').split(',') if part]
+    return sorted({int(days) for days in value if int(days) >= 0}, reverse=True)
+
+
+def fire_time(value):
+    """datetime.time from "HH:MM"."""
+    hour, minute = (int(part) for part in str(value).split(':', 1))
+    return datetime.time(hour, minute)
+
+
+def endpoint(options):
+    """(url, headers) for the configured webhook or notify service, or None."""
+    if options['reminder_notify_service']:
+        service = options['reminder_notify_service'].replace('notify.', '', 1)
+        url = f'{SUPERVISOR_API}/services/notify/{service}'
+    elif options['reminder_webhook_url']:
+        url = options['reminder_webhook_url']
+    else:
+        return None
+    headers = {'Content-Type': 'application/json'}
+    token = os.environ.get('SUPERVISOR_TOKEN')
+    if token and url.startswith(SUPERVISOR_API):
+        headers['Authorization'] = f'Bearer {token}'
+    return url, headers
+
+
+def send(target, payload, timeout=10):
+    """POST a reminder as JSON; raises on connection errors and non-2xx replies."""
+    url, headers = target
+    request = urllib.request.Request(url, json.dumps(payload).encode(), headers, method='POST')
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        response.read()
+
+
+# ── scheduling ───────────────────────────────────────────────────────────────
+
+class Event:
+    """One birthday or occasion as the scheduler sees it."""
+
+    def __init__(self, person_id, person_occasion_id, month, day, person, birth_year, occasion):
+        self.key = (person_id, person_occasion_id)
+        self.month, self.day = month, day
+        self.person, self.birth_year, self.occasion = person, birth_year, occasion
+
+    def __eq__(self, other):
+        return vars(self) == vars(other)
+
+    def payload(self, date, lead):
+        what = self.occasion or 'birthday'
+        when = {0: 'today', 1: 'tomorrow'}.get(lead, f'in {lead} days')
+        message = f"{self.person}'s {what} is {when} ({date:%b} {date.day})"
+        if not self.occasion and self.birth_year:
+            message += f', turning {date.year - self.birth_year}'
+        return {
+            'title': 'GiftGuardian reminder',
+            'message': message + '.',
+            'data': {'person': self.person, 'occasion': what, 'date': date.isoformat(),
+                     'days_until': lead, 'person_id': self.key[0]},
+        }
+
+
+class ReminderQueue:
+    """Heap of the next reminder per event, keyed on fire time.
+
+    Each event has exactly one live heap entry. Changing or removing an
+    event bumps its generation, which turns its old entry into a stale one
+    that is dropped when it reaches the top.
+    """
+
+    def __init__(self, leads, at):
+        self.leads = leads
+        self.at = at
+        self.events = {}        # key -> (Event, generation)
+        self.heap = []          # (fire_at, generation, key, lead, date)
+        self.generation = 0
+
+    def next_fire(self, event, after):
+        """(fire_at, lead, date) of the event's first reminder strictly after `after`."""
+        for year in (after.year, after.year + 1, after.year + 2):
+            date = occurrence(year, event.month, event.day)
+            for lead in self.leads:
+                fire_at = datetime.datetime.combine(date - datetime.timedelta(days=lead), self.at)
+                if fire_at > after:
+                    return fire_at, lead, date
+        return None
+
+    def schedule(self, event, after):
+        self.generation += 1
+        self.events[event.key] = (event, self.generation)
+        upcoming = self.next_fire(event, after)
+        if upcoming:
+            fire_at, lead, date = upcoming
+            heapq.heappush(self.heap, (fire_at, self.generation, event.key, lead, date))
+
+    def sync(self, events, after):
+        """Bring the queue in line with `events`, touching only changed ones."""
+        current = {event.key: event for event in events}
+        for key in set(self.events) - set(current):
+            del self.events[key]
+        changed = 0
+        for key, event in current.items():
+            known = self.events.get(key)
+            if known is None or known[0] != event:
+                self.schedule(event, after)
+                changed += 1
+        return changed
+
+    def _live(self, entry):
+        known = self.events.get(entry[2])
+        return known is not None and known[1] == entry[1]
+
+    def peek(self):
+        """Fire time of the next live entry, or None."""
+        while self.heap and not self._live(self.heap[0]):
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now):
+        """Yield (event, lead, date, fire_at) for due reminders, rescheduling each event."""
+        while self.peek() is not None and self.heap[0][0] <= now:
+            fire_at, _, key, lead, date = heapq.heappop(self.heap)
+            event = self.events[key][0]
+            self.schedule(event, fire_at)
+            yield event, lead, date, fire_at
+
+    def upcoming(self, until):
+        """Every live reminder due up to `until`, in order (the heap is left alone)."""
+        found = []
+        now = datetime.datetime.now()
+        for event, _ in self.events.values():
+            after = now
+            while True:
+                upcoming = self.next_fire(event, after)
+                if not upcoming or upcoming[0] > until:
+                    break
+                found.append((upcoming[0], event, upcoming[1], upcoming[2]))
+                after = upcoming[0]
+        return sorted(found, key=lambda item: (item[0], item[1].person))
+
+
+def load_events(conn):
+    return [Event(*row) for row in conn.execute(EVENTS_SQL)]
+
+
+class ReminderScheduler:
+    """Sleep until the next reminder is due or the data may have changed.
+
+    The fire time of the last reminder sent is kept in `state_path`, so a
+    restart neither repeats reminders nor drops ones that fell due while
+    the add-on was down (up to CATCH_UP late). Reminders are sent in order;
+    when a send fails, it and every later one wait in `undelivered` and are
+    retried with backoff, and the saved fire time stays before the failed
+    one, so a restart during an outage sends them too.
+    """
+
+    def __init__(self, engine, queue, target, state_path):
+        self.engine = engine
+        self.queue = queue
+        self.target = target
+        self.state_path = state_path
+        self.version = None
+        self.undelivered = []   # (event, lead, date, fire_at), oldest first
+        self.failures = 0
+        self.retry_at = None
+        self.checked_until = None   # due reminders up to here have been popped
+
+    def _load_state(self, now):
+        try:
+            with open(self.state_path) as f:
+                done = datetime.datetime.fromisoformat(json.load(f)['done_until'])
+        except (OSError, ValueError, KeyError):
+            return now
+        return max(done, now - CATCH_UP)
+
+    def _save_state(self, done_until):
+        tmp = self.state_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'done_until': done_until.isoformat()}, f)
+        os.replace(tmp, self.state_path)
+
+    def refresh(self, after):
+        """Re-read events if any tracked table changed since the last look."""
+        with self.engine.connect() as conn:
+            version = conn.execute(text("SELECT version FROM data_version WHERE id = 1")).scalar()
+            if version == self.version:
+                return 0
+            changed = self.queue.sync(load_events(conn), after)
+        self.version = version
+        if changed:
+            logger.info(f"Reminder queue: {changed} event(s) (re)scheduled, next at {self.queue.peek()}")
+        return changed
+
+    def deliver(self, now):
+        """Send due reminders in order, stopping at the first failure."""
+        self.undelivered.extend(self.queue.pop_due(now))
+        self.checked_until = now
+        if not self.undelivered or (self.retry_at and now < self.retry_at):
+            return
+        sent = None
+        while self.undelivered:
+            event, lead, date, fire_at = self.undelivered[0]
+            if fire_at < now - CATCH_UP:
+                logger.warning(f"Reminder for {event.person} dropped, undeliverable since {fire_at}")
+            else:
+                try:
+                    send(self.target, event.payload(date, lead))
+                except Exception as e:
+                    self.failures += 1
+                    delay = min(RETRY_SECONDS * 2 ** (self.failures - 1), MAX_RETRY_SECONDS)
+                    self.retry_at = now + datetime.timedelta(seconds=delay)
+                    logger.warning(f"Reminder for {event.person} not delivered, "
+                                   f"{len(self.undelivered)} waiting, retry in {delay} s: {e}")
+                    break
+            self.undelivered.pop(0)
+            sent = fire_at
+        else:
+            self.failures = 0
+            self.retry_at = None
+        if sent and self.undelivered and sent >= self.undelivered[0][3]:
+            # Sent one due at the same time as the failed one: a restart must
+            # still send the failed one, even if that repeats the other
+            sent = self.undelivered[0][3] - datetime.timedelta(microseconds=1)
+        if sent:
+            self._save_state(sent)
+
+    def run(self, stop):
+        self.checked_until = self._load_state(datetime.datetime.now())
+        while not stop.is_set():
+            # Events edited since the last check are rescheduled from it, not
+            # from the clock, so one falling due in between is still sent
+            self.refresh(self.checked_until)
+            now = datetime.datetime.now()
+            self.deliver(now)
+            next_at = self.queue.peek()
+            if self.undelivered:
+                next_at = min(filter(None, [next_at, self.retry_at]))
+            wait = POLL_SECONDS if next_at is None else min(POLL_SECONDS, (next_at - now).total_seconds())
+            if stop.wait(max(wait, 0.1)):
+                break
+
+
+def start_reminder_scheduler(engine, data_dir, options):
+    """Run the reminder scheduler in whichever worker holds DATA_DIR/.reminders.lock.
+
+    Every worker starts this thread; the others keep retrying the lock, so
+    one of them takes over if the owner exits. Returns a stop event, or
+    None when no webhook or notify service is configured.
+
+    Only the default household's events are scheduled; households added
+    with `tenant_mode` get no reminders.
+    """
+    target = endpoint(options)
+    if target is None:
+        return None
+    if str(options['tenant_mode']).lower() != 'off':
+        logger.info("Reminders are sent for the default household only, not for tenant households")
+    queue_args = (lead_days(options['reminder_lead_days']), fire_time(options['reminder_time']))
+    lock_path = os.path.join(data_dir, '.reminders.lock')
+    state_path = os.path.join(data_dir, 'reminders.json')
+    stop = threading.Event()
+
+    def run():
+        while not stop.is_set():
+            try:
+                with file_lock(lock_path, blocking=False) as locked:
+                    if locked:
+                        logger.info(f"Reminder scheduler running in pid {os.getpid()}")
+                        ReminderScheduler(engine, ReminderQueue(*queue_args), target, state_path).run(stop)
+            except Exception as e:
+                logger.warning(f"Reminder scheduler failed: {e}")
+            stop.wait(POLL_SECONDS)
+
+    threading.Thread(target=run, name='reminder-scheduler', daemon=True).start()
+    return stop
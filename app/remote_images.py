@@ -0,0 +1,108 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+from .images import VARIANTS, VARIANT_EXT, VARIANT_FORMAT, save_image
+
+logger = logging.getLogger(__name__)
+
+FETCH_TIMEOUT = 10                  # seconds
+MAX_DOWNLOAD_BYTES = 15 * 1024 * 1024
+USER_AGENT = 'GiftGuardian image cache'
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='remote-image')
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def url_key(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def cache_path(cache_dir, key):
+    return os.path.join(cache_dir, f'{key}.{VARIANT_EXT}')
+
+
+def is_fetchable(url):
+    return bool(url) and url.lower().startswith(('http://', 'https://'))
+
+
+def fetch(url, cache_dir, max_bytes):
+    """Download `url`, shrink it to card size and store it under its key."""
+    path = cache_path(cache_dir, url_key(url))
+    if os.path.exists(path):
+        return path   # fetched meanwhile by another request or worker
+    request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+    with urllib.request.urlopen(request, timeout=FETCH_TIMEOUT) as response:
+        data = response.read(MAX_DOWNLOAD_BYTES + 1)
+    if len(data) > MAX_DOWNLOAD_BYTES:
+        raise ValueError(f'image larger than {MAX_DOWNLOAD_BYTES} bytes')
+
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        keep_alpha = VARIANT_FORMAT == 'WEBP' and 'A' in image.getbands()
+        image = image.convert('RGBA' if keep_alpha else 'RGB')
+        size = VARIANTS['card']
+        image.thumbnail((size, size), Image.LANCZOS)
+        os.makedirs(cache_dir, exist_ok=True)
+        save_image(image, path)
+    evict(cache_dir, max_bytes)
+    return path
+
+
+def evict(cache_dir, max_bytes):
+    """Delete least recently used entries until the cache fits in max_bytes.
+
+    Recency is the file mtime, which touch() refreshes on every hit.
+    """
+    entries = []
+    total = 0
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and not entry.name.endswith('.tmp'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            pass
+
+
+def touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _fetch_quietly(url, cache_dir, max_bytes, key):
+    try:
+        fetch(url, cache_dir, max_bytes)
+    except Exception as e:
+        logger.warning(f"Could not cache remote image {url}: {e}")
+    finally:
+        with _pending_lock:
+            _pending.discard(key)
+
+
+def prefetch(url, cache_dir, max_bytes):
+    """Queue a background download of `url` unless cached or already queued."""
+    if not is_fetchable(url):
+        return None
+    key = url_key(url)
+    if os.path.exists(cache_path(cache_dir, key)):
+        return None
+    with _pending_lock:
+        if key in _pending:
+            return None
+        _pending.add(key)
+    return _executor.submit(_fetch_quietly, url, cache_dir, max_bytes, key)
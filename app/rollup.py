@@ -0,0 +1,65 @@
+from sqlalchemy import text
+
+KEY = ("COALESCE({r}.person_id, 0), COALESCE({r}.year, 0), "
+       "COALESCE({r}.status, ''), COALESCE({r}.occasion_id, 0)")
+MATCH = ("person_id = COALESCE({r}.person_id, 0) AND year = COALESCE({r}.year, 0) "
+         "AND status = COALESCE({r}.status, '') AND occasion_id = COALESCE({r}.occasion_id, 0)")
+
+ADD = f"""
+    INSERT INTO gift_rollup (person_id, year, status, occasion_id, gift_count, total_spent)
+    VALUES ({KEY.format(r='new')}, 1, COALESCE(new.price, 0))
+    ON CONFLICT (person_id, year, status, occasion_id) DO UPDATE
+       SET gift_count = gift_count + 1,
+           total_spent = total_spent + excluded.total_spent;"""
+
+REMOVE = f"""
+    UPDATE gift_rollup
+       SET gift_count = gift_count - 1,
+           total_spent = total_spent - COALESCE(old.price, 0)
+     WHERE {MATCH.format(r='old')};
+    DELETE FROM gift_rollup WHERE {MATCH.format(r='old')} AND gift_count <= 0;"""
+
+# Triggers keep the rollup in the same transaction as every write to gift,
+# including set-based UPDATE/DELETE statements that bypass the ORM.
+ROLLUP_TRIGGERS = [
+    f"CREATE TRIGGER gift_rollup_ai AFTER INSERT ON gift BEGIN {ADD} END",
+    f"CREATE TRIGGER gift_rollup_ad AFTER DELETE ON gift BEGIN {REMOVE} END",
+    f"""CREATE TRIGGER gift_rollup_au
+        AFTER UPDATE OF person_id, year, status, occasion_id, price ON gift
+        BEGIN {REMOVE} {ADD} END""",
+]
+
+FRESH_AGGREGATE = f"""
+    SELECT {KEY.format(r='gift')}, COUNT(*), COALESCE(SUM(price), 0)
+      FROM gift
+     GROUP BY 1, 2, 3, 4"""
+
+
+def install_rollup(conn):
+    """Create the rollup triggers (if missing) and rebuild the table."""
+    existing = {row[0] for row in conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type='trigger' AND name LIKE 'gift_rollup_%'"))}
+    for name, statement in zip(['gift_rollup_ai', 'gift_rollup_ad', 'gift_rollup_au'], ROLLUP_TRIGGERS):
+        if name not in existing:
+            conn.execute(text(statement))
+    rebuild_rollup(conn)
+
+
+def rebuild_rollup(conn):
+    conn.execute(text("DELETE FROM gift_rollup"))
+    conn.execute(text("INSERT INTO gift_rollup (person_id, year, status, occasion_id, "
+                      f"gift_count, total_spent) {FRESH_AGGREGATE}"))
+
+
+def compare_rollup(conn, tolerance=0.005):
+    """Return [(key, stored, fresh)] for rows where the rollup disagrees with gift."""
+    stored = {tuple(row[:4]): (row[4], row[5]) for row in conn.execute(text(
+        "SELECT person_id, year, status, occasion_id, gift_count, total_spent FROM gift_rollup"))}
+    fresh = {tuple(row[:4]): (row[4], row[5]) for row in conn.execute(text(FRESH_AGGREGATE))}
+    mismatches = []
+    for key in sorted(stored.keys() | fresh.keys(), key=repr):
+        a = stored.get(key, (0, 0.0))
+        b = fresh.get(key, (0, 0.0))
+        if a[0] != b[0] or abs(a[1] - b[1]) > tolerance:
+            mismatches.append((key, a, b))
+    return mismatches
@@ -1,17 +1,36 @@
 import os
+import re
+import calendar
+import tempfile
 import datetime
+import mimetypes
+from werkzeug.exceptions import HTTPException
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
-from flask import (Blueprint, render_template, request, redirect, url_for,
-                   flash, current_app, send_from_directory)
-from . import db
-from .models import Relation, Occasion, Person, Gift, PersonOccasion
+from flask import (Blueprint, render_template, request, redirect, url_for, jsonify,
+                   flash, current_app, send_file, send_from_directory, abort, stream_with_context,
+                   get_template_attribute)
+from sqlalchemy import func, insert, literal, select
+from sqlalchemy.orm import with_expression
+from . import assets, backup, db, events, images, jobs, queries, remote_images, transfer
+from .cache import cached_page
+from .events import next_occurrence
+from .search import search_gifts
+from .tenants import current_tenant, tenant_config
+from .models import Relation, Occasion, Person, Gift, GiftRollup, PersonOccasion, STATUS_CYCLE
 
 main = Blueprint('main', __name__)
+api = Blueprint('api', __name__, url_prefix='/api/v1')
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 MONTH_NAMES = ['', 'January', 'February', 'March', 'April', 'May', 'June',
                'July', 'August', 'September', 'October', 'November', 'December']
-STATUS_CYCLE = ['Idea', 'Bought', 'Given']
+GIFT_PAGE_SIZE = 24
+MAX_GIFT_PAGE_SIZE = 96
+UPLOAD_MAX_AGE = 365 * 24 * 3600
+ASSET_MAX_AGE = 365 * 24 * 3600
+HASH_NAME_RE = re.compile(r'^[0-9a-f]{64}$')
+REMOTE_IMAGE_MAX_AGE = 24 * 3600
 
 
 # ── helpers ──────────────────────────────────────────────────────────────────
@@ -21,43 +40,49 @@ def allowed_file(filename):
 
 
 def save_upload(file):
-    """Save an uploaded image file; return filename or None."""
+    """Store an uploaded image by content hash; return filename or None.
+
+    Size variants are made by a background job queued in the current
+    transaction; until it has run, uploaded_variant() makes them on demand.
+    """
     if file and file.filename and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
-        filename = f"{timestamp}_{filename}"
-        file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+        folder = tenant_config('UPLOAD_FOLDER')
+        ext = file.filename.rsplit('.', 1)[1].lower()
+        filename, is_new = images.store_upload(file.stream, folder, ext)
+        if is_new or images.missing_variants(folder, filename):
+            jobs.enqueue(db.session, 'image_variants', {'filename': filename},
+                         key=f'image_variants:{filename}')
         return filename
     return None
 
 
 def delete_image(image_path):
-    """Delete an uploaded image file, logging any errors."""
-    if image_path:
-        try:
-            path = os.path.join(current_app.config['UPLOAD_FOLDER'], image_path)
-            if os.path.exists(path):
-                os.remove(path)
-        except Exception as e:
-            current_app.logger.error(f"Error deleting image: {e}")
+    """Queue deletion of an uploaded image for when no gift references it.
 
+    Gifts share files (pool assignments, duplicate uploads), so the job
+    checks references itself once the change dropping this one commits;
+    call this before that commit.
+    """
+    delete_images([image_path])
 
-def next_occurrence(today, month, day):
-    """Return (next_date, days_until) for a recurring annual date."""
-    try:
-        this_year = datetime.date(today.year, month, day)
-    except ValueError:
-        this_year = datetime.date(today.year, 3, 1)   # Feb 29 fallback
 
-    if this_year < today:
-        try:
-            next_date = datetime.date(today.year + 1, month, day)
-        except ValueError:
-            next_date = datetime.date(today.year + 1, 3, 1)
-    else:
-        next_date = this_year
+def delete_images(image_paths):
+    """delete_image for many paths, as one job."""
+    paths = sorted({path for path in image_paths if path})
+    if paths:
+        jobs.enqueue(db.session, 'delete_images', {'paths': paths})
+
 
-    return next_date, (next_date - today).days
+def pool_suggestions(person_id):
+    """[(pool gift, similarity)] for a person's page, best first."""
+    limit = int(current_app.config['ADDON_OPTIONS']['pool_suggestions'])
+    if not limit:
+        return []
+    tenant = current_tenant()
+    index = tenant.suggestions if tenant else current_app.extensions['suggestions']
+    ranked = index.suggest(db.session, person_id, limit)
+    found = {g.id: g for g in queries.gift_query().filter(Gift.id.in_([gift_id for gift_id, _ in ranked]))}
+    return [(found[gift_id], score) for gift_id, score in ranked if gift_id in found]
 
 
 def urgency(days):
@@ -71,12 +96,7 @@ def urgency(days):
 
 
 def get_available_years():
-    rows = (db.session.query(Gift.year)
-            .distinct()
-            .filter(Gift.year.isnot(None))
-            .order_by(Gift.year.desc())
-            .all())
-    years = [r[0] for r in rows]
+    years = queries.gift_years()
     current = datetime.date.today().year
     if current not in years:
         years.insert(0, current)
@@ -85,43 +105,176 @@ def get_available_years():
 
 # ── uploads ──────────────────────────────────────────────────────────────────
 
+def send_upload(relative_path, etag=True):
+    """Send a file under UPLOAD_FOLDER with long-lived immutable caching.
+
+    Upload names never get reused for different bytes (content hashes, or
+    timestamps for older files), so browsers can keep them for a year.
+    Conditional GETs and Range requests are handled by send_file; with
+    UPLOAD_SENDFILE=x-accel the bytes are left to the fronting nginx.
+    """
+    folder = tenant_config('UPLOAD_FOLDER')
+    if tenant_config('UPLOAD_SENDFILE') == 'x-accel':
+        path = safe_join(folder, relative_path)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        response = current_app.response_class(mimetype=mimetypes.guess_type(path)[0])
+        response.headers['X-Accel-Redirect'] = current_app.config['UPLOAD_ACCEL_PREFIX'] + relative_path
+    else:
+        response = send_from_directory(folder, relative_path, etag=etag, max_age=UPLOAD_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.max_age = UPLOAD_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+
+def upload_etag(filename, variant=None):
+    """Strong ETag from the content hash in the filename, if it has one."""
+    digest = filename.split('.', 1)[0]
+    if not HASH_NAME_RE.match(digest):
+        return True   # let send_file derive one from mtime/size
+    return f'{digest}-{variant}' if variant else digest
+
+
 @main.route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
+    return send_upload(filename, etag=upload_etag(filename))
+
+
+@main.route('/uploads/<variant>/<filename>')
+def uploaded_variant(variant, filename):
+    """Serve a downscaled copy of an upload, generating it on first request."""
+    if variant not in images.VARIANTS:
+        abort(404)
+    folder = tenant_config('UPLOAD_FOLDER')
+    filename = secure_filename(filename)
+    path = images.variant_path(folder, filename, variant)
+    if not os.path.exists(path):
+        if not os.path.exists(os.path.join(folder, filename)):
+            abort(404)
+        try:
+            images.make_variants(folder, filename)
+        except Exception as e:
+            current_app.logger.error(f"Error generating image variants: {e}")
+            return send_upload(filename, etag=upload_etag(filename))
+    return send_upload(os.path.relpath(path, folder), etag=upload_etag(filename, variant))
+
+
+@main.route('/remote-images/<key>')
+def remote_image(key):
+    """Serve the local copy of a gift's image_url, or redirect while it is fetched."""
+    url = request.args.get('u', '')
+    if remote_images.url_key(url) != key:
+        abort(404)
+    folder = tenant_config('REMOTE_IMAGE_FOLDER')
+    path = remote_images.cache_path(folder, key)
+    if os.path.exists(path):
+        remote_images.touch(path)
+        return send_from_directory(folder, os.path.basename(path), max_age=REMOTE_IMAGE_MAX_AGE)
+    # Only proxy URLs that belong to a gift, so this is not an open redirect
+    if not Gift.query.filter_by(image_url=url).first():
+        abort(404)
+    remote_images.prefetch(url, folder, current_app.config['REMOTE_IMAGE_CACHE_BYTES'])
+    return redirect(url)
+
+
+@main.app_template_global()
+def remote_image_src(url):
+    """Local cached URL for a remote gift image (non-http URLs pass through)."""
+    if not remote_images.is_fetchable(url):
+        return url
+    return url_for('main.remote_image', key=remote_images.url_key(url), u=url)
+
+
+@main.app_template_global()
+def next_status(status):
+    """The status after `status` in the Idea → Bought → Given cycle."""
+    idx = STATUS_CYCLE.index(status) if status in STATUS_CYCLE else 0
+    return STATUS_CYCLE[(idx + 1) % len(STATUS_CYCLE)]
+
+
+def prefetch_remote_image(url):
+    remote_images.prefetch(url, tenant_config('REMOTE_IMAGE_FOLDER'),
+                           current_app.config['REMOTE_IMAGE_CACHE_BYTES'])
+
+
+@main.app_template_global()
+def upload_srcset(filename):
+    """srcset attribute value listing every variant of an uploaded image."""
+    return ', '.join(f"{url_for('main.uploaded_variant', variant=v, filename=filename)} {size}w"
+                     for v, size in sorted(images.VARIANTS.items(), key=lambda v: v[1]))
+
+
+# ── static assets ────────────────────────────────────────────────────────────
+
+@main.app_template_global()
+def asset_url(name):
+    """URL of a file under static/ by its content-hashed name.
+
+    Vendored files that were never fetched fall back to their CDN URL, which
+    only happens in a development checkout: the image build fails without
+    them, and create_app() logs the missing ones.
+    """
+    hashed = current_app.extensions['assets'].get(name)
+    if hashed:
+        return url_for('main.static_asset', filename=hashed)
+    if name in assets.VENDOR and not os.path.exists(os.path.join(assets.STATIC_DIR, name)):
+        return assets.VENDOR[name]
+    return url_for('main.static_asset', filename=name)
+
+
+@main.route('/static/<path:filename>')
+def static_asset(filename):
+    """Serve a hashed asset, precompressed if the client accepts it.
+
+    Hashed names are cached for a year; anything else (a source file
+    requested by its plain name) is revalidated on every use.
+    """
+    path = safe_join(current_app.config['ASSET_DIR'], filename)
+    if (path is None or not os.path.isfile(path)
+            or filename == assets.MANIFEST or filename.endswith(('.gz', '.br'))):
+        return send_from_directory(assets.STATIC_DIR, filename, max_age=0)
+    send_path, encoding = assets.negotiate(path, request.accept_encodings)
+    response = send_file(send_path, mimetype=mimetypes.guess_type(path)[0], max_age=ASSET_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 
 # ── dashboard ────────────────────────────────────────────────────────────────
 
 @main.route('/')
+@cached_page
 def index():
     today = datetime.date.today()
-    people = Person.query.all()
     upcoming_events = []
 
-    for person in people:
-        next_date, days = next_occurrence(today, person.birthday_month, person.birthday_day)
-        age = (next_date.year - person.birthday_year) if person.birthday_year else None
+    for event in events.upcoming_events(today, limit=10):
+        person = event.person
+        next_date, days = next_occurrence(today, event.month, event.day)
         u_level, u_label = urgency(days)
-        upcoming_events.append({
-            'name': f"{person.name}'s Birthday",
-            'date': next_date,
-            'days_until': days,
-            'type': 'Birthday',
-            'icon': 'bi-cake2-fill',
-            'person': person,
-            'age': age,
-            'urgency': u_level,
-            'urgency_label': u_label,
-        })
-
-        for occ in person.occasions:
-            next_date, days = next_occurrence(today, occ.month, occ.day)
-            u_level, u_label = urgency(days)
+        if event.person_occasion_id is None:
+            age = (next_date.year - person.birthday_year) if person.birthday_year else None
             upcoming_events.append({
-                'name': f"{person.name}'s {occ.occasion.name}",
+                'name': f"{person.name}'s Birthday",
                 'date': next_date,
                 'days_until': days,
-                'type': occ.occasion.name,
+                'type': 'Birthday',
+                'icon': 'bi-cake2-fill',
+                'person': person,
+                'age': age,
+                'urgency': u_level,
+                'urgency_label': u_label,
+            })
+        else:
+            upcoming_events.append({
+                'name': f"{person.name}'s {event.occasion.name}",
+                'date': next_date,
+                'days_until': days,
+                'type': event.occasion.name,
                 'icon': 'bi-calendar-heart-fill',
                 'person': person,
                 'age': None,
@@ -129,16 +282,15 @@ def index():
                 'urgency_label': u_label,
             })
 
-    upcoming_events.sort(key=lambda x: x['days_until'])
-    recent_gifts = (Gift.query
+    recent_gifts = (queries.gift_query()
                     .filter(Gift.person_id.isnot(None))
                     .order_by(Gift.id.desc())
                     .limit(5)
                     .all())
 
     return render_template('dashboard.html',
-                           upcoming_events=upcoming_events[:10],
-                           urgent_count=sum(1 for e in upcoming_events if e['days_until'] <= 30),
+                           upcoming_events=upcoming_events,
+                           urgent_count=events.count_events_within(today, 30),
                            recent_gifts=recent_gifts,
                            today=today,
                            month_names=MONTH_NAMES)
@@ -150,7 +302,8 @@ def index():
 def settings():
     relations = Relation.query.all()
     occasions = Occasion.query.all()
-    return render_template('settings.html', relations=relations, occasions=occasions)
+    return render_template('settings.html', relations=relations, occasions=occasions,
+                           snapshots=backup.list_snapshots(tenant_config('BACKUP_DIR')))
 
 
 @main.route('/settings/relation/add', methods=['POST'])
@@ -206,19 +359,113 @@ def delete_occasion(id):
     return redirect(url_for('main.settings'))
 
 
+@main.route('/settings/export')
+def export_data():
+    """Stream every person, occasion or gift as CSV, or all of them as JSON lines."""
+    fmt = request.args.get('format', 'csv')
+    kind = request.args.get('kind', 'gift')
+    stamp = datetime.date.today().strftime('%Y%m%d')
+    if fmt == 'json':
+        body, mimetype, name = transfer.export_ndjson(), 'application/x-ndjson', f'giftguardian-{stamp}.jsonl'
+    elif kind in transfer.KINDS:
+        body, mimetype, name = transfer.export_csv(kind), 'text/csv', f'giftguardian-{kind}-{stamp}.csv'
+    else:
+        abort(404)
+    response = current_app.response_class(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{name}"'
+    return response
+
+
+@main.route('/settings/import', methods=['POST'])
+def import_data():
+    file = request.files.get('file')
+    if not file or not file.filename:
+        flash('Choose a CSV or JSON file to import.', 'warning')
+        return redirect(url_for('main.settings'))
+    if file.filename.lower().endswith(('.json', '.jsonl', '.ndjson')):
+        records = transfer.read_ndjson(file.stream)
+    else:
+        kind = request.form.get('kind', 'gift')
+        if kind not in transfer.KINDS:
+            abort(400)
+        records = transfer.read_csv(file.stream, kind)
+
+    importer = transfer.Importer(dry_run=bool(request.form.get('dry_run')))
+    try:
+        importer.run(records)
+    except UnicodeDecodeError:
+        flash('The file is not UTF-8 text.', 'danger')
+        return redirect(url_for('main.settings'))
+    flash(importer.summary(), 'warning' if importer.error_count else 'success')
+    for line_num, message in importer.errors[:5]:
+        flash(f'Line {line_num}: {message}', 'danger')
+    return redirect(url_for('main.settings'))
+
+
+@main.route('/settings/backup')
+def download_backup():
+    """Stream a zip of a live database snapshot and every uploaded image."""
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    # Keeps the request (and so the household's engine) open until the zip is done
+    body = stream_with_context(backup.stream_archive(db.engine, tenant_config('UPLOAD_FOLDER')))
+    response = current_app.response_class(body, mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename="giftguardian-backup-{stamp}.zip"'
+    return response
+
+
+@main.route('/settings/snapshot', methods=['POST'])
+def create_snapshot():
+    name = backup.create_snapshot(db.engine, tenant_config('UPLOAD_FOLDER'),
+                                  tenant_config('BACKUP_DIR'),
+                                  int(current_app.config['ADDON_OPTIONS']['backup_keep']))
+    flash(f'Snapshot {name} saved.', 'success')
+    return redirect(url_for('main.settings'))
+
+
+@main.route('/settings/restore', methods=['POST'])
+def restore_backup():
+    """Restore an uploaded backup zip, or a scheduled snapshot by name."""
+    data_dir = tenant_config('DATA_DIR')
+    snapshot = request.form.get('snapshot')
+    file = request.files.get('file')
+    db.session.remove()   # nothing of the old database may stay cached
+    upload_path = None
+    try:
+        if snapshot:
+            if snapshot not in backup.list_snapshots(tenant_config('BACKUP_DIR')):
+                abort(404)
+            source = os.path.join(tenant_config('BACKUP_DIR'), 'snapshots', snapshot)
+        elif file and file.filename:
+            fd, upload_path = tempfile.mkstemp(prefix='.restore-upload-', dir=data_dir)
+            with os.fdopen(fd, 'wb') as out:
+                file.save(out)
+            source = upload_path
+        else:
+            flash('Choose a backup file to restore.', 'warning')
+            return redirect(url_for('main.settings'))
+        manifest = backup.restore(source, db.engine, tenant_config('UPLOAD_FOLDER'), data_dir)
+    except backup.RestoreError as e:
+        flash(f'Restore failed: {e}', 'danger')
+        return redirect(url_for('main.settings'))
+    finally:
+        if upload_path and os.path.exists(upload_path):
+            os.remove(upload_path)
+    flash(f"Restored backup from {manifest['created']}.", 'success')
+    return redirect(url_for('main.settings'))
+
+
 # ── people ────────────────────────────────────────────────────────────────────
 
 @main.route('/people')
+@cached_page
 def people_list():
-    people = Person.query.order_by(Person.name).all()
     relations = Relation.query.all()
     today = datetime.date.today()
 
     people_data = []
-    for person in people:
+    for person, gift_count in queries.people_with_gift_counts():
         next_date, days = next_occurrence(today, person.birthday_month, person.birthday_day)
         age = (next_date.year - person.birthday_year) if person.birthday_year else None
-        gift_count = Gift.query.filter_by(person_id=person.id).count()
         u_level, u_label = urgency(days)
         people_data.append({
             'person': person,
@@ -254,6 +501,7 @@ def add_person():
             birthday_year=int(year) if year else None,
         )
         db.session.add(new_person)
+        events.index_person_events(new_person)
         db.session.commit()
         flash(f'Added {name}!', 'success')
     except ValueError:
@@ -263,15 +511,13 @@ def add_person():
 
 @main.route('/people/view/<int:id>')
 def person_profile(id):
-    person = Person.query.get_or_404(id)
+    person = queries.person_profile_query().get_or_404(id)
     occasions = Occasion.query.all()
     today = datetime.date.today()
 
     # Gift history grouped by year
-    gifts = (Gift.query
-             .filter_by(person_id=person.id)
-             .order_by(Gift.year.desc(), Gift.id.desc())
-             .all())
+    gifts = queries.person_gifts(person.id)
+    total_spent = sum(g.price for g in gifts if g.price)
     gifts_by_year = {}
     for g in gifts:
         key = g.year or 'No Year'
@@ -289,11 +535,13 @@ def person_profile(id):
                            occasions=occasions,
                            gifts_by_year=gifts_by_year,
                            sorted_years=sorted_years,
+                           total_spent=total_spent,
                            days_until=days,
                            urgency=u_level,
                            urgency_label=u_label,
                            age=age,
                            next_bday=next_date,
+                           suggestions=pool_suggestions(person.id),
                            month_names=MONTH_NAMES)
 
 
@@ -309,13 +557,14 @@ def add_person_occasion(id):
         flash('Missing fields.', 'warning')
         return redirect(url_for('main.person_profile', id=person.id))
     try:
-        db.session.add(PersonOccasion(
-            person_id=person.id,
+        person.occasions.append(PersonOccasion(
             occasion_id=int(occasion_id),
             month=int(month),
             day=int(day),
             year=int(year) if year else None,
         ))
+        db.session.flush()
+        events.index_person_events(person)
         db.session.commit()
         flash('Occasion added!', 'success')
     except ValueError:
@@ -326,8 +575,10 @@ def add_person_occasion(id):
 @main.route('/people/occasion/delete/<int:id>', methods=['POST'])
 def delete_person_occasion(id):
     occ = PersonOccasion.query.get_or_404(id)
-    person_id = occ.person_id
-    db.session.delete(occ)
+    person = occ.person
+    person_id = person.id
+    person.occasions.remove(occ)
+    events.index_person_events(person)
     db.session.commit()
     flash('Occasion removed.', 'success')
     return redirect(url_for('main.person_profile', id=person_id))
@@ -353,6 +604,7 @@ def edit_person(id):
             person.birthday_month = int(month)
             person.birthday_day = int(day)
             person.birthday_year = int(year) if year else None
+            events.index_person_events(person)
             db.session.commit()
             flash('Person updated.', 'success')
             return redirect(url_for('main.people_list'))
@@ -375,17 +627,29 @@ def delete_person(id):
 
 # ── gifts ─────────────────────────────────────────────────────────────────────
 
-@main.route('/gifts')
-def gifts_list():
-    # Pool gifts (unassigned — shareable ideas)
-    pool_gifts = (Gift.query
-                  .filter(Gift.person_id.is_(None))
-                  .order_by(Gift.id.desc())
-                  .all())
+def page_size():
+    try:
+        size = int(request.args.get('per_page', GIFT_PAGE_SIZE))
+    except ValueError:
+        return GIFT_PAGE_SIZE
+    return max(1, min(size, MAX_GIFT_PAGE_SIZE))
 
-    # Assigned gifts with filters
-    query = Gift.query.filter(Gift.person_id.isnot(None))
 
+def next_page_url(cursor_arg, cursor, endpoint='main.gifts_list'):
+    """URL of the current view with its page cursor moved to `cursor`."""
+    if not cursor:
+        return None
+    args = request.args.to_dict(flat=False)
+    args.pop('partial', None)
+    args[cursor_arg] = cursor
+    return url_for(endpoint, **args)
+
+
+def filter_gifts(query):
+    """Apply the gift list filters and sort from the query string.
+
+    Returns (query, sort_keys) ready for queries.keyset_page.
+    """
     person_ids = request.args.getlist('person_id')
     if person_ids and '' not in person_ids:
         query = query.filter(Gift.person_id.in_(person_ids))
@@ -405,29 +669,63 @@ def gifts_list():
     if status:
         query = query.filter_by(status=status)
 
-    search = request.args.get('search')
+    search = request.args.get('search', '').strip()
+    rank = None
     if search:
-        query = query.filter(Gift.item_name.ilike(f'%{search}%'))
-
-    sort_by = request.args.get('sort_by', 'id_desc')
-    sort_map = {
-        'price_asc': Gift.price.asc(),
-        'price_desc': Gift.price.desc(),
-        'name_asc': Gift.item_name.asc(),
-        'name_desc': Gift.item_name.desc(),
-    }
-    query = query.order_by(sort_map.get(sort_by, Gift.id.desc()))
-
-    gifts = query.all()
-    people = Person.query.order_by(Person.name).all()
+        query, rank = search_gifts(query, search)
+
+    sort_by = request.args.get('sort_by', 'relevance' if rank is not None else 'id_desc')
+    if sort_by == 'relevance' and rank is not None:
+        query = query.options(with_expression(Gift.search_rank, rank))
+        sort_keys = queries.relevance_sort(rank)
+    else:
+        sort_keys = queries.GIFT_SORTS.get(sort_by, queries.GIFT_SORTS['id_desc'])
+    return query, sort_keys
+
+
+@main.route('/gifts')
+def gifts_list():
+    active_tab = 'pool' if request.args.get('tab') == 'pool' else 'gifts'
+    limit = page_size()
+
+    # Pool gifts (unassigned — shareable ideas)
+    pool_query = queries.gift_query().filter(Gift.person_id.is_(None))
+
+    # Assigned gifts with filters
+    query, sort_keys = filter_gifts(queries.gift_query().filter(Gift.person_id.isnot(None)))
+
+    # Only the visible tab is paged; the other one just needs its badge count
+    if active_tab == 'pool':
+        page_gifts, cursor = queries.keyset_page(pool_query, queries.GIFT_SORTS['id_desc'],
+                                                 request.args.get('pool_after'), limit)
+        next_url = next_page_url('pool_after', cursor)
+        first_page = not request.args.get('pool_after')
+    else:
+        page_gifts, cursor = queries.keyset_page(query, sort_keys,
+                                                 request.args.get('after'), limit)
+        next_url = next_page_url('after', cursor)
+        first_page = not request.args.get('after')
+
+    people = queries.people_options()
+    if request.args.get('partial'):
+        return render_template('_gift_page.html',
+                               page_gifts=page_gifts,
+                               kind=active_tab,
+                               next_url=next_url,
+                               first_page=first_page,
+                               people=people)
+
     occasions = Occasion.query.all()
     available_years = get_available_years()
     current_year = datetime.date.today().year
-    active_tab = 'pool' if request.args.get('tab') == 'pool' else 'gifts'
 
     return render_template('gifts.html',
-                           gifts=gifts,
-                           pool_gifts=pool_gifts,
+                           page_gifts=page_gifts,
+                           kind=active_tab,
+                           next_url=next_url,
+                           first_page=first_page,
+                           gift_count=query.order_by(None).count(),
+                           pool_count=pool_query.order_by(None).count(),
                            people=people,
                            occasions=occasions,
                            current_year=current_year,
@@ -471,6 +769,7 @@ def add_gift():
     )
     db.session.add(new_gift)
     db.session.commit()
+    prefetch_remote_image(image_url)
 
     if is_pool or not person_id:
         flash('Added to Gift Pool!', 'success')
@@ -503,6 +802,8 @@ def assign_pool_gift(id):
     db.session.add(new_gift)
     db.session.commit()
     flash(f'Gift assigned to {person.name}!', 'success')
+    if request.form.get('return_to') == 'profile':
+        return redirect(url_for('main.person_profile', id=person.id))
     return redirect(url_for('main.gifts_list', tab='pool'))
 
 
@@ -510,8 +811,7 @@ def assign_pool_gift(id):
 def toggle_gift_status(id):
     """Cycle gift status: Idea → Bought → Given → Idea."""
     gift = Gift.query.get_or_404(id)
-    idx = STATUS_CYCLE.index(gift.status) if gift.status in STATUS_CYCLE else 0
-    gift.status = STATUS_CYCLE[(idx + 1) % len(STATUS_CYCLE)]
+    gift.status = next_status(gift.status)
     db.session.commit()
     return redirect(request.referrer or url_for('main.gifts_list'))
 
@@ -533,16 +833,19 @@ def edit_gift(id):
         gift.notes = request.form.get('notes', '').strip() or None
         gift.image_url = request.form.get('image_url', '').strip() or None
 
+        old_path = gift.image_path
         new_path = save_upload(request.files.get('image'))
         if new_path:
-            delete_image(gift.image_path)
             gift.image_path = new_path
+            if old_path != new_path:
+                delete_image(old_path)
 
         db.session.commit()
+        prefetch_remote_image(gift.image_url)
         flash('Gift updated.', 'success')
         return redirect(url_for('main.gifts_list'))
 
-    people = Person.query.order_by(Person.name).all()
+    people = queries.people_options()
     occasions = Occasion.query.all()
     return render_template('edit_gift.html', gift=gift, people=people,
                            occasions=occasions, month_names=MONTH_NAMES)
@@ -558,32 +861,296 @@ def delete_gift(id):
     return redirect(request.referrer or url_for('main.gifts_list'))
 
 
+@main.route('/gifts/batch', methods=['POST'])
+def batch_gifts():
+    """Apply one action to every selected gift with a single set-based statement.
+
+    `status` sets a status, `assign` copies pool gifts to a person the way
+    assign_pool_gift does, `delete` removes the gifts and then any images
+    left unreferenced.
+    """
+    back = request.referrer or url_for('main.gifts_list')
+    ids = {int(id) for id in request.form.getlist('ids') if id.isdigit()}
+    action = request.form.get('action')
+    if not ids:
+        flash('Select at least one gift.', 'warning')
+        return redirect(back)
+    selected = Gift.query.filter(Gift.id.in_(ids))
+
+    if action == 'status':
+        status = request.form.get('status')
+        if status not in STATUS_CYCLE:
+            flash('Please select a status.', 'warning')
+            return redirect(back)
+        count = selected.update({Gift.status: status}, synchronize_session=False)
+        db.session.commit()
+        flash(f'Marked {count} gift(s) as {status}.', 'success')
+
+    elif action == 'assign':
+        person = db.session.get(Person, request.form.get('person_id', type=int) or 0)
+        if not person:
+            flash('Please select a person.', 'warning')
+            return redirect(back)
+        columns = ['person_id', 'item_name', 'occasion_id', 'price', 'year', 'status',
+                   'image_path', 'image_url', 'notes']
+        copies = (select(literal(person.id), Gift.item_name, Gift.occasion_id, Gift.price,
+                         func.coalesce(Gift.year, datetime.date.today().year), literal('Idea'),
+                         Gift.image_path, Gift.image_url, Gift.notes)
+                  .where(Gift.id.in_(ids), Gift.person_id.is_(None))
+                  .order_by(Gift.id))
+        count = db.session.execute(insert(Gift).from_select(columns, copies)).rowcount
+        db.session.commit()
+        flash(f'{count} gift(s) assigned to {person.name}!', 'success')
+
+    elif action == 'delete':
+        image_paths = [path for path, in selected.with_entities(Gift.image_path).distinct()]
+        delete_images(image_paths)
+        count = selected.delete(synchronize_session=False)
+        db.session.commit()
+        flash(f'Deleted {count} gift(s).', 'success')
+
+    else:
+        flash('Unknown batch action.', 'warning')
+    return redirect(back)
+
+
 # ── stats ─────────────────────────────────────────────────────────────────────
 
 @main.route('/stats')
+@cached_page
 def stats():
-    from sqlalchemy import func
-
     year = request.args.get('year')
+    try:
+        year_filter = int(year) if year else None
+    except ValueError:
+        year_filter = None
 
-    query = (db.session.query(
-                 Person.name,
-                 Person.id,
-                 func.count(Gift.id).label('total_gifts'),
-                 func.coalesce(func.sum(Gift.price), 0.0).label('total_spent')
-             )
-             .outerjoin(Gift, Person.id == Gift.person_id))
-
-    if year:
-        try:
-            query = query.filter(Gift.year == int(year))
-        except ValueError:
-            pass
-
-    stats_data = query.group_by(Person.id).order_by(Person.name).all()
-    available_years = get_available_years()
+    occasion_names = {o.id: o.name for o in Occasion.query.all()}
+    by_occasion = [(occasion_names.get(row[0], 'General'), row.total_gifts, row.total_spent)
+                   for row in queries.spending_by(GiftRollup.occasion_id, year_filter)]
+    by_status = {row[0]: row for row in queries.spending_by(GiftRollup.status, year_filter)}
+    by_year = [row for row in queries.spending_by(GiftRollup.year) if row[0] != 0]
 
     return render_template('stats.html',
-                           stats=stats_data,
-                           available_years=available_years,
+                           stats=queries.spending_by_person(year_filter),
+                           by_occasion=sorted(by_occasion, key=lambda r: -r[2]),
+                           by_status=by_status,
+                           by_year=by_year,
+                           status_cycle=STATUS_CYCLE,
+                           available_years=get_available_years(),
                            selected_year=year)
+
+
+# ── metrics ───────────────────────────────────────────────────────────────────
+
+@main.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint, summed across all gunicorn workers."""
+    from .metrics import render_prometheus
+    depth = jobs.queue_depth(db.session)
+    gauges = [('giftguardian_job_queue_depth', {'state': state}, count)
+              for state, count in depth.items()]
+    body = render_prometheus(*current_app.extensions['metrics'].collect(), gauges)
+    return current_app.response_class(body, mimetype='text/plain; version=0.0.4')
+
+
+# ── JSON API ──────────────────────────────────────────────────────────────────
+# Versioned under /api/v1. Lists take ?fields=a,b to pick fields and page with
+# the same keyset cursors as the gift list (?after=, ?per_page=). PATCH takes a
+# JSON object of the fields to change; for gifts, ?fragment=card or row
+# answers with just the re-rendered HTML for in-place updates.
+
+GIFT_FIELDS = {
+    'id': lambda g: g.id,
+    'item_name': lambda g: g.item_name,
+    'person_id': lambda g: g.person_id,
+    'person': lambda g: g.person.name if g.person else None,
+    'occasion_id': lambda g: g.occasion_id,
+    'occasion': lambda g: g.occasion.name if g.occasion else None,
+    'year': lambda g: g.year,
+    'status': lambda g: g.status,
+    'price': lambda g: g.price,
+    'image_path': lambda g: g.image_path,
+    'image_url': lambda g: g.image_url,
+    'notes': lambda g: g.notes,
+}
+PERSON_FIELDS = {
+    'id': lambda p: p.id,
+    'name': lambda p: p.name,
+    'relation_id': lambda p: p.relation_id,
+    'relation': lambda p: p.relation.name if p.relation else None,
+    'birthday_month': lambda p: p.birthday_month,
+    'birthday_day': lambda p: p.birthday_day,
+    'birthday_year': lambda p: p.birthday_year,
+}
+GIFT_FRAGMENTS = {
+    'card': ('_gift_page.html', 'gift_card'),   # gifts.html grid
+    'row': ('_gift_row.html', 'gift_row'),      # person_profile.html history
+}
+
+
+@api.errorhandler(HTTPException)
+def api_error(e):
+    return jsonify(error=e.description), e.code
+
+
+def requested_fields(available):
+    """Field names from ?fields=, defaulting to all of `available`."""
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    unknown = [f for f in fields if f not in available]
+    if unknown:
+        abort(400, f"Unknown field(s): {', '.join(unknown)}.")
+    return fields or list(available)
+
+
+def serialize(obj, available):
+    return {field: available[field](obj) for field in requested_fields(available)}
+
+
+# Parsers for PATCH values: return the value to store or raise ValueError
+# with the rest of a "<field> ..." message.
+
+def text_value(max_length, required=False):
+    def parse(value):
+        value = '' if value is None else str(value).strip()
+        if required and not value:
+            raise ValueError('is required')
+        if len(value) > max_length:
+            raise ValueError(f'is longer than {max_length} characters')
+        return value or None
+    return parse
+
+
+def int_value(low, high, required=False):
+    def parse(value):
+        if value is None or value == '':
+            if required:
+                raise ValueError('is required')
+            return None
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError('must be a whole number')
+        try:
+            number = int(value)
+        except ValueError:
+            raise ValueError('must be a whole number')
+        if not low <= number <= high:
+            raise ValueError(f'must be between {low} and {high}')
+        return number
+    return parse
+
+
+def price_value(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError('must be a number')
+    try:
+        price = float(value)
+    except ValueError:
+        raise ValueError('must be a number')
+    if not 0 <= price < float('inf'):
+        raise ValueError('must be a non-negative number')
+    return round(price, 2)
+
+
+def status_value(value):
+    if value not in STATUS_CYCLE:
+        raise ValueError(f"must be one of {', '.join(STATUS_CYCLE)}")
+    return value
+
+
+def ref_value(model, required=False):
+    def parse(value):
+        id = int_value(1, 2 ** 63 - 1, required)(value)
+        if id is not None and db.session.get(model, id) is None:
+            raise ValueError(f'refers to a missing {model.__tablename__}')
+        return id
+    return parse
+
+
+GIFT_PATCH = {
+    'item_name': text_value(200, required=True),
+    'person_id': ref_value(Person),
+    'occasion_id': ref_value(Occasion),
+    'year': int_value(1900, 2100),
+    'status': status_value,
+    'price': price_value,
+    'image_url': text_value(500),
+    'notes': text_value(10000),
+}
+PERSON_PATCH = {
+    'name': text_value(100, required=True),
+    'relation_id': ref_value(Relation),
+    'birthday_month': int_value(1, 12, required=True),
+    'birthday_day': int_value(1, 31, required=True),
+    'birthday_year': int_value(1850, 2100),
+}
+
+
+def apply_patch(obj, parsers):
+    """Set the fields in the JSON request body on `obj`; return the changed names."""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        abort(400, 'Expected a JSON object.')
+    unknown = sorted(set(data) - set(parsers))
+    if unknown:
+        abort(400, f"Unknown or read-only field(s): {', '.join(unknown)}.")
+    changed = set()
+    for field, value in data.items():
+        try:
+            value = parsers[field](value)
+        except ValueError as e:
+            abort(400, f'{field} {e}.')
+        if getattr(obj, field) != value:
+            setattr(obj, field, value)
+            changed.add(field)
+    return changed
+
+
+@api.route('/gifts')
+def gifts():
+    """Gifts, filtered like the gift list; ?pool=1 lists the Gift Pool instead."""
+    pool = request.args.get('pool') == '1'
+    query, sort_keys = filter_gifts(queries.gift_query().filter(
+        Gift.person_id.is_(None) if pool else Gift.person_id.isnot(None)))
+    rows, cursor = queries.keyset_page(query, sort_keys, request.args.get('after'), page_size())
+    return jsonify(items=[serialize(g, GIFT_FIELDS) for g in rows],
+                   next=next_page_url('after', cursor, 'api.gifts'))
+
+
+@api.route('/gifts/<int:id>', methods=['GET', 'PATCH'])
+def gift(id):
+    gift = queries.gift_query().filter_by(id=id).first_or_404()
+    if request.method == 'PATCH':
+        changed = apply_patch(gift, GIFT_PATCH)
+        db.session.commit()
+        if 'image_url' in changed:
+            prefetch_remote_image(gift.image_url)
+
+    fragment = request.args.get('fragment')
+    if fragment:
+        if fragment not in GIFT_FRAGMENTS:
+            abort(400, f"fragment must be one of {', '.join(GIFT_FRAGMENTS)}.")
+        return get_template_attribute(*GIFT_FRAGMENTS[fragment])(gift)
+    return jsonify(serialize(gift, GIFT_FIELDS))
+
+
+@api.route('/people')
+def people():
+    rows, cursor = queries.keyset_page(queries.person_query(), queries.PERSON_SORT,
+                                       request.args.get('after'), page_size())
+    return jsonify(items=[serialize(p, PERSON_FIELDS) for p in rows],
+                   next=next_page_url('after', cursor, 'api.people'))
+
+
+@api.route('/people/<int:id>', methods=['GET', 'PATCH'])
+def person(id):
+    person = queries.person_query().filter_by(id=id).first_or_404()
+    if request.method == 'PATCH':
+        changed = apply_patch(person, PERSON_PATCH)
+        if person.birthday_day > calendar.monthrange(2000, person.birthday_month)[1]:
+            abort(400, 'birthday_day is past the end of the month.')
+        if changed & {'birthday_month', 'birthday_day'}:
+            events.index_person_events(person)
+        db.session.commit()
+    return jsonify(serialize(person, PERSON_FIELDS))
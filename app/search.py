@@ -0,0 +1,83 @@
+import contextlib
+import re
+import sqlite3
+from flask import current_app
+from sqlalchemy import column, literal_column, or_, select, table, text
+from .models import Gift
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# External-content FTS5 index over gift.item_name / gift.notes, kept in sync
+# by triggers so bulk UPDATE/DELETE statements stay consistent too.
+FTS_SCHEMA = [
+    """CREATE VIRTUAL TABLE gift_fts USING fts5(
+           item_name, notes, content='gift', content_rowid='id',
+           tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER gift_fts_ai AFTER INSERT ON gift BEGIN
+           INSERT INTO gift_fts(rowid, item_name, notes)
+           VALUES (new.id, new.item_name, new.notes);
+       END""",
+    """CREATE TRIGGER gift_fts_ad AFTER DELETE ON gift BEGIN
+           INSERT INTO gift_fts(gift_fts, rowid, item_name, notes)
+           VALUES ('delete', old.id, old.item_name, old.notes);
+       END""",
+    """CREATE TRIGGER gift_fts_au AFTER UPDATE OF item_name, notes ON gift BEGIN
+           INSERT INTO gift_fts(gift_fts, rowid, item_name, notes)
+           VALUES ('delete', old.id, old.item_name, old.notes);
+           INSERT INTO gift_fts(rowid, item_name, notes)
+           VALUES (new.id, new.item_name, new.notes);
+       END""",
+]
+
+
+def fts5_available():
+    """Whether the linked SQLite library was built with FTS5."""
+    with contextlib.closing(sqlite3.connect(':memory:')) as probe:
+        try:
+            probe.execute('CREATE VIRTUAL TABLE probe USING fts5(x)')
+        except sqlite3.OperationalError:
+            return False
+    return True
+
+
+def gift_fts_exists(conn):
+    return conn.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='gift_fts'")).first() is not None
+
+
+def ensure_gift_fts(conn):
+    """Create and backfill the gift search index; False if FTS5 is unavailable."""
+    if gift_fts_exists(conn):
+        return True
+    if not fts5_available():
+        current_app.logger.warning("FTS5 unavailable, gift search falls back to LIKE")
+        return False
+    for statement in FTS_SCHEMA:
+        conn.execute(text(statement))
+    conn.execute(text("INSERT INTO gift_fts(gift_fts) VALUES ('rebuild')"))
+    return True
+
+
+def match_expression(term):
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    return ' '.join(f'"{token}"*' for token in TOKEN_RE.findall(term))
+
+
+def search_gifts(query, term):
+    """Filter a Gift query by `term`; return (query, rank_column or None).
+
+    With FTS5 the rank column (bm25, lower is better) can be used as a sort
+    key; the LIKE fallback has no ranking.
+    """
+    if current_app.config.get('GIFT_SEARCH_FTS'):
+        expression = match_expression(term)
+        if not expression:
+            return query, None
+        fts = table('gift_fts', column('rowid'), column('rank'))
+        hits = (select(fts.c.rowid.label('gift_id'), fts.c.rank.label('rank'))
+                .where(literal_column('gift_fts').op('MATCH')(expression))
+                .subquery('hits'))
+        return query.join(hits, hits.c.gift_id == Gift.id), hits.c.rank
+
+    pattern = f'%{term}%'
+    return query.filter(or_(Gift.item_name.ilike(pattern), Gift.notes.ilike(pattern))), None
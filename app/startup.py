@@ -0,0 +1,124 @@
+"""Worker startup: phase timings, background services, templates, secret key.
+
+Under gunicorn with `server_preload`, create_app() runs once in the master
+and workers are forked from it, so schema checks, asset and template
+compilation are paid once per server start instead of once per worker.
+Threads do not survive a fork, which is why background services are
+registered here and started by the process that will run them.
+"""
+import logging
+import os
+import tempfile
+import time
+from jinja2 import FileSystemBytecodeCache
+
+logger = logging.getLogger(__name__)
+
+PRELOAD_ENV = 'GIFTGUARDIAN_PRELOAD'   # set by gunicorn.conf.py when preloading
+
+
+def preloading():
+    """True while create_app() runs in a gunicorn master that will fork workers."""
+    return os.environ.get(PRELOAD_ENV) == '1'
+
+
+class StartupTimer:
+    """Log how long each phase of create_app() takes, then the total."""
+
+    def __init__(self, label='Startup'):
+        self.label = label
+        self.start = self.last = time.perf_counter()
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self.last) * 1000))
+        self.last = now
+
+    def done(self):
+        total = (time.perf_counter() - self.start) * 1000
+        detail = ', '.join(f'{phase} {ms:.0f}' for phase, ms in self.phases)
+        logger.info(f"{self.label} took {total:.0f} ms in pid {os.getpid()} ({detail})")
+        return dict(self.phases, total=total)
+
+
+class BackgroundServices:
+    """Thread starters deferred until the serving process is known.
+
+    start() runs each starter at most once per process. create_app() never
+    calls it, so CLI commands, tests and benchmarks run without job workers
+    or schedulers; gunicorn's post_worker_init hook calls it in every
+    worker, and wsgi.py when run directly.
+    """
+
+    def __init__(self):
+        self.starters = []
+        self.started_pid = None
+        self.stops = []
+
+    def add(self, name, starter):
+        self.starters.append((name, starter))
+
+    def start(self):
+        if self.started_pid == os.getpid():
+            return
+        self.started_pid = os.getpid()
+        self.stops = []
+        for name, starter in self.starters:
+            try:
+                stop = starter()
+            except Exception as e:
+                logger.warning(f"Could not start {name}: {e}")
+                continue
+            if stop is not None:
+                self.stops.append(stop)
+
+    def stop(self):
+        for stop in self.stops:
+            stop.set()
+
+
+def load_secret_key(path):
+    """Read the key at `path`, creating it if missing.
+
+    Workers booting together must agree on one key, or sessions signed by
+    one are unreadable in the others. The key is written to a temporary
+    file and hard-linked into place, which fails for all but the first
+    worker; the rest read the winner's key.
+    """
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.secret-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(os.urandom(24))
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            pass
+    finally:
+        os.remove(tmp)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def template_cache(directory):
+    """Jinja bytecode cache in `directory`, shared by workers and restarts.
+
+    Entries are keyed by template name and checked against the source's
+    checksum, so an upgraded add-on simply writes new ones.
+    """
+    os.makedirs(directory, exist_ok=True)
+    return FileSystemBytecodeCache(directory)
+
+
+def precompile_templates(app):
+    """Load every template now, so no request pays for compiling one."""
+    env = app.jinja_env
+    names = env.list_templates(filter_func=lambda name: name.endswith('.html'))
+    for name in names:
+        env.get_template(name)
+    return len(names)
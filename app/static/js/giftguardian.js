@@ -0,0 +1,45 @@
+/* Behaviour shared by every page; loaded after the Bootstrap bundle. */
+
+// Show a pasted image URL in the <img> inside `previewId` as the user types
+function previewUrl(input, previewId) {
+  var preview = document.getElementById(previewId);
+  if (input.value) {
+    preview.querySelector('img').src = input.value;
+    preview.style.display = 'block';
+  } else {
+    preview.style.display = 'none';
+  }
+}
+
+// Forms with data-patch send their fields as JSON to that API URL and swap
+// the HTML fragment it returns in for the closest [data-fragment]. Without
+// fetch, or if the request fails, the form posts as usual.
+document.addEventListener('submit', function (e) {
+  var form = e.target;
+  if (!form.dataset.patch || !window.fetch) return;
+  var target = form.closest('[data-fragment]');
+  if (!target) return;
+  e.preventDefault();
+  var body = {};
+  new FormData(form).forEach(function (value, key) { body[key] = value; });
+  fetch(form.dataset.patch, {
+    method: 'PATCH',
+    headers: {'Content-Type': 'application/json'},
+    body: JSON.stringify(body)
+  }).then(function (r) {
+    if (!r.ok) throw new Error(r.status);
+    return r.text();
+  }).then(function (html) {
+    var template = document.createElement('template');
+    template.innerHTML = html.trim();
+    var fresh = template.content.firstElementChild;
+    // Keep checkbox selections (e.g. the gift batch toolbar) across the swap
+    target.querySelectorAll('input[type=checkbox]:checked').forEach(function (old) {
+      var box = fresh.querySelector('input[type=checkbox][value="' + old.value + '"]');
+      if (box) box.checked = true;
+    });
+    target.replaceWith(fresh);
+  }).catch(function () {
+    form.submit();
+  });
+});
@@ -0,0 +1,40 @@
+/* Gift list: batch selection and "load more". */
+
+// Batch toolbar: checkboxes live in the cards and submit with #batchForm
+function updateBatch() {
+  var count = document.querySelectorAll('.gift-select:checked').length;
+  document.getElementById('batchCount').textContent = count;
+  document.getElementById('batchForm').classList.toggle('d-none', count === 0);
+}
+document.addEventListener('change', function (e) {
+  if (e.target.classList.contains('gift-select')) updateBatch();
+});
+document.getElementById('batchSelectAll').addEventListener('click', function () {
+  document.querySelectorAll('.gift-select').forEach(function (box) { box.checked = true; });
+  updateBatch();
+});
+document.getElementById('batchClear').addEventListener('click', function () {
+  document.querySelectorAll('.gift-select').forEach(function (box) { box.checked = false; });
+  updateBatch();
+});
+updateBatch();   // the browser may restore checked boxes on back navigation
+
+// "Load more": fetch the next page as a fragment and append it to the grid
+document.addEventListener('click', function (e) {
+  var link = e.target.closest('[data-load-more]');
+  if (!link) return;
+  e.preventDefault();
+  var url = new URL(link.href, window.location.href);
+  url.searchParams.set('partial', '1');
+  link.classList.add('disabled');
+  fetch(url).then(function (r) {
+    if (!r.ok) throw new Error(r.status);
+    return r.text();
+  }).then(function (html) {
+    var grid = document.getElementById('giftGrid');
+    link.closest('.load-more').remove();
+    grid.insertAdjacentHTML('beforeend', html);
+  }).catch(function () {
+    window.location.href = link.href;
+  });
+});
@@ -0,0 +1,306 @@
+"""Gift Pool suggestions: pool gifts ranked by similarity to a person's gifts.
+
+Every gift is a sparse TF-IDF vector over the words of its name and notes
+plus one feature for its occasion and one for its price band. The vectors
+live in flat NumPy arrays (entry i says row e_row[i] has e_tf[i] of term
+e_term[i]), so scoring every pool gift against a person is one gather and
+one bincount, with no per-gift Python.
+
+Each process keeps its own index per household and brings it up to date
+before scoring from gift_change, a log filled by triggers on gift, so
+writes from any worker, bulk SQL or an import are seen. Only the changed
+gifts are re-read; a full rebuild happens on first use, after a restore
+and when the process has fallen further behind than the log reaches.
+"""
+import logging
+import re
+import threading
+import time
+import zlib
+import numpy as np
+from sqlalchemy import bindparam, text
+
+logger = logging.getLogger(__name__)
+
+CHANGE_LOG_KEEP = 10000    # log entries kept; a process further behind rebuilds
+REBUILD_CHANGES = 2000     # re-read everything rather than this many gifts
+PRICE_BANDS = [10, 25, 50, 100, 250, 500]
+NAME_WEIGHT = 2.0
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+URL_RE = re.compile(r'\S+://\S+|www\.\S+')
+STOPWORDS = frozenset("""
+    a an and are as at be by for from has he her his in is it its of on or
+    she so the their they this to was were will with you your
+""".split())
+
+# The log is trimmed by the same triggers that fill it. Only columns that
+# feed a gift's features (or decide whether it is in the pool) count.
+GIFT_CHANGE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS gift_change (
+           seq INTEGER PRIMARY KEY AUTOINCREMENT,
+           gift_id INTEGER NOT NULL)""",
+] + [
+    f"""CREATE TRIGGER IF NOT EXISTS gift_change_{suffix} AFTER {action} ON gift BEGIN
+            INSERT INTO gift_change (gift_id) VALUES ({row}.id);
+            DELETE FROM gift_change WHERE seq <= (SELECT MAX(seq) FROM gift_change) - {CHANGE_LOG_KEEP};
+        END"""
+    for suffix, action, row in [
+        ('ai', 'INSERT', 'new'),
+        ('au', 'UPDATE OF item_name, notes, occasion_id, price, person_id', 'new'),
+        ('ad', 'DELETE', 'old'),
+    ]
+]
+
+GIFT_COLUMNS = "SELECT id, item_name, notes, occasion_id, price, person_id FROM gift"
+CHANGES_SQL = text("SELECT DISTINCT gift_id FROM gift_change WHERE seq > :after AND seq <= :upto")
+CHANGED_GIFTS_SQL = text(f"{GIFT_COLUMNS} WHERE id IN :ids").bindparams(bindparam('ids', expanding=True))
+
+
+def install_gift_change_log(conn):
+    for statement in GIFT_CHANGE_SCHEMA:
+        conn.execute(text(statement))
+
+
+def last_change(conn):
+    return conn.execute(text("SELECT MAX(seq) FROM gift_change")).scalar() or 0
+
+
+def force_rebuild(conn, previous=0):
+    """Make every process rebuild its index, e.g. after the database was replaced.
+
+    The marker (gift_id 0) is numbered past `previous`, the log position
+    before the replacement, so no process can mistake it for history.
+    """
+    conn.execute(text("""
+        INSERT INTO gift_change (seq, gift_id)
+        VALUES (MAX(:previous, (SELECT IFNULL(MAX(seq), 0) FROM gift_change)) + 1, 0)"""),
+        {'previous': previous})
+
+
+# ── features ─────────────────────────────────────────────────────────────────
+
+def words(value):
+    """Lowercased words worth matching on; links in notes are dropped."""
+    if not value:
+        return []
+    value = value.lower()
+    if '://' in value or 'www.' in value:
+        value = URL_RE.sub(' ', value)
+    return [word for word in TOKEN_RE.findall(value)
+            if len(word) > 1 and not word.isdigit() and word not in STOPWORDS]
+
+
+def price_band(price):
+    for i, limit in enumerate(PRICE_BANDS):
+        if price < limit:
+            return i
+    return len(PRICE_BANDS)
+
+
+def gift_features(item_name, notes, occasion_id, price):
+    """{feature: weight} for one gift; name words count double."""
+    features = {}
+    for word in words(item_name):
+        features[word] = features.get(word, 0.0) + NAME_WEIGHT
+    for word in words(notes):
+        features[word] = features.get(word, 0.0) + 1.0
+    if occasion_id:
+        features[f'occasion:{occasion_id}'] = 1.0
+    if price:
+        features[f'price:{price_band(price)}'] = 1.0
+    return features
+
+
+def name_key(item_name):
+    """Hash of a gift's normalised name, to skip ideas the person already has."""
+    return zlib.crc32(' '.join(TOKEN_RE.findall((item_name or '').lower())).encode('utf-8'))
+
+
+def _grow(array, size):
+    if size <= len(array):
+        return array
+    grown = np.zeros(max(size, 2 * len(array), 64), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+# ── index ────────────────────────────────────────────────────────────────────
+
+class SuggestionIndex:
+    """TF-IDF vectors of one household's gifts, updated incrementally."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.seq = None               # last gift_change applied; None = never built
+        self.vocab = {}
+        self.df = np.zeros(0, np.float64)
+        self.rows = {}                # gift id -> row
+        self.n_rows = 0
+        self.row_gift = np.zeros(0, np.int64)
+        self.row_person = np.zeros(0, np.int64)   # 0 = Gift Pool
+        self.row_name = np.zeros(0, np.int64)
+        self.row_alive = np.zeros(0, bool)
+        self.row_start = np.zeros(0, np.int64)
+        self.row_end = np.zeros(0, np.int64)
+        self.n_entries = 0
+        self.dead_entries = 0
+        self.e_row = np.zeros(0, np.int32)
+        self.e_term = np.zeros(0, np.int32)
+        self.e_tf = np.zeros(0, np.float32)
+        self._scoring = None          # see _scoring_arrays(); reset by every change
+
+    def __len__(self):
+        return len(self.rows)
+
+    # ── updates ──
+
+    def _add(self, gifts):
+        """Append rows for (id, item_name, notes, occasion_id, price, person_id) tuples."""
+        terms, tfs, counts = [], [], []
+        for gift_id, item_name, notes, occasion_id, price, person_id in gifts:
+            features = gift_features(item_name, notes, occasion_id, price)
+            for feature, weight in features.items():
+                terms.append(self.vocab.setdefault(feature, len(self.vocab)))
+                tfs.append(weight)
+            counts.append(len(features))
+            self.rows[gift_id] = self.n_rows + len(counts) - 1
+        if not counts:
+            return
+        first, n = self.n_rows, len(counts)
+        self.n_rows += n
+        for name in ('row_gift', 'row_person', 'row_name', 'row_alive', 'row_start', 'row_end'):
+            setattr(self, name, _grow(getattr(self, name), self.n_rows))
+        self.row_gift[first:self.n_rows] = [gift[0] for gift in gifts]
+        self.row_person[first:self.n_rows] = [gift[5] or 0 for gift in gifts]
+        self.row_name[first:self.n_rows] = [name_key(gift[1]) for gift in gifts]
+        self.row_alive[first:self.n_rows] = True
+        ends = self.n_entries + np.cumsum(counts)
+        self.row_end[first:self.n_rows] = ends
+        self.row_start[first:self.n_rows] = ends - counts
+
+        start = self.n_entries
+        self.n_entries += len(terms)
+        self.e_row = _grow(self.e_row, self.n_entries)
+        self.e_term = _grow(self.e_term, self.n_entries)
+        self.e_tf = _grow(self.e_tf, self.n_entries)
+        self.e_row[start:self.n_entries] = np.repeat(np.arange(first, self.n_rows), counts)
+        self.e_term[start:self.n_entries] = terms
+        self.e_tf[start:self.n_entries] = tfs
+        self.df = _grow(self.df, len(self.vocab))
+        np.add.at(self.df, np.asarray(terms, np.int64), 1)
+        self._scoring = None
+
+    def _remove(self, gift_id):
+        row = self.rows.pop(gift_id, None)
+        if row is None:
+            return
+        start, end = self.row_start[row], self.row_end[row]
+        np.subtract.at(self.df, self.e_term[start:end], 1)
+        self.row_alive[row] = False
+        self.dead_entries += end - start
+        self._scoring = None
+
+    def _compact(self):
+        """Drop removed rows once they make up half the entries."""
+        keep_rows = np.flatnonzero(self.row_alive[:self.n_rows])
+        keep = self.row_alive[self.e_row[:self.n_entries]]
+        renumber = np.zeros(self.n_rows, np.int32)
+        renumber[keep_rows] = np.arange(len(keep_rows), dtype=np.int32)
+        self.e_row = renumber[self.e_row[:self.n_entries][keep]]
+        self.e_term = self.e_term[:self.n_entries][keep]
+        self.e_tf = self.e_tf[:self.n_entries][keep]
+        self.n_entries = len(self.e_row)
+        counts = self.row_end[keep_rows] - self.row_start[keep_rows]
+        for name in ('row_gift', 'row_person', 'row_name', 'row_alive'):
+            setattr(self, name, getattr(self, name)[keep_rows])
+        self.row_end = np.cumsum(counts)
+        self.row_start = self.row_end - counts
+        self.n_rows = len(keep_rows)
+        self.rows = {int(gift_id): row for row, gift_id in enumerate(self.row_gift)}
+        self.dead_entries = 0
+        self._scoring = None
+
+    def _rebuild(self, conn, upto):
+        started = time.perf_counter()
+        self._clear()
+        self._add(conn.execute(text(GIFT_COLUMNS)).all())
+        self.seq = upto
+        logger.info(f"Built gift suggestion index: {len(self)} gifts, {len(self.vocab)} features "
+                    f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    def refresh(self, conn):
+        """Apply the gifts changed since the last call (or build the index)."""
+        with self.lock:
+            self._refresh(conn)
+
+    def _refresh(self, conn):
+        upto = last_change(conn)
+        if self.seq is None or upto < self.seq:
+            return self._rebuild(conn, upto)
+        if upto == self.seq:
+            return
+        oldest = conn.execute(text("SELECT MIN(seq) FROM gift_change")).scalar()
+        if oldest > self.seq + 1:
+            return self._rebuild(conn, upto)   # trimmed past what this process saw
+        changed = [row[0] for row in conn.execute(CHANGES_SQL, {'after': self.seq, 'upto': upto})]
+        if len(changed) > REBUILD_CHANGES or 0 in changed:
+            return self._rebuild(conn, upto)
+        for gift_id in changed:
+            self._remove(gift_id)
+        self._add(conn.execute(CHANGED_GIFTS_SQL, {'ids': changed}).all())
+        self.seq = upto
+        if self.dead_entries > max(self.n_entries // 2, 1000):
+            self._compact()
+
+    # ── scoring ──
+
+    def _scoring_arrays(self):
+        """TF-IDF weights of every entry, row norms, and the pool's entries.
+
+        Only pool gifts are ever scored, so their entries are gathered once
+        per change rather than on every request: (weights, norms, pool rows,
+        pool entries' local row / term / weight).
+        """
+        if self._scoring is None:
+            n, m = self.n_rows, self.n_entries
+            idf = np.log((1.0 + len(self)) / (1.0 + self.df)) + 1.0
+            weights = self.e_tf[:m] * idf[self.e_term[:m]].astype(np.float32)
+            norms = np.sqrt(np.bincount(self.e_row[:m], weights * weights, minlength=n))
+            norms[norms == 0] = 1.0
+            in_pool = self.row_alive[:n] & (self.row_person[:n] == 0)
+            pool = np.flatnonzero(in_pool)
+            local = np.cumsum(in_pool) - 1
+            entries = np.flatnonzero(in_pool[self.e_row[:m]])
+            rows = self.e_row[entries]
+            self._scoring = (weights, norms, pool, local[rows].astype(np.int32),
+                             self.e_term[entries], weights[entries] / norms[rows].astype(np.float32))
+        return self._scoring
+
+    def suggest(self, conn, person_id, limit):
+        """[(gift id, cosine similarity)] of the pool gifts most like `person_id`'s, best first.
+
+        The person's profile is the sum of their gifts' unit vectors, so
+        every gift counts equally however long its notes are. Pool gifts
+        the person already has a gift of the same name for are skipped.
+        """
+        with self.lock:
+            self._refresh(conn)
+            own = np.flatnonzero(self.row_alive[:self.n_rows] & (self.row_person[:self.n_rows] == person_id))
+            if not len(own) or not limit:
+                return []
+            weights, norms, pool, pool_row, pool_term, pool_weight = self._scoring_arrays()
+            entries = np.concatenate([np.arange(self.row_start[row], self.row_end[row]) for row in own])
+            profile = np.zeros(len(self.vocab), np.float32)
+            np.add.at(profile, self.e_term[entries], weights[entries] / norms[self.e_row[entries]])
+            profile /= np.sqrt(profile @ profile) or 1.0
+
+            scores = np.bincount(pool_row, pool_weight * profile[pool_term], minlength=len(pool))
+            best = np.flatnonzero(scores > 0)
+            best = best[~np.isin(self.row_name[pool[best]], self.row_name[own])]
+            if len(best) > limit:
+                best = best[np.argpartition(-scores[best], limit - 1)[:limit]]
+            best = best[np.argsort(-scores[best], kind='stable')]
+            return [(int(self.row_gift[pool[i]]), float(scores[i])) for i in best]
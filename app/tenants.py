@@ -0,0 +1,336 @@
+"""Multi-household mode: one SQLite file and upload folder per tenant.
+
+With `tenant_mode` set, TenantMiddleware picks a household from the
+request (a /h/<name> path prefix, an X-GiftGuardian-Tenant header set by a
+trusted proxy, or the first label of the Host) and the app serves it from
+DATA_DIR/tenants/<name>/. Requests that name no household use the usual
+DATA_DIR files, so a single-family install is unchanged.
+
+Tenant engines are opened on first use, migrated under a per-tenant lock,
+and kept in an LRU of at most `tenant_max_open`; households idle for
+`tenant_idle_s` are closed again. The default household's engine is the
+one Flask-SQLAlchemy creates and is never evicted.
+"""
+import contextlib
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, g, request
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import create_engine
+from werkzeug.exceptions import NotFound
+from .database import configure_sqlite, start_checkpointer
+from .jobs import JobQueue
+from .metrics import instrument_engine
+from .suggest import SuggestionIndex
+
+logger = logging.getLogger(__name__)
+
+MODES = {'off', 'path', 'header', 'subdomain'}
+NAME_RE = re.compile(r'^[a-z0-9][a-z0-9_-]{0,62}$')
+PATH_PREFIX = '/h/'
+HEADER = 'HTTP_X_GIFTGUARDIAN_TENANT'
+ENVIRON_KEY = 'giftguardian.tenant'
+
+_current = contextvars.ContextVar('giftguardian_tenant', default=None)
+
+
+def current_tenant():
+    """The Tenant the current request is bound to, or None for the default household."""
+    return _current.get()
+
+
+def tenant_config(key):
+    """A per-household setting (folders, DATA_DIR), falling back to app.config."""
+    tenant = _current.get()
+    if tenant is not None and key in tenant.config:
+        return tenant.config[key]
+    return current_app.config[key]
+
+
+class TenantSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy whose engines follow the current request's tenant.
+
+    db.engine, db.session binds and create_all() all go through `engines`,
+    so overriding it is enough to point every query at the tenant's file.
+    """
+
+    @property
+    def engines(self):
+        tenant = _current.get()
+        if tenant is not None:
+            return tenant.engines
+        return super().engines
+
+
+def tenant_names(value):
+    """Valid household names from a list or a "smith,jones" string."""
+    if isinstance(value, str):
+        value = value.replace(' ', '').split(',')
+    names = set()
+    for name in value:
+        name = str(name).strip().lower()
+        if not name:
+            continue
+        if not NAME_RE.match(name):
+            raise ValueError(f'Invalid tenant name: {name!r}')
+        names.add(name)
+    return names
+
+
+# ── routing ──────────────────────────────────────────────────────────────────
+
+class TenantMiddleware:
+    """Store the requested household name in environ[ENVIRON_KEY].
+
+    Runs inside IngressMiddleware, so in path mode the /h/<name> prefix is
+    moved onto the ingress SCRIPT_NAME and url_for() keeps generating links
+    within the household. Unknown names in a path or header get a 404; a
+    Host whose first label is not a household uses the default one.
+    """
+
+    def __init__(self, app, mode, names):
+        self.app = app
+        self.mode = mode
+        self.names = names
+
+    def __call__(self, environ, start_response):
+        environ.pop(ENVIRON_KEY, None)
+        name = None
+        if self.mode == 'path':
+            path_info = environ.get('PATH_INFO', '')
+            if path_info.startswith(PATH_PREFIX):
+                name, _, rest = path_info[len(PATH_PREFIX):].partition('/')
+                if name not in self.names:
+                    return NotFound()(environ, start_response)
+                environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + PATH_PREFIX + name
+                environ['PATH_INFO'] = '/' + rest
+        elif self.mode == 'header':
+            name = environ.get(HEADER, '').strip().lower() or None
+            if name is not None and name not in self.names:
+                return NotFound()(environ, start_response)
+        elif self.mode == 'subdomain':
+            host = environ.get('HTTP_HOST', '').split(':', 1)[0]
+            label = host.split('.', 1)[0].lower()
+            name = label if label in self.names and '.' in host else None
+        if name is not None:
+            environ[ENVIRON_KEY] = name
+        return self.app(environ, start_response)
+
+
+# ── engines ──────────────────────────────────────────────────────────────────
+
+class Tenant:
+    """An open household: its engine plus the folders routes read via tenant_config()."""
+
+    def __init__(self, name, data_dir, engine, config):
+        self.name = name
+        self.data_dir = data_dir
+        self.engines = {None: engine}
+        self.config = config
+        self.users = 0
+        self.last_used = time.monotonic()
+        self.stop_checkpointer = None
+        self.queue = JobQueue(engine, config['UPLOAD_FOLDER'], name,
+                              current_app.extensions.get('metrics'))
+        self.suggestions = SuggestionIndex()
+
+    @property
+    def engine(self):
+        return self.engines[None]
+
+    def close(self):
+        if self.stop_checkpointer is not None:
+            self.stop_checkpointer.set()
+        self.engine.dispose()
+
+
+class TenantRegistry:
+    """Bounded LRU of open tenant engines with idle eviction.
+
+    acquire() opens a household on first touch (creating its folders and
+    running migrations) and pins it until the matching release(); pinned
+    households are never evicted, so `max_open` can be exceeded briefly
+    under load. Opening happens outside the registry lock, under a
+    per-name lock, so a slow migration only holds up its own household.
+    """
+
+    def __init__(self, root, options, engine_options):
+        self.root = root
+        self.options = options
+        self.engine_options = engine_options
+        self.max_open = max(int(options['tenant_max_open']), 1)
+        self.idle = float(options['tenant_idle_s'])
+        self.open = OrderedDict()     # name -> Tenant, least recently used first
+        self.opening = {}             # name -> Lock held while it is being opened
+        self.lock = threading.Lock()
+
+    def acquire(self, name):
+        with self.lock:
+            tenant = self._pin(name)
+            if tenant is not None:
+                return tenant
+            opening = self.opening.setdefault(name, threading.Lock())
+        with opening:
+            with self.lock:
+                tenant = self._pin(name)
+                if tenant is not None:
+                    return tenant
+            tenant = self._open(name)
+            with self.lock:
+                self.open[name] = tenant
+                self.opening.pop(name, None)
+                tenant.users += 1
+        self.evict()
+        return tenant
+
+    def _pin(self, name):
+        tenant = self.open.get(name)
+        if tenant is not None:
+            self.open.move_to_end(name)
+            tenant.users += 1
+        return tenant
+
+    def release(self, tenant, touch=True):
+        with self.lock:
+            tenant.users -= 1
+            if touch:
+                tenant.last_used = time.monotonic()
+        self.evict()
+
+    @contextlib.contextmanager
+    def pinned(self):
+        """Pin every open household for the block without counting it as use.
+
+        Background work (the job workers) visits open households this way,
+        so it neither keeps them from going idle nor sees them closed
+        underneath it.
+        """
+        with self.lock:
+            tenants = list(self.open.values())
+            for tenant in tenants:
+                tenant.users += 1
+        try:
+            yield tenants
+        finally:
+            for tenant in tenants:
+                self.release(tenant, touch=False)
+
+    def evict(self, now=None):
+        """Close unpinned households beyond max_open or idle for too long."""
+        now = time.monotonic() if now is None else now
+        closing = []
+        with self.lock:
+            excess = len(self.open) - self.max_open
+            for name, tenant in list(self.open.items()):
+                if tenant.users:
+                    continue
+                if excess > 0 or (self.idle and now - tenant.last_used >= self.idle):
+                    del self.open[name]
+                    closing.append(tenant)
+                    excess -= 1
+        for tenant in closing:
+            tenant.close()
+            logger.info(f"Closed tenant {tenant.name}")
+        return len(closing)
+
+    def close_all(self):
+        with self.lock:
+            closing, self.open = list(self.open.values()), OrderedDict()
+        for tenant in closing:
+            tenant.close()
+
+    def _open(self, name):
+        from .migrations import upgrade
+        start = time.perf_counter()
+        data_dir = os.path.join(self.root, name)
+        upload_folder = os.path.join(data_dir, 'images')
+        os.makedirs(upload_folder, exist_ok=True)
+        backup_dir = (os.path.join(self.options['backup_dir'], 'tenants', name)
+                      if self.options['backup_dir'] else os.path.join(data_dir, 'backups'))
+        config = {
+            'DATA_DIR': data_dir,
+            'UPLOAD_FOLDER': upload_folder,
+            'REMOTE_IMAGE_FOLDER': os.path.join(upload_folder, 'remote'),
+            'BACKUP_DIR': backup_dir,
+        }
+        # The nginx internal location only maps the default household's images
+        if current_app.config['UPLOAD_SENDFILE'] == 'x-accel':
+            config['UPLOAD_SENDFILE'] = ''
+        engine = create_engine(f"sqlite:///{os.path.join(data_dir, 'giftguardian.db')}",
+                               **self.engine_options)
+        configure_sqlite(engine, self.options)
+        instrument_engine(engine)
+        tenant = Tenant(name, data_dir, engine, config)
+        token = _current.set(tenant)
+        try:
+            applied = upgrade(os.path.join(data_dir, '.migrate.lock'))
+        except Exception:
+            engine.dispose()
+            raise
+        finally:
+            _current.reset(token)
+        tenant.stop_checkpointer = start_checkpointer(
+            engine, int(self.options['sqlite_checkpoint_interval_s']))
+        logger.info(f"Opened tenant {name} in {(time.perf_counter() - start) * 1000:.1f} ms"
+                    + (f", applied migrations {applied}" if applied else ''))
+        return tenant
+
+    def start_sweeper(self):
+        """Evict idle households even when no requests arrive; returns a stop event."""
+        if not self.idle:
+            return None
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(min(self.idle, 60)):
+                try:
+                    self.evict()
+                except Exception as e:
+                    logger.warning(f"Tenant eviction failed: {e}")
+
+        threading.Thread(target=run, name='tenant-sweeper', daemon=True).start()
+        return stop
+
+
+def init_tenants(app, options):
+    """Install tenant routing on `app` when `tenant_mode` is enabled.
+
+    Wraps app.wsgi_app with TenantMiddleware, so call it after the other
+    middleware; wsgi.py adds IngressMiddleware outside of it.
+    """
+    from . import db
+
+    mode = str(options['tenant_mode']).lower()
+    if mode not in MODES:
+        raise ValueError(f'Unsupported tenant_mode: {mode}')
+    if mode == 'off':
+        return None
+    registry = TenantRegistry(os.path.join(app.config['DATA_DIR'], 'tenants'), options,
+                              app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+    app.extensions['tenants'] = registry
+
+    @app.before_request
+    def bind_tenant():
+        name = request.environ.get(ENVIRON_KEY)
+        if name is not None:
+            g.tenant = registry.acquire(name)
+            g.tenant_token = _current.set(g.tenant)
+
+    @app.teardown_appcontext
+    def unbind_tenant(exc):
+        tenant = g.pop('tenant', None)
+        if tenant is None:
+            return
+        # Our teardown runs before Flask-SQLAlchemy's; the session must let go
+        # of the tenant's connection before the engine can be evicted
+        db.session.remove()
+        _current.reset(g.pop('tenant_token'))
+        registry.release(tenant)
+
+    app.wsgi_app = TenantMiddleware(app.wsgi_app, mode, tenant_names(options['tenants']))
+    return registry
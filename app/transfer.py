@@ -0,0 +1,330 @@
+import calendar
+import codecs
+import csv
+import io
+import json
+from sqlalchemy import insert, select
+from . import db
+from .models import CalendarEvent, Gift, Occasion, Person, PersonOccasion, Relation, STATUS_CYCLE
+
+# Record kinds, their CSV columns, and the order a chunk is written in (gifts
+# and occasions may refer to people from the same file). People, relations
+# and occasion types are referred to by name, matched case-insensitively.
+COLUMNS = {
+    'person': ['name', 'relation', 'birthday_month', 'birthday_day', 'birthday_year'],
+    'person_occasion': ['person', 'occasion', 'month', 'day', 'year'],
+    'gift': ['item_name', 'person', 'occasion', 'year', 'status', 'price', 'image_url', 'notes'],
+}
+KINDS = list(COLUMNS)
+CHUNK_SIZE = 500
+MAX_ERRORS = 100
+
+
+class RecordError(ValueError):
+    """A record that cannot be imported; the message is shown to the user."""
+
+
+# ── readers ──────────────────────────────────────────────────────────────────
+# Both take a binary stream and yield (line number, kind, record dict) lazily.
+
+def read_csv(stream, kind):
+    lines = codecs.iterdecode(stream, 'utf-8-sig')
+    reader = csv.DictReader(lines)
+    for record in reader:
+        yield reader.line_num, kind, {k.strip().lower(): v for k, v in record.items() if k}
+
+
+def read_ndjson(stream):
+    """One JSON object per line, each with a "type" of person, person_occasion or gift."""
+    for line_num, line in enumerate(codecs.iterdecode(stream, 'utf-8-sig'), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_num, None, {'_error': f'invalid JSON: {e}'}
+            continue
+        if not isinstance(record, dict):
+            yield line_num, None, {'_error': 'expected a JSON object'}
+            continue
+        yield line_num, record.pop('type', None), record
+
+
+# ── field parsing ────────────────────────────────────────────────────────────
+
+def _text(record, field, max_length, required=False):
+    value = record.get(field)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise RecordError(f'{field} is required')
+    if len(value) > max_length:
+        raise RecordError(f'{field} is longer than {max_length} characters')
+    return value or None
+
+
+def _int(record, field, low=None, high=None, required=False):
+    value = record.get(field)
+    if value is None or str(value).strip() == '':
+        if required:
+            raise RecordError(f'{field} is required')
+        return None
+    try:
+        number = int(str(value).strip())
+    except ValueError:
+        raise RecordError(f'{field} must be a whole number, got {value!r}')
+    if (low is not None and number < low) or (high is not None and number > high):
+        raise RecordError(f'{field} must be between {low} and {high}, got {number}')
+    return number
+
+
+def _price(record):
+    value = record.get('price')
+    if value is None or str(value).strip() == '':
+        return None
+    cleaned = str(value).strip().lstrip('$€£').replace(',', '')
+    try:
+        price = float(cleaned)
+    except ValueError:
+        raise RecordError(f'price must be a number, got {value!r}')
+    if price < 0:
+        raise RecordError('price cannot be negative')
+    return round(price, 2)
+
+
+def _month_day(record, month_field, day_field):
+    month = _int(record, month_field, 1, 12, required=True)
+    # Leap-year month lengths, so Feb 29 birthdays are accepted
+    day = _int(record, day_field, 1, calendar.monthrange(2000, month)[1], required=True)
+    return month, day
+
+
+# ── import ───────────────────────────────────────────────────────────────────
+
+class Importer:
+    """Validate records as they stream in and insert them chunk by chunk.
+
+    Each chunk of `chunk_size` valid records is written with executemany
+    inserts in one transaction; invalid records are skipped and reported.
+    Missing relations and occasion types are created on the way. With
+    dry_run nothing is written, but every record is still validated.
+    """
+
+    def __init__(self, dry_run=False, chunk_size=CHUNK_SIZE):
+        self.dry_run = dry_run
+        self.chunk_size = chunk_size
+        self.counts = dict.fromkeys(KINDS, 0)
+        self.created = {'relation': set(), 'occasion': set()}
+        self.errors = []
+        self.error_count = 0
+        self.pending = {kind: [] for kind in KINDS}
+
+        # Own short transaction, so no read transaction stays open while chunks write
+        with db.engine.connect() as conn:
+            self.names = {
+                'relation': {name.lower(): id for id, name in conn.execute(select(Relation.id, Relation.name))},
+                'occasion': {name.lower(): id for id, name in conn.execute(select(Occasion.id, Occasion.name))},
+            }
+            self.people = {}   # lowercased name -> [ids]; None stands for "in this import"
+            for id, name in conn.execute(select(Person.id, Person.name)):
+                self.people.setdefault(name.lower(), []).append(id)
+
+    def run(self, records):
+        for line_num, kind, record in records:
+            try:
+                if '_error' in record:
+                    raise RecordError(record['_error'])
+                if kind not in COLUMNS:
+                    raise RecordError(f'unknown record type {kind!r}')
+                self.pending[kind].append(getattr(self, f'_validate_{kind}')(record))
+            except RecordError as e:
+                self.error_count += 1
+                if len(self.errors) < MAX_ERRORS:
+                    self.errors.append((line_num, str(e)))
+                continue
+            self.counts[kind] += 1
+            if sum(len(rows) for rows in self.pending.values()) >= self.chunk_size:
+                self.flush()
+        self.flush()
+        return self
+
+    def summary(self):
+        verb = 'Would import' if self.dry_run else 'Imported'
+        parts = [f"{self.counts['person']} people", f"{self.counts['person_occasion']} occasions",
+                 f"{self.counts['gift']} gifts"]
+        text = f"{verb} {', '.join(parts)}"
+        created = sorted(self.created['relation'] | self.created['occasion'])
+        if created:
+            text += f"; new relations/occasion types: {', '.join(created)}"
+        if self.error_count:
+            text += f'; skipped {self.error_count} invalid record(s)'
+        return text + '.'
+
+    # ── validation ───────────────────────────────────────────────────────────
+
+    def _lookup(self, table, name):
+        """Id for a relation/occasion name, or the name itself if it is new."""
+        key = name.lower()
+        if key not in self.names[table]:
+            self.names[table][key] = None
+            self.created[table].add(name)
+        return self.names[table][key] or name
+
+    def _person(self, name):
+        ids = self.people.get(name.lower())
+        if not ids:
+            raise RecordError(f'unknown person {name!r}')
+        if len(ids) > 1:
+            raise RecordError(f'{len(ids)} people are called {name!r}')
+        return ids[0] or name
+
+    # Every field is checked before _lookup() runs: it records new relation
+    # and occasion names, which must not happen for a record that is skipped.
+
+    def _validate_person(self, record):
+        name = _text(record, 'name', 100, required=True)
+        relation = _text(record, 'relation', 50)
+        month, day = _month_day(record, 'birthday_month', 'birthday_day')
+        row = {
+            'name': name,
+            'birthday_month': month,
+            'birthday_day': day,
+            'birthday_year': _int(record, 'birthday_year', 1850, 2100),
+        }
+        row['relation_id'] = self._lookup('relation', relation) if relation else None
+        self.people.setdefault(name.lower(), []).append(None)
+        return row
+
+    def _validate_person_occasion(self, record):
+        person = self._person(_text(record, 'person', 100, required=True))
+        occasion = _text(record, 'occasion', 50, required=True)
+        month, day = _month_day(record, 'month', 'day')
+        row = {
+            'person_id': person,
+            'month': month,
+            'day': day,
+            'year': _int(record, 'year', 1850, 2100),
+        }
+        row['occasion_id'] = self._lookup('occasion', occasion)
+        return row
+
+    def _validate_gift(self, record):
+        person = _text(record, 'person', 100)
+        occasion = _text(record, 'occasion', 50)
+        status = (_text(record, 'status', 20) or 'Idea').capitalize()
+        if status not in STATUS_CYCLE:
+            raise RecordError(f"status must be one of {', '.join(STATUS_CYCLE)}, got {status!r}")
+        row = {
+            'item_name': _text(record, 'item_name', 200, required=True),
+            'person_id': self._person(person) if person else None,
+            'year': _int(record, 'year', 1900, 2100),
+            'status': status,
+            'price': _price(record),
+            'image_url': _text(record, 'image_url', 500),
+            'notes': _text(record, 'notes', 10000),
+        }
+        row['occasion_id'] = self._lookup('occasion', occasion) if occasion else None
+        return row
+
+    # ── writing ──────────────────────────────────────────────────────────────
+
+    def flush(self):
+        pending, self.pending = self.pending, {kind: [] for kind in KINDS}
+        if self.dry_run or not any(pending.values()):
+            return
+        with db.engine.begin() as conn:
+            # Names still unresolved here were first seen in this import
+            for table, model in (('relation', Relation), ('occasion', Occasion)):
+                new = [name for name in self.created[table] if not self.names[table][name.lower()]]
+                if new:
+                    for id, name in conn.execute(insert(model).returning(model.id, model.name),
+                                                 [{'name': name} for name in new]):
+                        self.names[table][name.lower()] = id
+
+            def resolve(row):
+                for field, table in (('relation_id', 'relation'), ('occasion_id', 'occasion')):
+                    if isinstance(row.get(field), str):
+                        row[field] = self.names[table][row[field].lower()]
+                if isinstance(row.get('person_id'), str):
+                    row['person_id'] = self.people[row['person_id'].lower()][0]
+                return row
+
+            if pending['person']:
+                rows = [resolve(row) for row in pending['person']]
+                inserted = conn.execute(insert(Person).returning(Person.id, Person.name,
+                                                                 Person.birthday_month, Person.birthday_day), rows)
+                events = []
+                for id, name, month, day in inserted:
+                    ids = self.people[name.lower()]
+                    ids[ids.index(None)] = id
+                    events.append({'person_id': id, 'person_occasion_id': None, 'occasion_id': None,
+                                   'month': month, 'day': day, 'day_key': month * 100 + day})
+                conn.execute(insert(CalendarEvent), events)
+
+            if pending['person_occasion']:
+                rows = [resolve(row) for row in pending['person_occasion']]
+                inserted = conn.execute(insert(PersonOccasion).returning(
+                    PersonOccasion.id, PersonOccasion.person_id, PersonOccasion.occasion_id,
+                    PersonOccasion.month, PersonOccasion.day), rows)
+                conn.execute(insert(CalendarEvent), [
+                    {'person_id': person_id, 'person_occasion_id': id, 'occasion_id': occasion_id,
+                     'month': month, 'day': day, 'day_key': month * 100 + day}
+                    for id, person_id, occasion_id, month, day in inserted])
+
+            if pending['gift']:
+                conn.execute(insert(Gift), [resolve(row) for row in pending['gift']])
+
+
+# ── export ───────────────────────────────────────────────────────────────────
+
+def _export_query(kind):
+    if kind == 'person':
+        return (select(Person.name, Relation.name, Person.birthday_month, Person.birthday_day,
+                       Person.birthday_year)
+                .outerjoin(Relation, Person.relation_id == Relation.id)
+                .order_by(Person.id))
+    if kind == 'person_occasion':
+        return (select(Person.name, Occasion.name, PersonOccasion.month, PersonOccasion.day,
+                       PersonOccasion.year)
+                .join(Person, PersonOccasion.person_id == Person.id)
+                .join(Occasion, PersonOccasion.occasion_id == Occasion.id)
+                .order_by(PersonOccasion.id))
+    return (select(Gift.item_name, Person.name, Occasion.name, Gift.year, Gift.status, Gift.price,
+                   Gift.image_url, Gift.notes)
+            .outerjoin(Person, Gift.person_id == Person.id)
+            .outerjoin(Occasion, Gift.occasion_id == Occasion.id)
+            .order_by(Gift.id))
+
+
+def _rows(kind, batch=1000):
+    result = db.session.execute(_export_query(kind).execution_options(yield_per=batch))
+    for partition in result.partitions():
+        yield from partition
+
+
+def export_csv(kind, batch=1000):
+    """Yield CSV text for one record kind, a batch of rows at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS[kind])
+    for count, row in enumerate(_rows(kind, batch), 1):
+        writer.writerow(['' if value is None else value for value in row])
+        if count % batch == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_ndjson(batch=1000):
+    """Yield every record as JSON lines, people first so the file re-imports."""
+    for kind in KINDS:
+        lines = []
+        for row in _rows(kind, batch):
+            record = {'type': kind}
+            record.update((k, v) for k, v in zip(COLUMNS[kind], row) if v is not None)
+            lines.append(json.dumps(record, ensure_ascii=False))
+            if len(lines) >= batch:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
@@ -0,0 +1,194 @@
+"""HTTP load test of each gunicorn worker profile.
+
+    python benchmarks/http_load.py [clients] [seconds] [slow_uploaders]
+
+For each profile (sync, gthread, gevent if installed) a real gunicorn is
+started from gunicorn.conf.py on a throwaway DATA_DIR, seeded over HTTP and
+then hit by `clients` threads browsing and toggling gift status, while
+`slow_uploaders` threads post multipart images at dial-up speed, the case
+that ties up a sync worker. Reports throughput, latency percentiles and
+failures for the fast traffic, plus whether the status toggles were all
+applied (a lost update would point at unsafe session sharing).
+"""
+import http.client
+import io
+import json
+import os
+import random
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+GIFTS = 50
+
+PROFILES = {
+    'sync': {'server_worker_class': 'sync', 'server_workers': 2},
+    'gthread': {'server_worker_class': 'gthread', 'server_workers': 2, 'server_threads': 4},
+    'gevent': {'server_worker_class': 'gevent', 'server_workers': 2},
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(profile):
+    data_dir = tempfile.mkdtemp(prefix=f'gg-http-{profile}-')
+    with open(os.path.join(data_dir, 'options.json'), 'w') as f:
+        json.dump(PROFILES[profile], f)
+    port = free_port()
+    env = dict(os.environ, DATA_DIR=data_dir, BIND=f'127.0.0.1:{port}')
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', 'wsgi:app'],
+                            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{port}'
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(base + '/', timeout=1).read()
+            return proc, base, port, data_dir
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f'{profile} server did not start')
+
+
+def post_form(port, path, fields):
+    """POST a form without following the redirect, so only the write is timed."""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        conn.request('POST', path, urllib.parse.urlencode(fields),
+                     {'Content-Type': 'application/x-www-form-urlencoded'})
+        response = conn.getresponse()
+        response.read()
+        if response.status >= 400:
+            raise OSError(f'{path}: HTTP {response.status}')
+    finally:
+        conn.close()
+
+
+def seed(port):
+    post_form(port, '/settings/relation/add', {'name': 'Load'})
+    post_form(port, '/people/add', {'name': 'Load', 'relation_id': '1', 'month': '1', 'day': '1'})
+    for i in range(GIFTS):
+        post_form(port, '/gifts/add', {'item_name': f'Gift {i}', 'person_id': '1', 'price': str(i)})
+
+
+def statuses(data_dir):
+    with sqlite3.connect(os.path.join(data_dir, 'giftguardian.db')) as conn:
+        return dict(conn.execute('SELECT id, status FROM gift WHERE id <= ?', (GIFTS,)))
+
+
+def slow_upload(port, stop, chunk=512, delay=0.05):
+    """Send a ~64 KB multipart image in small chunks until `stop` is set."""
+    from PIL import Image
+    out = io.BytesIO()
+    Image.effect_noise((160, 160), 64).convert('RGB').save(out, 'PNG')
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="item_name"\r\n\r\nSlow\r\n'
+            f'--{boundary}\r\nContent-Disposition: form-data; name="is_pool"\r\n\r\n1\r\n'
+            f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="s.png"\r\n'
+            f'Content-Type: image/png\r\n\r\n').encode() + out.getvalue() + f'\r\n--{boundary}--\r\n'.encode()
+    while not stop.is_set():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        try:
+            conn.putrequest('POST', '/gifts/add')
+            conn.putheader('Content-Type', f'multipart/form-data; boundary={boundary}')
+            conn.putheader('Content-Length', str(len(body)))
+            conn.endheaders()
+            for i in range(0, len(body), chunk):
+                if stop.is_set():
+                    break
+                conn.send(body[i:i + chunk])
+                time.sleep(delay)
+            else:
+                conn.getresponse().read()
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+
+def client(base, port, stop, latencies, failures, toggles, lock):
+    rng = random.Random()
+    while not stop.is_set():
+        roll = rng.random()
+        start = time.perf_counter()
+        try:
+            if roll < 0.2:
+                gift_id = rng.randint(1, GIFTS)
+                post_form(port, f'/gifts/{gift_id}/status', {})
+                with lock:
+                    toggles[gift_id] = toggles.get(gift_id, 0) + 1
+            else:
+                urllib.request.urlopen(base + ('/' if roll < 0.5 else '/gifts'), timeout=30).read()
+        except OSError:
+            with lock:
+                failures.append(1)
+            continue
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else float('nan')
+
+
+def run(profile, clients, seconds, uploaders):
+    proc, base, port, data_dir = start_server(profile)
+    try:
+        seed(port)
+        stop = threading.Event()
+        latencies, failures, toggles, lock = [], [], {}, threading.Lock()
+        threads = [threading.Thread(target=slow_upload, args=(port, stop)) for _ in range(uploaders)]
+        threads += [threading.Thread(target=client, args=(base, port, stop, latencies, failures, toggles, lock))
+                    for _ in range(clients)]
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+
+        # Every gift should sit toggles % 3 steps along Idea -> Bought -> Given
+        cycle = ['Idea', 'Bought', 'Given']
+        final = statuses(data_dir)
+        consistent = all(final[gift_id] == cycle[toggles.get(gift_id, 0) % 3]
+                         for gift_id in range(1, GIFTS + 1))
+        print(f'{profile:>8}  {len(latencies) / seconds:7.1f} req/s  '
+              f'p50={percentile(latencies, 50) * 1000:7.1f}ms  '
+              f'p95={percentile(latencies, 95) * 1000:7.1f}ms  '
+              f'p99={percentile(latencies, 99) * 1000:7.1f}ms  '
+              f'failed={len(failures):>4}  toggles {"consistent" if consistent else "LOST UPDATES"}')
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    uploaders = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    print(f'{clients} clients + {uploaders} slow uploaders, {seconds:g}s per profile')
+    for profile in PROFILES:
+        if profile == 'gevent':
+            try:
+                import gevent  # noqa: F401
+            except ImportError:
+                print('  gevent  skipped (not installed)')
+                continue
+        run(profile, clients, seconds, uploaders)
+
+
+if __name__ == '__main__':
+    main()
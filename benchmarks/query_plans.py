@@ -0,0 +1,80 @@
+"""Show EXPLAIN QUERY PLAN for the gift filters with and without the lookup indexes.
+
+    python benchmarks/query_plans.py [gift_count]
+
+Runs against a throwaway DATA_DIR; the plans should move from SCAN to SEARCH
+once migration 4 (lookup indexes) is applied.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ['DATA_DIR'] = tempfile.mkdtemp(prefix='gg-bench-')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import text                                  # noqa: E402
+from app import create_app, db                               # noqa: E402
+from app.migrations import _lookup_indexes                   # noqa: E402
+
+INDEXES = ['ix_gift_person_year', 'ix_gift_year', 'ix_gift_status',
+           'ix_gift_occasion_id', 'ix_person_occasion_person_id', 'ix_person_name']
+
+QUERIES = {
+    'gifts_list person filter': "SELECT id FROM gift WHERE person_id IN (3, 7) ORDER BY id DESC",
+    'gifts_list status filter': "SELECT id FROM gift WHERE person_id IS NOT NULL AND status = 'Given'",
+    'gifts_list occasion filter': "SELECT id FROM gift WHERE person_id IS NOT NULL AND occasion_id = 2",
+    'get_available_years': "SELECT DISTINCT year FROM gift WHERE year IS NOT NULL ORDER BY year DESC",
+    'person_profile gifts': "SELECT id FROM gift WHERE person_id = 5 ORDER BY year DESC, id DESC",
+    'stats by year': ("SELECT person.id, count(gift.id), sum(gift.price) FROM person "
+                      "LEFT JOIN gift ON person.id = gift.person_id WHERE gift.year = 2024 "
+                      "GROUP BY person.id"),
+    'profile occasions': "SELECT id FROM person_occasion WHERE person_id = 5",
+}
+
+
+def seed(conn, gifts):
+    rnd = random.Random(42)
+    conn.execute(text("INSERT INTO relation (name) VALUES ('Family')"))
+    conn.execute(text("INSERT INTO occasion (name) VALUES ('Christmas'), ('Birthday')"))
+    conn.execute(text("INSERT INTO person (name, relation_id, birthday_month, birthday_day) "
+                      "VALUES (:n, 1, :m, :d)"),
+                 [{'n': f'Person {i}', 'm': rnd.randint(1, 12), 'd': rnd.randint(1, 28)}
+                  for i in range(gifts // 50 or 1)])
+    conn.execute(text("INSERT INTO gift (item_name, person_id, occasion_id, year, status, price) "
+                      "VALUES (:n, :p, :o, :y, :s, :c)"),
+                 [{'n': f'Gift {i}', 'p': rnd.choice([None] + list(range(1, gifts // 50 + 1))),
+                   'o': rnd.choice([None, 1, 2]), 'y': rnd.randint(2015, 2026),
+                   's': rnd.choice(['Idea', 'Bought', 'Given']), 'c': rnd.random() * 100}
+                  for i in range(gifts)])
+    conn.execute(text("ANALYZE"))
+
+
+def report(conn, label):
+    print(f'\n== {label} ==')
+    for name, sql in QUERIES.items():
+        plan = [row[3] for row in conn.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+        start = time.perf_counter()
+        for _ in range(20):
+            conn.execute(text(sql)).fetchall()
+        ms = (time.perf_counter() - start) / 20 * 1000
+        print(f'{name:28} {ms:7.2f} ms  {" | ".join(plan)}')
+
+
+def main():
+    gifts = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    app = create_app()
+    with app.app_context(), db.engine.begin() as conn:
+        seed(conn, gifts)
+        for name in INDEXES:
+            conn.execute(text(f'DROP INDEX IF EXISTS {name}'))
+        conn.execute(text("ANALYZE"))
+        report(conn, f'without lookup indexes ({gifts} gifts)')
+        _lookup_indexes(conn)
+        conn.execute(text("ANALYZE"))
+        report(conn, 'with lookup indexes')
+
+
+if __name__ == '__main__':
+    main()
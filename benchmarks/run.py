@@ -0,0 +1,181 @@
+"""Drive every page through the test client on a synthetic dataset.
+
+    python benchmarks/run.py [--people 200] [--gifts-per-person 25] [--pool 300]
+                             [--images 60] [--repeat 20] [--no-page-cache]
+                             [--out results.json]
+                             [--compare baseline.json]
+
+Builds a throwaway DATA_DIR with synthetic.py, then times each route over
+`--repeat` requests (after one warm-up) and records latency percentiles,
+SQL statements per request and peak Python memory allocated while serving
+it. Results are written as JSON (default benchmarks/results/<commit>.json)
+so two commits can be compared with --compare. Runs fully offline.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+
+def routes(sample):
+    """(name, method, url) for every page, using ids from the generated data."""
+    return [
+        ('dashboard', 'GET', '/'),
+        ('people_list', 'GET', '/people'),
+        ('person_profile', 'GET', f"/people/view/{sample['person']}"),
+        ('edit_person', 'GET', f"/people/edit/{sample['person']}"),
+        ('gifts_list', 'GET', '/gifts'),
+        ('gifts_list_pool', 'GET', '/gifts?tab=pool'),
+        ('gifts_list_page2', 'GET', '/gifts?per_page=24&sort_by=price_asc'),
+        ('gifts_list_filtered', 'GET', f"/gifts?person_id={sample['person']}&status=Bought"),
+        ('gifts_search', 'GET', '/gifts?search=lego'),
+        ('edit_gift', 'GET', f"/gifts/edit/{sample['gift']}"),
+        ('stats', 'GET', '/stats'),
+        ('stats_year', 'GET', '/stats?year=2024'),
+        ('settings', 'GET', '/settings'),
+        ('upload_thumb', 'GET', f"/uploads/thumb/{sample['image']}"),
+        ('toggle_status', 'POST', f"/gifts/{sample['gift']}/status"),
+    ]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def measure(app, client, method, url, repeat):
+    from sqlalchemy import event
+    from app import db
+
+    with app.app_context():
+        engine = db.engine
+    statements = []
+    counter = lambda *args: statements.append(1)    # noqa: E731
+    event.listen(engine, 'before_cursor_execute', counter)
+    try:
+        call = getattr(client, method.lower())
+        status = call(url).status_code                   # warm-up
+        timings, queries = [], []
+        for _ in range(repeat):
+            statements.clear()
+            start = time.perf_counter()
+            call(url).get_data()
+            timings.append(time.perf_counter() - start)
+            queries.append(len(statements))
+
+        tracemalloc.start()
+        call(url).get_data()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
+
+    return {
+        'status': status,
+        'mean_ms': sum(timings) / len(timings) * 1000,
+        'p50_ms': percentile(timings, 50) * 1000,
+        'p95_ms': percentile(timings, 95) * 1000,
+        'max_ms': max(timings) * 1000,
+        'queries': max(queries),
+        'peak_kb': peak / 1024,
+    }
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline['commit']} ({baseline_path})")
+    print(f"{'route':<22}{'p50 ms':>16}{'queries':>14}{'peak KB':>18}")
+    for name, now in results['routes'].items():
+        before = baseline['routes'].get(name)
+        if not before:
+            continue
+        change = (now['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+        print(f"{name:<22}{before['p50_ms']:7.2f} → {now['p50_ms']:6.2f}"
+              f"{before['queries']:6d} → {now['queries']:<5d}"
+              f"{before['peak_kb']:8.0f} → {now['peak_kb']:<7.0f}"
+              f"{change:+6.0f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--people', type=int, default=200)
+    parser.add_argument('--gifts-per-person', type=int, default=25)
+    parser.add_argument('--pool', type=int, default=300)
+    parser.add_argument('--images', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--no-page-cache', action='store_true',
+                        help='Render cached pages on every request.')
+    parser.add_argument('--out')
+    parser.add_argument('--compare')
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='gg-bench-')
+    os.environ['DATA_DIR'] = data_dir
+    os.environ.setdefault('METRICS_DIR', os.path.join(data_dir, 'metrics'))
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, HERE)
+    from app import create_app, db
+    from app.models import Gift
+    from synthetic import generate
+
+    app = create_app()
+    app.logger.disabled = True
+    if args.no_page_cache:
+        app.extensions.pop('page_cache', None)
+    with app.app_context():
+        start = time.perf_counter()
+        counts = generate(args.people, args.gifts_per_person, args.pool, args.images, args.seed)
+        seed_seconds = time.perf_counter() - start
+        gift = Gift.query.filter(Gift.person_id.isnot(None), Gift.image_path.isnot(None)).first()
+        sample = {'person': gift.person_id, 'gift': gift.id, 'image': gift.image_path}
+        db.session.remove()
+    print(f"dataset: {', '.join(f'{v} {k}' for k, v in counts.items())} ({seed_seconds:.1f}s)")
+
+    client = app.test_client()
+    results = {
+        'commit': git_commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'dataset': dict(counts, seed=args.seed),
+        'repeat': args.repeat,
+        'page_cache': 'page_cache' in app.extensions,
+        'routes': {},
+    }
+    print(f"{'route':<22}{'status':>7}{'p50 ms':>9}{'p95 ms':>9}{'queries':>9}{'peak KB':>9}")
+    for name, method, url in routes(sample):
+        row = measure(app, client, method, url, args.repeat)
+        results['routes'][name] = dict(row, url=url, method=method)
+        print(f"{name:<22}{row['status']:>7}{row['p50_ms']:9.2f}{row['p95_ms']:9.2f}"
+              f"{row['queries']:9d}{row['peak_kb']:9.0f}")
+    results['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    out = args.out or os.path.join(HERE, 'results', f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"max RSS {results['max_rss_kb'] / 1024:.0f} MB, results in {out}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Concurrent write load against one SQLite file, tuned vs. legacy settings.
+
+    python benchmarks/sqlite_contention.py [processes] [seconds]
+
+Each worker process builds its own app (like a gunicorn worker) on a shared
+throwaway DATA_DIR and loops: list gifts, then toggle a gift's status. The
+legacy profile is what the add-on used before the options existed
+(rollback journal, no busy timeout); the tuned one is the config.yaml
+defaults. Reports requests that failed with "database is locked" and the
+status-toggle latency percentiles.
+"""
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+PROFILES = {
+    'legacy': {'sqlite_journal_mode': 'delete', 'sqlite_synchronous': 'full',
+               'sqlite_busy_timeout_ms': 0, 'sqlite_mmap_size_mb': 0,
+               'sqlite_checkpoint_interval_s': 0},
+    'tuned': {},
+}
+GIFTS = 200
+
+
+def make_app(data_dir):
+    os.environ['DATA_DIR'] = data_dir
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    app = create_app()
+    app.logger.disabled = True
+    return app
+
+
+def seed(data_dir):
+    app = make_app(data_dir)
+    from app import db
+    from app.models import Gift, Person
+    with app.app_context():
+        person = Person(name='Bench', birthday_month=1, birthday_day=1)
+        db.session.add(person)
+        db.session.flush()
+        db.session.add_all(Gift(item_name=f'Gift {i}', person_id=person.id, year=2025,
+                                price=i, status='Idea') for i in range(GIFTS))
+        db.session.commit()
+
+
+def worker(data_dir, seconds, seed_offset, results):
+    app = make_app(data_dir)
+    app.config['PROPAGATE_EXCEPTIONS'] = True   # surface OperationalError to the loop
+    client = app.test_client()
+    latencies, locked, errors = [], 0, 0
+    deadline = time.monotonic() + seconds
+    i = seed_offset
+    while time.monotonic() < deadline:
+        i += 7
+        for method, url in (('get', '/gifts'), ('post', f'/gifts/{i % GIFTS + 1}/status')):
+            start = time.perf_counter()
+            try:
+                response = getattr(client, method)(url)
+                status = response.status_code
+            except Exception as e:
+                status = 'locked' if 'database is locked' in str(e) else 500
+            elapsed = time.perf_counter() - start
+            if status == 'locked':
+                locked += 1
+            elif status >= 500:
+                errors += 1
+            elif method == 'post':
+                latencies.append(elapsed)
+    results.put((latencies, locked, errors))
+
+
+def percentile(values, p):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run(profile, processes, seconds):
+    data_dir = tempfile.mkdtemp(prefix=f'gg-contention-{profile}-')
+    with open(os.path.join(data_dir, 'options.json'), 'w') as f:
+        json.dump(PROFILES[profile], f)
+    seed(data_dir)
+
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=worker, args=(data_dir, seconds, n, results))
+             for n in range(processes)]
+    for proc in procs:
+        proc.start()
+    latencies, locked, errors = [], 0, 0
+    for _ in procs:
+        lat, lock, err = results.get()
+        latencies += lat
+        locked += lock
+        errors += err
+    for proc in procs:
+        proc.join()
+
+    print(f'{profile:>7}  writes={len(latencies):>6}  locked={locked:>5}  errors={errors:>4}  '
+          f'p50={percentile(latencies, 50) * 1000:7.2f}ms  '
+          f'p99={percentile(latencies, 99) * 1000:7.2f}ms  '
+          f'max={max(latencies or [0]) * 1000:7.2f}ms')
+
+
+def main():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    print(f'{processes} processes x {seconds:g}s, list + status toggle per iteration')
+    for profile in PROFILES:
+        run(profile, processes, seconds)
+
+
+if __name__ == '__main__':
+    multiprocessing.set_start_method('fork')
+    main()
@@ -0,0 +1,122 @@
+"""Worker cold start and first-request latency.
+
+    python benchmarks/startup.py [--people 50] [--gifts-per-person 10] [--runs 3]
+
+Every measurement runs in a fresh interpreter, like a gunicorn worker boot:
+
+  first boot  empty DATA_DIR: migrations run, no Jinja bytecode cache yet
+  restart     same DATA_DIR again: schema current, bytecode cache warm
+
+For each it reports the time to import the app package, create_app() and
+its phases (as logged at startup), and the first and second GET of a few
+pages. "forked" repeats the first requests in a child forked after
+create_app(), which is what a worker gets with server_preload.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+PAGES = ['/', '/gifts', '/people', '/stats']
+
+CHILD = r'''
+import json, os, sys, time
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+app.logger.disabled = True
+pages = json.loads(sys.argv[2])
+
+def first_requests():
+    client = app.test_client()
+    timings = {}
+    for page in pages:
+        for attempt in ('first', 'second'):
+            t = time.perf_counter()
+            assert client.get(page).status_code == 200, page
+            timings[f'{attempt} {page}'] = (time.perf_counter() - t) * 1000
+    return timings
+
+read_end, write_end = os.pipe()
+pid = os.fork()
+if pid == 0:
+    os.close(read_end)
+    os.write(write_end, json.dumps(first_requests()).encode())
+    os._exit(0)
+os.close(write_end)
+os.waitpid(pid, 0)
+with os.fdopen(read_end) as f:
+    forked = json.load(f)
+print(json.dumps({
+    'import': (imported - start) * 1000,
+    'create_app': (created - imported) * 1000,
+    'phases': app.extensions['startup_timings'],
+    'requests': first_requests(),
+    'forked': forked,
+}))
+'''
+
+
+def boot(data_dir):
+    env = dict(os.environ, DATA_DIR=data_dir, METRICS_DIR=os.path.join(data_dir, 'metrics'),
+               PAGE_CACHE_DIR=os.path.join(data_dir, 'pages'))
+    env.pop('GIFTGUARDIAN_PRELOAD', None)
+    out = subprocess.run([sys.executable, '-c', CHILD, ROOT, json.dumps(PAGES)],
+                         env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def seed(data_dir, people, gifts_per_person):
+    code = ('import sys; sys.path[:0] = sys.argv[1:3]; from app import create_app; '
+            'from synthetic import generate; app = create_app(); app.app_context().push(); '
+            f'generate({people}, {gifts_per_person}, pool=20, images=0, seed=1)')
+    env = dict(os.environ, DATA_DIR=data_dir, METRICS_DIR=os.path.join(data_dir, 'metrics'))
+    subprocess.run([sys.executable, '-c', code, ROOT, HERE], env=env, check=True,
+                   capture_output=True)
+
+
+def report(label, results):
+    def avg(get):
+        return sum(get(r) for r in results) / len(results)
+
+    print(f'\n{label} (mean of {len(results)})')
+    print(f"  import      {avg(lambda r: r['import']):8.1f} ms")
+    print(f"  create_app  {avg(lambda r: r['create_app']):8.1f} ms   "
+          + ', '.join(f'{phase} {avg(lambda r: r["phases"][phase]):.0f}'
+                      for phase in results[0]['phases'] if phase != 'total'))
+    print(f"  {'page':<10}{'first':>9}{'second':>9}{'forked':>9}")
+    for page in PAGES:
+        print(f"  {page:<10}{avg(lambda r: r['requests'][f'first {page}']):9.1f}"
+              f"{avg(lambda r: r['requests'][f'second {page}']):9.1f}"
+              f"{avg(lambda r: r['forked'][f'first {page}']):9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--people', type=int, default=50)
+    parser.add_argument('--gifts-per-person', type=int, default=10)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    first, restart = [], []
+    for _ in range(args.runs):
+        data_dir = tempfile.mkdtemp(prefix='gg-bench-')
+        # Page cache off, so the forked child's requests don't warm the parent's
+        with open(os.path.join(data_dir, 'options.json'), 'w') as f:
+            json.dump({'page_cache': 'off', 'backup_interval_hours': 0}, f)
+        first.append(boot(data_dir))
+        seed(data_dir, args.people, args.gifts_per_person)
+        restart.append(boot(data_dir))
+    report('first boot', first)
+    report('restart', restart)
+
+
+if __name__ == '__main__':
+    main()
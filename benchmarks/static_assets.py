@@ -0,0 +1,63 @@
+"""Bytes a browser downloads per page on a first visit and on a repeat visit.
+
+    python benchmarks/static_assets.py [--people 20] [--gifts-per-person 10]
+
+Renders each page through Flask's test client on a small synthetic dataset
+and follows every <link>/<script> it references. First load counts the HTML
+plus each asset as sent with `Accept-Encoding: gzip, br`; repeat load counts
+only the HTML, since hashed assets are immutable and come from the browser
+cache without a request. Assets still pointing at a CDN (vendor files not
+fetched with `python -m app.assets`) are listed but cannot be measured.
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+ASSET_RE = re.compile(r'<(?:link|script)\b[^>]*?(?:href|src)="([^"]+)"')
+PAGES = ['/', '/people', '/gifts', '/gifts?tab=pool', '/stats', '/settings']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--people', type=int, default=20)
+    parser.add_argument('--gifts-per-person', type=int, default=10)
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='gg-bench-')
+    os.environ['DATA_DIR'] = data_dir
+    os.environ.setdefault('METRICS_DIR', os.path.join(data_dir, 'metrics'))
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, HERE)
+    from app import create_app
+    from synthetic import generate
+
+    app = create_app()
+    app.logger.disabled = True
+    with app.app_context():
+        generate(args.people, args.gifts_per_person, pool=20, images=0, seed=1)
+    client = app.test_client()
+    headers = {'Accept-Encoding': 'gzip, br'}
+
+    external = set()
+    print(f"{'page':<18}{'html':>9}{'assets':>9}{'first':>9}{'repeat':>9}{'saved':>8}")
+    for page in PAGES:
+        html = client.get(page, headers=headers).get_data()
+        asset_bytes = 0
+        for url in ASSET_RE.findall(html.decode()):
+            if url.startswith(('http://', 'https://', '//')):
+                external.add(url)
+                continue
+            asset_bytes += len(client.get(url, headers=headers).get_data())
+        first, repeat = len(html) + asset_bytes, len(html)
+        print(f'{page:<18}{len(html):9d}{asset_bytes:9d}{first:9d}{repeat:9d}'
+              f'{(1 - repeat / first) * 100:7.0f}%')
+    for url in sorted(external):
+        print(f'not measured (CDN): {url}')
+
+
+if __name__ == '__main__':
+    main()
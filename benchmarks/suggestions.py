@@ -0,0 +1,109 @@
+"""Gift Pool suggestion latency on a large household.
+
+    python benchmarks/suggestions.py [--people 1000] [--gifts-per-person 40]
+                                     [--pool 10000] [--samples 200]
+
+Seeds a throwaway DATA_DIR with synthetic.py (50k gifts by default) and
+reports, for the suggestion index of app/suggest.py:
+
+  build        full index build from the gift table (once per process)
+  suggest      refresh (nothing changed) plus scoring every pool gift for
+               one person, over `--samples` people
+  after N      the first suggest after N gifts changed (incremental update)
+  page         GET /people/view/<id> with suggestions off and on
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+
+def ms(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def row(label, samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f'{label:<16}{statistics.median(samples):10.2f}{p95:10.2f}{samples[-1]:10.2f}{len(samples):8d}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--people', type=int, default=1000)
+    parser.add_argument('--gifts-per-person', type=int, default=40)
+    parser.add_argument('--pool', type=int, default=10000)
+    parser.add_argument('--samples', type=int, default=200)
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='gg-bench-')
+    with open(os.path.join(data_dir, 'options.json'), 'w') as f:
+        json.dump({'page_cache': 'off', 'job_workers': 0, 'backup_interval_hours': 0,
+                   'sqlite_checkpoint_interval_s': 0}, f)
+    os.environ['DATA_DIR'] = data_dir
+    os.environ.setdefault('METRICS_DIR', os.path.join(data_dir, 'metrics'))
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, HERE)
+    from sqlalchemy import text
+    from app import create_app, db
+    from app.suggest import SuggestionIndex
+    from synthetic import generate
+
+    app = create_app()
+    app.logger.disabled = True
+    with app.app_context():
+        generate(args.people, args.gifts_per_person, pool=args.pool, images=0, seed=1)
+        db.session.commit()
+        total = db.session.execute(text("SELECT COUNT(*) FROM gift")).scalar()
+        person_ids = [r[0] for r in db.session.execute(text("SELECT id FROM person"))]
+        gift_ids = [r[0] for r in db.session.execute(text("SELECT id FROM gift"))]
+    rnd = random.Random(1)
+    sample = rnd.sample(person_ids, min(args.samples, len(person_ids)))
+
+    with app.app_context():
+        index = SuggestionIndex()
+        build = ms(lambda: index.refresh(db.session))
+        app.extensions['suggestions'] = index
+        arrays = [index.e_row, index.e_term, index.e_tf, index.df, index.row_gift, index.row_person,
+                  index.row_name, index.row_alive, index.row_start, index.row_end]
+        megabytes = sum(a.nbytes for a in arrays) / 1024 / 1024
+        suggest = [ms(lambda: index.suggest(db.session, pid, 5)) for pid in sample]
+
+        incremental = {}
+        for changes in (1, 100, 1000):
+            changed = rnd.sample(gift_ids, changes)
+            db.session.execute(text("UPDATE gift SET notes = COALESCE(notes, '') || ' gift wrap' "
+                                    "WHERE id = :id"), [{'id': gift_id} for gift_id in changed])
+            db.session.commit()
+            incremental[changes] = ms(lambda: index.suggest(db.session, sample[0], 5))
+        db.session.remove()
+
+    client = app.test_client()
+    page = {}
+    for limit in (0, 5):
+        app.config['ADDON_OPTIONS']['pool_suggestions'] = limit
+        client.get(f'/people/view/{sample[0]}')
+        page[limit] = [ms(lambda: client.get(f'/people/view/{pid}')) for pid in sample[:50]]
+
+    print(f'{total} gifts ({args.pool} in the pool), {len(index.vocab)} features, '
+          f'index {megabytes:.1f} MiB')
+    print(f"{'':<16}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'n':>8}")
+    row('build', [build])
+    row('suggest', suggest)
+    for changes, elapsed in incremental.items():
+        row(f'after {changes}', [elapsed])
+    row('page, off', page[0])
+    row('page, on', page[5])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Seeded generator for a large household: relations, occasions, people, gifts.
+
+    python benchmarks/synthetic.py DATA_DIR [--people 200] [--gifts-per-person 25]
+                                   [--pool 300] [--images 60] [--seed 1]
+
+Fills DATA_DIR (created if needed) with a reproducible dataset for manual
+testing, or call generate() from inside an app context, as run.py does.
+Rows go in with bulk SQL so the search, rollup and calendar indexes are
+populated the same way the triggers and migrations do for real data.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+
+RELATIONS = ['Family', 'Friend', 'Coworker', 'Neighbour', 'Partner', 'Teacher', 'Client']
+OCCASIONS = ['Christmas', 'Anniversary', "Mother's Day", "Father's Day", 'Graduation',
+             "Valentine's Day", 'Housewarming', 'Wedding', 'Retirement', 'Hanukkah']
+FIRST_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie',
+               'Avery', 'Quinn', 'Harper', 'Rowan', 'Elliot', 'Skyler', 'Dakota', 'Reese']
+LAST_NAMES = ['Smith', 'Garcia', 'Nguyen', 'Müller', 'Kowalski', 'Okafor', 'Rossi',
+              'Andersen', 'Tanaka', 'Dubois', 'Silva', "O'Brien"]
+ITEMS = ['Lego set', 'Scarf', 'Cookbook', 'Headphones', 'Board game', 'Candle', 'Watch',
+         'Puzzle', 'Sweater', 'Coffee grinder', 'Novel', 'Plant', 'Backpack', 'Perfume',
+         'Drone', 'Yoga mat', 'Tea sampler', 'Camera strap', 'Socks', 'Bluetooth speaker']
+ADJECTIVES = ['blue', 'vintage', 'wooden', 'deluxe', 'mini', 'handmade', 'organic', 'retro']
+NOTES = ['from amazon', 'check the local shop', 'size M', 'they mentioned it in spring',
+         'gift wrap needed', 'compare prices first', 'limited edition', None, None]
+STATUSES = ['Idea', 'Bought', 'Given']
+
+
+def make_image(rnd, size=800):
+    """A noisy photo-like PNG so decoding and resizing do real work."""
+    from PIL import Image
+    image = Image.effect_noise((size, size * 3 // 4), 40 + rnd.randint(0, 40)).convert('RGB')
+    tint = Image.new('RGB', image.size, tuple(rnd.randint(0, 255) for _ in range(3)))
+    out = io.BytesIO()
+    Image.blend(image, tint, 0.5).save(out, 'PNG')
+    out.seek(0)
+    return out
+
+
+def generate(people=200, gifts_per_person=25, pool=300, images=60, seed=1):
+    """Insert a synthetic dataset into the current app's database; return counts."""
+    from flask import current_app
+    from sqlalchemy import text
+    from app import db
+    from app.events import rebuild_event_index
+    from app.images import make_variants, store_upload
+
+    rnd = random.Random(seed)
+    conn = db.session.connection()
+    conn.execute(text("INSERT OR IGNORE INTO relation (name) VALUES (:n)"),
+                 [{'n': name} for name in RELATIONS])
+    conn.execute(text("INSERT OR IGNORE INTO occasion (name) VALUES (:n)"),
+                 [{'n': name} for name in OCCASIONS])
+    relation_ids = [r[0] for r in conn.execute(text("SELECT id FROM relation"))]
+    occasion_ids = [r[0] for r in conn.execute(text("SELECT id FROM occasion"))]
+
+    first_person = (conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM person")).scalar() or 0) + 1
+    conn.execute(text("INSERT INTO person (name, relation_id, birthday_month, birthday_day, birthday_year) "
+                      "VALUES (:name, :relation, :month, :day, :year)"),
+                 [{'name': f'{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)} {i}',
+                   'relation': rnd.choice(relation_ids), 'month': rnd.randint(1, 12),
+                   'day': rnd.randint(1, 28), 'year': rnd.choice([None, rnd.randint(1940, 2020)])}
+                  for i in range(people)])
+    person_ids = list(range(first_person, first_person + people))
+    conn.execute(text("INSERT INTO person_occasion (person_id, occasion_id, month, day, year) "
+                      "VALUES (:person, :occasion, :month, :day, :year)"),
+                 [{'person': pid, 'occasion': rnd.choice(occasion_ids), 'month': rnd.randint(1, 12),
+                   'day': rnd.randint(1, 28), 'year': rnd.choice([None, rnd.randint(1990, 2024)])}
+                  for pid in person_ids for _ in range(rnd.randint(0, 3))])
+
+    folder = current_app.config['UPLOAD_FOLDER']
+    image_names = []
+    for _ in range(images):
+        name, _ = store_upload(make_image(rnd), folder, 'png')
+        make_variants(folder, name)
+        image_names.append(name)
+
+    def gift(person_id):
+        has_url = rnd.random() < 0.1
+        return {
+            'name': f'{rnd.choice(ADJECTIVES).title()} {rnd.choice(ITEMS).lower()}',
+            'price': round(rnd.uniform(5, 300), 2) if rnd.random() < 0.8 else None,
+            'occasion': rnd.choice([None] + occasion_ids),
+            'year': rnd.choice([None] + list(range(2015, 2027))),
+            'status': rnd.choice(STATUSES),
+            'image': rnd.choice(image_names) if image_names and rnd.random() < 0.3 else None,
+            'url': f'https://example.invalid/img/{rnd.randint(1, 10**6)}.jpg' if has_url else None,
+            'notes': rnd.choice(NOTES),
+            'person': person_id,
+        }
+
+    rows = [gift(pid) for pid in person_ids for _ in range(gifts_per_person)]
+    rows += [gift(None) for _ in range(pool)]
+    rnd.shuffle(rows)
+    conn.execute(text("INSERT INTO gift (item_name, price, occasion_id, year, status, image_path, "
+                      "image_url, notes, person_id) VALUES (:name, :price, :occasion, :year, "
+                      ":status, :image, :url, :notes, :person)"), rows)
+    conn.execute(text("ANALYZE"))
+    db.session.commit()
+    events = rebuild_event_index()
+    return {'people': people, 'gifts': len(rows), 'pool': pool, 'images': len(image_names),
+            'events': events}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('data_dir')
+    parser.add_argument('--people', type=int, default=200)
+    parser.add_argument('--gifts-per-person', type=int, default=25)
+    parser.add_argument('--pool', type=int, default=300)
+    parser.add_argument('--images', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    os.environ['DATA_DIR'] = os.path.abspath(args.data_dir)
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        counts = generate(args.people, args.gifts_per_person, args.pool, args.images, args.seed)
+    print(', '.join(f'{value} {key}' for key, value in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
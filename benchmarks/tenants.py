@@ -0,0 +1,112 @@
+"""Memory per open household and request latency with a cold vs. warm engine.
+
+    python benchmarks/tenants.py [--tenants 20] [--people 30] [--gifts-per-person 10]
+                                 [--repeat 5] [--url /gifts]
+
+Builds a throwaway DATA_DIR in multi-household path mode with `--tenants`
+households, each seeded with synthetic.py, and the page cache off so every
+request renders. Then, for each household:
+
+  new   first request against a database that does not exist yet
+        (file creation plus every migration)
+  cold  first request after the registry closed its engine
+        (open, pragmas, up-to-date migration check, empty pool)
+  warm  the following requests on the open engine
+
+Memory is the growth in process RSS with every household open and served
+once, divided by the number of households.
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+
+def rss_kb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss   # peak, not current
+
+
+def timed(client, url):
+    start = time.perf_counter()
+    response = client.get(url)
+    elapsed = (time.perf_counter() - start) * 1000
+    assert response.status_code == 200, (url, response.status_code)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tenants', type=int, default=20)
+    parser.add_argument('--people', type=int, default=30)
+    parser.add_argument('--gifts-per-person', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--url', default='/gifts')
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='gg-bench-')
+    names = [f'family{i:03d}' for i in range(args.tenants)]
+    with open(os.path.join(data_dir, 'options.json'), 'w') as f:
+        json.dump({'tenant_mode': 'path', 'tenants': names, 'tenant_max_open': args.tenants,
+                   'tenant_idle_s': 0, 'page_cache': 'off',
+                   'sqlite_checkpoint_interval_s': 0, 'backup_interval_hours': 0}, f)
+    os.environ['DATA_DIR'] = data_dir
+    os.environ.setdefault('METRICS_DIR', os.path.join(data_dir, 'metrics'))
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, HERE)
+    from app import create_app, tenants
+    from synthetic import generate
+
+    app = create_app()
+    app.logger.disabled = True
+    registry = app.extensions['tenants']
+    client = app.test_client()
+
+    new = [timed(client, f'/h/{name}{args.url}') for name in names]
+    for name in names:
+        with app.app_context():
+            tenant = registry.acquire(name)
+            token = tenants._current.set(tenant)
+            try:
+                generate(args.people, args.gifts_per_person, pool=20, images=0, seed=1)
+            finally:
+                tenants._current.reset(token)
+                registry.release(tenant)
+    registry.close_all()
+
+    timed(client, args.url)            # default household, so its first-use costs are paid
+    base = rss_kb()
+    cold, warm = [], []
+    for name in names:
+        url = f'/h/{name}{args.url}'
+        cold.append(timed(client, url))
+        warm.extend(timed(client, url) for _ in range(args.repeat))
+    per_tenant = (rss_kb() - base) / len(names)
+
+    def row(label, samples):
+        print(f'{label:<6}{statistics.median(samples):10.2f}{max(samples):10.2f}{len(samples):8d}')
+
+    print(f'{args.tenants} households, {args.people} people x {args.gifts_per_person} gifts, GET {args.url}')
+    print(f"{'':<6}{'p50 ms':>10}{'max ms':>10}{'n':>8}")
+    row('new', new)
+    row('cold', cold)
+    row('warm', warm)
+    print(f'RSS per open household: {per_tenant:.0f} KiB')
+    registry.close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Compare worker time per /uploads request across caching and send modes.
+
+    python benchmarks/upload_serving.py [requests] [image_kb]
+
+Drives the app through Flask's test client against a throwaway DATA_DIR, so
+the numbers are pure worker time (no network).
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+
+os.environ['DATA_DIR'] = tempfile.mkdtemp(prefix='gg-bench-')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from PIL import Image                   # noqa: E402
+from app import create_app              # noqa: E402
+from app.models import Gift             # noqa: E402
+
+
+def upload(client, kb):
+    side = int((kb * 1024 / 3) ** 0.5)
+    out = io.BytesIO()
+    Image.effect_noise((side, side), 64).convert('RGB').save(out, 'PNG')
+    out.seek(0)
+    client.post('/gifts/add', data={'item_name': 'Bench', 'is_pool': '1', 'image': (out, 'bench.png')},
+                content_type='multipart/form-data')
+
+
+def measure(client, url, n, headers=None):
+    start = time.perf_counter()
+    sent = 0
+    for _ in range(n):
+        response = client.get(url, headers=headers or {})
+        sent += len(response.get_data())
+    elapsed = time.perf_counter() - start
+    return elapsed / n * 1e6, sent / n, response.status_code
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    kb = int(sys.argv[2]) if len(sys.argv) > 2 else 2048
+    app = create_app()
+    client = app.test_client()
+    upload(client, kb)
+    with app.app_context():
+        name = Gift.query.first().image_path
+    url = f'/uploads/{name}'
+    etag = client.get(url).headers['ETag']
+
+    cases = [
+        ('full download', url, None),
+        ('revalidate (304)', url, {'If-None-Match': etag}),
+        ('range 64 KiB', url, {'Range': 'bytes=0-65535'}),
+        ('card variant', f'/uploads/card/{name}', None),
+    ]
+    print(f'{n} requests per case, original {os.path.getsize(os.path.join(app.config["UPLOAD_FOLDER"], name)) // 1024} KiB')
+    for label, target, headers in cases:
+        us, size, status = measure(client, target, n, headers)
+        print(f'{label:22} {status}  {us:8.1f} us/req  {size / 1024:9.1f} KiB/req')
+    for mode in ('x-sendfile', 'x-accel'):
+        app.config['UPLOAD_SENDFILE'] = mode
+        app.config['USE_X_SENDFILE'] = mode == 'x-sendfile'
+        us, size, status = measure(client, url, n)
+        print(f'{mode + " hand-off":22} {status}  {us:8.1f} us/req  {size / 1024:9.1f} KiB/req')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Gunicorn settings, driven by the add-on options in DATA_DIR/options.json.
+
+    server_worker_class  gthread (default), gevent or sync
+    server_workers       worker processes, 0 = size from the CPU count
+    server_threads       threads per gthread worker, 0 = default (4)
+    server_connections   concurrent greenlets per gevent worker
+    server_preload       build the app once in the master and fork workers from it
+
+Everything shares one SQLite file with a single writer at a time, so extra
+processes mostly add memory; concurrency for slow uploads and image
+downloads comes from threads or greenlets inside a couple of workers.
+
+With preloading, schema checks, asset and template compilation run once per
+server start and workers share the master's memory pages. Background
+threads cannot cross the fork, so post_worker_init starts them in each worker
+(after gevent has patched it); create_app() itself never does.
+"""
+import json
+import multiprocessing
+import os
+
+DEFAULT_THREADS = 4
+MAX_AUTO_WORKERS = 4
+
+
+def _options():
+    path = os.path.join(os.environ.get('DATA_DIR', 'data'), 'options.json')
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _gevent_installed():
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+_opts = _options()
+
+worker_class = _opts.get('server_worker_class', 'gthread')
+if worker_class == 'gevent' and not _gevent_installed():
+    print("gevent is not installed, falling back to gthread workers")
+    worker_class = 'gthread'
+if worker_class not in ('gthread', 'gevent', 'sync'):
+    print(f"Unknown server_worker_class {worker_class!r}, using gthread")
+    worker_class = 'gthread'
+
+workers = int(_opts.get('server_workers', 0)) or max(2, min(multiprocessing.cpu_count(), MAX_AUTO_WORKERS))
+threads = (int(_opts.get('server_threads', 0)) or DEFAULT_THREADS) if worker_class == 'gthread' else 1
+worker_connections = int(_opts.get('server_connections', 100))
+
+# gevent patches threading only in the worker, after the fork; an app built
+# before that would hold unpatched locks
+preload_app = bool(_opts.get('server_preload', True)) and worker_class != 'gevent'
+if preload_app:
+    os.environ['GIFTGUARDIAN_PRELOAD'] = '1'
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+# Any logconfig_dict turns on gunicorn's default dictConfig, whose root logger
+# prints INFO to stdout, so app loggers (startup timings, migrations,
+# schedulers) show up; gunicorn's own loggers stop propagating to it so
+# their lines are not printed twice
+logconfig_dict = {'loggers': {
+    name: {'level': 'INFO', 'handlers': [handler], 'propagate': False, 'qualname': name}
+    for name, handler in [('gunicorn.error', 'error_console'), ('gunicorn.access', 'console')]
+}}
+
+
+def post_worker_init(worker):
+    from wsgi import app
+    app.extensions['services'].start()
@@ -5,4 +5,10 @@ echo "Starting GiftGuardian..."
 mkdir -p /data/images
 export DATA_DIR="/data"
 
-exec gunicorn --bind 0.0.0.0:5000 --workers 2 --timeout 120 wsgi:app
+# Fresh per-worker metric snapshots and page cache for this server run
+export METRICS_DIR="/tmp/giftguardian-metrics"
+export PAGE_CACHE_DIR="/data/.page-cache"
+rm -rf "$METRICS_DIR" "$PAGE_CACHE_DIR"
+
+# Worker model and counts come from the add-on options, see gunicorn.conf.py
+exec gunicorn --config /app/gunicorn.conf.py wsgi:app
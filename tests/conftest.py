@@ -0,0 +1,47 @@
+import json
+import pytest
+from app import create_app, db
+
+# No background threads, so tests see only the work they trigger
+TEST_OPTIONS = {
+    'job_workers': 0,
+    'backup_interval_hours': 0,
+    'sqlite_checkpoint_interval_s': 0,
+    'page_cache': 'off',
+}
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """create_app() on a fresh DATA_DIR, with TEST_OPTIONS plus `options`."""
+    apps = []
+
+    def make(**options):
+        data_dir = tmp_path / 'data'
+        data_dir.mkdir()
+        (data_dir / 'options.json').write_text(json.dumps(dict(TEST_OPTIONS, **options)))
+        monkeypatch.setenv('DATA_DIR', str(data_dir))
+        monkeypatch.setenv('METRICS_DIR', str(tmp_path / 'metrics'))
+        monkeypatch.setenv('PAGE_CACHE_DIR', str(tmp_path / 'pages'))
+        app = create_app()
+        app.config['TESTING'] = True
+        apps.append(app)
+        return app
+
+    yield make
+    for app in apps:
+        app.extensions['services'].stop()
+        if 'tenants' in app.extensions:
+            app.extensions['tenants'].close_all()
+        with app.app_context():
+            db.engine.dispose()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,48 @@
+import hashlib
+import pytest
+from app import assets
+
+
+@pytest.fixture
+def vendor(tmp_path, monkeypatch):
+    """One vendored file served from a file:// URL, with its pin file."""
+    source = tmp_path / 'cdn' / 'lib.min.js'
+    source.parent.mkdir()
+    source.write_bytes(b'console.log(1)')
+    pins = tmp_path / 'vendor.sha256'
+    monkeypatch.setattr(assets, 'VENDOR', {'vendor/lib.min.js': source.as_uri()})
+    monkeypatch.setattr(assets, 'VENDOR_PINS', str(pins))
+    return source, pins, tmp_path / 'static'
+
+
+def test_fetch_checks_pin(vendor):
+    source, pins, static = vendor
+    pins.write_text(f"{hashlib.sha256(b'console.log(1)').hexdigest()}  vendor/lib.min.js\n")
+
+    assert assets.fetch_vendor(str(static)) == ['vendor/lib.min.js']
+    assets.verify_vendor(str(static))
+
+    (static / 'vendor' / 'lib.min.js').write_bytes(b'console.log(2)')
+    with pytest.raises(assets.VendorError, match='pinned'):
+        assets.verify_vendor(str(static))
+
+
+def test_mismatch_or_unpinned_download_is_not_written(vendor):
+    source, pins, static = vendor
+    with pytest.raises(assets.VendorError, match='no pinned sha256'):
+        assets.fetch_vendor(str(static))
+
+    pins.write_text(f"{'0' * 64}  vendor/lib.min.js\n")
+    with pytest.raises(assets.VendorError, match='pinned 0000'):
+        assets.fetch_vendor(str(static))
+    assert not (static / 'vendor' / 'lib.min.js').exists()
+    with pytest.raises(assets.VendorError, match='missing'):
+        assets.verify_vendor(str(static))
+
+
+def test_pin_records_every_file(vendor):
+    source, pins, static = vendor
+    assets.pin_vendor(str(static))
+    assert assets.load_pins(str(pins)) == {
+        'vendor/lib.min.js': hashlib.sha256(b'console.log(1)').hexdigest()}
+    assets.verify_vendor(str(static))
@@ -0,0 +1,50 @@
+import hashlib
+import io
+import json
+import zipfile
+import pytest
+from app import backup
+
+
+def make_zip(path, db_bytes, claimed_size):
+    manifest = {'format': backup.FORMAT, 'schema_version': 1, 'images': [],
+                'database': {'file': backup.DATABASE, 'size': claimed_size,
+                             'sha256': hashlib.sha256(db_bytes).hexdigest()}}
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(backup.MANIFEST, json.dumps(manifest))
+        archive.writestr(backup.DATABASE, db_bytes)
+
+
+def test_zip_member_larger_than_manifest_is_not_extracted(tmp_path):
+    bomb = tmp_path / 'bomb.zip'
+    make_zip(bomb, b'\0' * (8 * backup.CHUNK), claimed_size=1024)
+    staging = tmp_path / 'staging'
+    (staging / 'images').mkdir(parents=True)
+
+    with pytest.raises(backup.RestoreError, match='expected 1024'):
+        backup._stage_zip(str(bomb), str(staging))
+    assert not (staging / backup.DATABASE).exists()
+
+
+def test_copy_stops_at_the_limit(tmp_path):
+    class Endless(io.RawIOBase):
+        reads = 0
+
+        def read(self, n=-1):
+            self.reads += 1
+            return b'\0' * n
+
+    src = Endless()
+    with pytest.raises(backup.RestoreError, match='larger than'):
+        backup._copy_checked(src, str(tmp_path / 'out'), limit=3 * backup.CHUNK)
+    assert src.reads == 4
+    assert (tmp_path / 'out').stat().st_size == 3 * backup.CHUNK
+
+
+def test_manifest_sizes_must_be_counts(tmp_path):
+    archive = tmp_path / 'bad.zip'
+    make_zip(archive, b'x', claimed_size='1')
+    staging = tmp_path / 'staging'
+    (staging / 'images').mkdir(parents=True)
+    with pytest.raises(backup.RestoreError, match='invalid file size'):
+        backup._stage_zip(str(archive), str(staging))
@@ -0,0 +1,53 @@
+import os
+import stat
+import threading
+from app.cache import FileCache
+
+
+def test_file_cache_round_trip(tmp_path):
+    cache = FileCache(str(tmp_path / 'pages'), 8)
+    cache.set('|/people|', (b'<html>\x00\xff</html>', 'text/html'))
+
+    assert cache.get('|/people|') == (b'<html>\x00\xff</html>', 'text/html')
+    assert cache.get('|/stats|') is None
+    assert stat.S_IMODE(os.stat(cache.directory).st_mode) == 0o700
+
+
+def test_file_cache_ignores_foreign_files(tmp_path):
+    cache = FileCache(str(tmp_path / 'pages'), 8)
+    cache.set('a', (b'body', 'text/html'))
+    # Same file name, different stored key: treated as a miss
+    path = cache._path('a')
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data.replace(b'a', b'b', 1))
+    assert cache.get('a') is None
+
+    with open(path, 'wb') as f:
+        f.write(b'\x80\x04garbage')
+    assert cache.get('a') is None
+
+
+def test_file_cache_concurrent_writes_and_prune(tmp_path):
+    cache = FileCache(str(tmp_path / 'pages'), 4)
+    errors = []
+
+    def write(n):
+        try:
+            for i in range(50):
+                cache.set(f'page-{i % 10}', (f'{n}:{i}'.encode(), 'text/html'))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    cache.prune()
+
+    assert errors == []
+    names = os.listdir(cache.directory)
+    assert len(names) == 4
+    assert not any(name.endswith('.tmp') for name in names)
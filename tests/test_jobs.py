@@ -0,0 +1,40 @@
+from sqlalchemy import event, text
+from app import jobs
+
+
+def test_idle_claim_only_reads(app):
+    queue = app.extensions['jobs']
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split(None, 1)[0].upper())
+
+    event.listen(queue.engine, 'before_cursor_execute', record)
+    try:
+        assert queue.claim() is None
+    finally:
+        event.remove(queue.engine, 'before_cursor_execute', record)
+    assert 'UPDATE' not in statements and 'SELECT' in statements
+
+
+def test_failed_job_is_retried_then_parked(app):
+    queue = app.extensions['jobs']
+    calls = []
+
+    @jobs.handler('test_flaky')
+    def flaky(queue, payload):
+        calls.append(payload)
+        raise RuntimeError('boom')
+
+    with queue.engine.begin() as conn:
+        jobs.enqueue(conn, 'test_flaky', {'n': 1}, key='test_flaky:1')
+        jobs.enqueue(conn, 'test_flaky', {'n': 1}, key='test_flaky:1')   # deduplicated
+    assert queue.drain() == 1 and calls == [{'n': 1}]
+    assert queue.claim() is None   # backing off
+
+    with queue.engine.begin() as conn:
+        conn.execute(text("UPDATE job SET run_at = 0, attempts = :n WHERE kind = 'test_flaky'"),
+                     {'n': jobs.MAX_ATTEMPTS - 1})
+    assert queue.drain() == 1
+    with queue.engine.connect() as conn:
+        assert jobs.queue_depth(conn) == {'pending': 0, 'running': 0, 'failed': 1}
@@ -0,0 +1,21 @@
+import os
+from sqlalchemy import text
+from app import db, search
+from app.migrations import ALL_VERSIONS, upgrade
+
+
+def test_search_index_migration_waits_for_fts5(make_app, monkeypatch):
+    monkeypatch.setattr(search, 'fts5_available', lambda: False)
+    app = make_app()
+    assert not app.config['GIFT_SEARCH_FTS']
+
+    with app.app_context():
+        with db.engine.connect() as conn:
+            recorded = {row[0] for row in conn.execute(text("SELECT version FROM schema_version"))}
+        assert recorded == ALL_VERSIONS - {2}
+
+        monkeypatch.undo()
+        assert upgrade(os.path.join(app.config['DATA_DIR'], '.migrate.lock')) == [2]
+        with db.engine.connect() as conn:
+            assert search.gift_fts_exists(conn)
+        assert upgrade(os.path.join(app.config['DATA_DIR'], '.migrate.lock')) == []
@@ -0,0 +1,40 @@
+from sqlalchemy import event
+from app import db
+from app.models import Gift, Person
+
+
+def add_people(app, count, gifts_each=3):
+    with app.app_context():
+        for i in range(count):
+            person = Person(name=f'Person {i}', birthday_month=1 + i % 12, birthday_day=1 + i % 28)
+            db.session.add(person)
+            db.session.flush()
+            db.session.add_all(Gift(item_name=f'Gift {i}.{n}', person_id=person.id, price=10.0)
+                               for n in range(gifts_each))
+        db.session.commit()
+
+
+def statements_for(app, client, url):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        assert client.get(url).status_code == 200
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    return len(statements)
+
+
+def test_people_page_query_count_is_constant(app, client):
+    add_people(app, 1)
+    client.get('/people')   # first-request setup is not what is measured
+    one = statements_for(app, client, '/people')
+
+    add_people(app, 49)
+    fifty = statements_for(app, client, '/people')
+    assert one > 0 and one == fifty
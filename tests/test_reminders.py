@@ -0,0 +1,87 @@
+import datetime
+import json
+from app import reminders
+from app.reminders import Event, ReminderQueue, ReminderScheduler
+
+NOW = datetime.datetime(2026, 6, 15, 9, 30)
+FIRE_AT = datetime.datetime(2026, 6, 15, 9, 0)
+
+
+def scheduler(tmp_path, names):
+    queue = ReminderQueue([0], FIRE_AT.time())
+    queue.sync([Event(i, None, NOW.month, NOW.day, name, None, None) for i, name in enumerate(names, 1)],
+               NOW - datetime.timedelta(days=1))
+    return ReminderScheduler(None, queue, ('http://example.invalid/hook', {}), str(tmp_path / 'state.json'))
+
+
+def saved_state(tmp_path):
+    return datetime.datetime.fromisoformat(json.loads((tmp_path / 'state.json').read_text())['done_until'])
+
+
+def test_failed_reminders_are_retried_with_backoff(tmp_path, monkeypatch):
+    sent, outage = [], [True]
+
+    def send(target, payload):
+        if outage[0]:
+            raise OSError('connection refused')
+        sent.append(payload['data']['person'])
+
+    monkeypatch.setattr(reminders, 'send', send)
+    s = scheduler(tmp_path, ['Ada', 'Bo'])
+
+    s.deliver(NOW)
+    assert not sent and len(s.undelivered) == 2
+    assert not (tmp_path / 'state.json').exists()
+    first_retry = s.retry_at
+
+    s.deliver(first_retry)
+    assert s.retry_at - first_retry > first_retry - NOW   # backoff grows
+
+    outage[0] = False
+    s.deliver(s.retry_at - datetime.timedelta(seconds=1))
+    assert not sent                                        # not before the retry time
+    s.deliver(s.retry_at)
+    assert sorted(sent) == ['Ada', 'Bo'] and not s.undelivered
+    assert s.retry_at is None and s.failures == 0
+    assert saved_state(tmp_path) == FIRE_AT
+
+
+def test_saved_state_stays_before_a_failed_reminder(tmp_path, monkeypatch):
+    sent = []
+
+    def send(target, payload):
+        if payload['data']['person'] == 'Bo':
+            raise OSError('service unavailable')
+        sent.append(payload['data']['person'])
+
+    monkeypatch.setattr(reminders, 'send', send)
+    s = scheduler(tmp_path, ['Ada', 'Bo'])
+    s.deliver(NOW)
+    assert sent == ['Ada']
+    assert [item[0].person for item in s.undelivered] == ['Bo']
+    assert saved_state(tmp_path) < FIRE_AT   # a restart sends Bo's again
+
+
+def test_reminders_older_than_catch_up_are_dropped(tmp_path, monkeypatch):
+    def send(target, payload):
+        raise OSError('down')
+
+    monkeypatch.setattr(reminders, 'send', send)
+    s = scheduler(tmp_path, ['Ada'])
+    s.deliver(NOW)
+    later = FIRE_AT + reminders.CATCH_UP + datetime.timedelta(minutes=1)
+    s.deliver(later)
+    assert not s.undelivered
+    assert saved_state(tmp_path) == FIRE_AT
+
+
+def test_event_added_between_checks_is_sent(tmp_path, monkeypatch):
+    sent = []
+    monkeypatch.setattr(reminders, 'send', lambda target, payload: sent.append(payload['data']['person']))
+    s = scheduler(tmp_path, [])
+    s.deliver(FIRE_AT - datetime.timedelta(minutes=1))
+
+    # Added while the scheduler slept past its fire time
+    s.queue.sync([Event(1, None, NOW.month, NOW.day, 'Ada', None, None)], s.checked_until)
+    s.deliver(NOW)
+    assert sent == ['Ada']
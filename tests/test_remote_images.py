@@ -0,0 +1,99 @@
+import io
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from PIL import Image
+from app import remote_images
+
+
+@pytest.fixture
+def server():
+    """A stand-in image host: serves `server.files` and counts requests per path."""
+    files, hits = {}, {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits[self.path] = hits.get(self.path, 0) + 1
+            if self.path not in files:
+                self.send_error(404)
+                return
+            content_type, body = files[self.path]
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.files, httpd.hits = files, hits
+    httpd.url = lambda path: f'http://127.0.0.1:{httpd.server_port}{path}'
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def image(color, size=(800, 600)):
+    data = io.BytesIO()
+    Image.new('RGB', size, color).save(data, 'PNG')
+    return 'image/png', data.getvalue()
+
+
+def test_cached_image_is_not_fetched_again(tmp_path, server):
+    server.files['/a.png'] = image('red')
+    url, cache = server.url('/a.png'), str(tmp_path)
+
+    remote_images.prefetch(url, cache, 10 ** 7).result()
+    path = remote_images.cache_path(cache, remote_images.url_key(url))
+    assert os.path.exists(path)
+    assert max(Image.open(path).size) == remote_images.VARIANTS['card']
+    assert remote_images.prefetch(url, cache, 10 ** 7) is None   # hit
+    assert server.hits['/a.png'] == 1
+
+    os.remove(path)
+    remote_images.prefetch(url, cache, 10 ** 7).result()         # refetch
+    assert os.path.exists(path)
+    assert server.hits['/a.png'] == 2
+
+
+def test_non_image_content_is_rejected(tmp_path, server):
+    server.files['/page.html'] = ('text/html', b'<html>not an image</html>')
+    url = server.url('/page.html')
+    with pytest.raises(Exception):
+        remote_images.fetch(url, str(tmp_path), 10 ** 7)
+    assert not os.path.exists(remote_images.cache_path(str(tmp_path), remote_images.url_key(url)))
+
+
+def test_oversized_content_is_rejected(tmp_path, server, monkeypatch):
+    server.files['/big.png'] = image('blue', (1600, 1200))
+    monkeypatch.setattr(remote_images, 'MAX_DOWNLOAD_BYTES', 1024)
+    url = server.url('/big.png')
+    with pytest.raises(ValueError):
+        remote_images.fetch(url, str(tmp_path), 10 ** 7)
+    assert not os.listdir(tmp_path)
+
+
+def test_least_recently_used_is_evicted_over_budget(tmp_path, server):
+    cache = str(tmp_path)
+    urls = {}
+    for name in ('one', 'two', 'three'):
+        server.files[f'/{name}.png'] = image('red')   # same bytes, so same cached size
+        urls[name] = server.url(f'/{name}.png')
+
+    one = remote_images.fetch(urls['one'], cache, 10 ** 7)
+    two = remote_images.fetch(urls['two'], cache, 10 ** 7)
+    past = time.time() - 60
+    os.utime(one, (past, past))
+    os.utime(two, (past + 1, past + 1))
+    remote_images.touch(one)   # a hit makes 'one' the most recently used
+    budget = os.path.getsize(one) + os.path.getsize(two)
+
+    three = remote_images.fetch(urls['three'], cache, budget)
+    assert os.path.exists(one) and os.path.exists(three)
+    assert not os.path.exists(two)
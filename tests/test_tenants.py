@@ -0,0 +1,24 @@
+import io
+import sqlite3
+import zipfile
+
+
+def test_backup_download_holds_the_household_until_streamed(make_app, tmp_path):
+    app = make_app(tenant_mode='path', tenants=['smith'])
+    client = app.test_client()
+    registry = app.extensions['tenants']
+    client.post('/h/smith/settings/relation/add', data={'name': 'Family'})
+    client.post('/h/smith/people/add', data={'name': 'Ada Smith', 'relation_id': '1',
+                                             'month': '3', 'day': '4'})
+
+    response = client.get('/h/smith/settings/backup')
+    assert response.status_code == 200
+    assert registry.open['smith'].users == 1   # still pinned while the body is unread
+    body = response.get_data()
+    response.close()
+    assert registry.open['smith'].users == 0
+
+    with zipfile.ZipFile(io.BytesIO(body)) as archive:
+        archive.extract('giftguardian.db', tmp_path)
+    with sqlite3.connect(tmp_path / 'giftguardian.db') as conn:
+        assert conn.execute("SELECT name FROM person").fetchall() == [('Ada Smith',)]
@@ -0,0 +1,34 @@
+from app.models import Gift, Occasion, Person, Relation
+from app.transfer import Importer
+
+
+def run(app, records):
+    with app.app_context():
+        return Importer().run((n, kind, record) for n, (kind, record) in enumerate(records, 1))
+
+
+def test_rejected_records_create_no_relation_or_occasion(app):
+    importer = run(app, [
+        ('person', {'name': 'Ada', 'relation': 'Godparent', 'birthday_month': '3',
+                    'birthday_day': '4', 'birthday_year': '1200'}),
+        ('gift', {'item_name': 'Kite', 'occasion': 'Kite Day', 'price': 'lots'}),
+        ('gift', {'item_name': 'Yo-yo', 'occasion': 'Toy Day', 'year': '3000'}),
+    ])
+    assert importer.error_count == 3
+    assert 'new relations' not in importer.summary()
+    with app.app_context():
+        assert not Relation.query.filter_by(name='Godparent').first()
+        assert not Occasion.query.filter(Occasion.name.in_(['Kite Day', 'Toy Day'])).first()
+        assert not Person.query.filter_by(name='Ada').first()
+
+
+def test_valid_records_create_their_types(app):
+    importer = run(app, [
+        ('person', {'name': 'Ada', 'relation': 'Godparent', 'birthday_month': '3', 'birthday_day': '4'}),
+        ('gift', {'item_name': 'Kite', 'person': 'Ada', 'occasion': 'Kite Day', 'price': '12.50'}),
+    ])
+    assert importer.error_count == 0
+    assert 'Godparent' in importer.summary() and 'Kite Day' in importer.summary()
+    with app.app_context():
+        gift = Gift.query.filter_by(item_name='Kite').one()
+        assert gift.occasion.name == 'Kite Day' and gift.person.relation.name == 'Godparent'
@@ -0,0 +1,50 @@
+import io
+import pytest
+from PIL import Image
+from app import images
+
+
+@pytest.fixture
+def upload(app):
+    data = io.BytesIO()
+    Image.new('RGB', (1200, 900), 'teal').save(data, 'PNG')
+    data.seek(0)
+    filename, _ = images.store_upload(data, app.config['UPLOAD_FOLDER'], 'png')
+    return filename
+
+
+def test_upload_has_strong_etag_and_immutable_caching(client, upload):
+    response = client.get(f'/uploads/{upload}')
+    assert response.status_code == 200
+    assert response.headers['ETag'] == f'"{upload.split(".")[0]}"'
+    assert response.cache_control.immutable
+    assert response.cache_control.public
+    assert response.cache_control.max_age == 365 * 24 * 3600
+
+
+def test_if_none_match_returns_304(client, upload):
+    etag = client.get(f'/uploads/{upload}').headers['ETag']
+    response = client.get(f'/uploads/{upload}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert not response.data
+
+
+def test_range_request_returns_partial_content(client, upload):
+    full = client.get(f'/uploads/{upload}')
+    response = client.get(f'/uploads/{upload}', headers={'Range': 'bytes=0-9'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes 0-9/{len(full.data)}'
+    assert response.data == full.data[:10]
+
+
+def test_variant_etag_names_the_variant(client, upload):
+    response = client.get(f'/uploads/thumb/{upload}')
+    assert response.status_code == 200
+    assert response.headers['ETag'] == f'"{upload.split(".")[0]}-thumb"'
+    assert response.cache_control.immutable
+
+
+def test_unknown_hash_is_404(client):
+    missing = f'{"0" * 64}.png'
+    assert client.get(f'/uploads/{missing}').status_code == 404
+    assert client.get(f'/uploads/thumb/{missing}').status_code == 404
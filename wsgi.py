@@ -5,4 +5,5 @@ app = create_app()
 app.wsgi_app = IngressMiddleware(app.wsgi_app)
 
 if __name__ == "__main__":
+    app.extensions['services'].start()
     app.run(host='0.0.0.0', port=5000)